@@ -3,6 +3,7 @@ from __future__ import annotations
 
 from functools import lru_cache
 from pathlib import Path
+from typing import List
 
 from pydantic_settings import BaseSettings
 
@@ -14,9 +15,56 @@ class Settings(BaseSettings):
     database_url: str = (
         "sqlite:///" + str(Path(__file__).resolve().parent.parent / "autotag.db")
     )
+    storage_profile: str = "wal"  # SQLite pragmas: "wal" (tuned for concurrent workers) or "default"
+    sqlite_busy_timeout_ms: int = 5000  # wait this long for a write lock instead of failing
+    sqlite_cache_size_kib: int = 65536  # page cache per connection
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_timeout: float = 30.0
     models_dir: Path = Path(__file__).resolve().parent / "data" / "models"
     sample_messages_path: Path = Path(__file__).resolve().parent / "data" / "sample_messages.jsonl"
     rules_path: Path = Path(__file__).resolve().parent / "data" / "rules.yaml"
+    rules_watch_interval: float = 0.0  # seconds between rules file checks; 0 disables
+    model_mmap: bool = True  # memory-map model arrays so uvicorn workers share them
+    fast_scorer: bool = True  # score with the exported NumPy model instead of sklearn
+    # Context window for tagging; 0 means unlimited. Any limit switches from the
+    # incremental per-ticket state to re-reading just the window on each ingest.
+    context_max_messages: int = 0
+    context_max_chars: int = 0
+    context_max_tokens: int = 0
+    context_decay: float = 1.0  # weight of each older message's terms for the ML model
+    feature_store: bool = True  # keep per-ticket term counts; needs fast_scorer
+    prediction_cache_size: int = 4096  # cached predictions; 0 disables
+    prediction_cache_ttl: float = 600.0  # seconds; 0 keeps entries until evicted
+    inference_batch_window_ms: float = 2.0  # how long to collect concurrent predictions; 0 disables
+    inference_max_batch: int = 32
+    classification_workers: int = 2  # threads classifying asynchronously ingested messages
+    classification_max_backlog: int = 1000  # queued jobs before async ingest answers 503; 0 = unbounded
+    # Async jobs of one conversation are classified once it has been quiet this long;
+    # a burst of messages then costs one rules/ML pass and at most one tag change.
+    classification_quiet_ms: float = 0.0
+    classification_max_delay_ms: float = 5000.0  # classify a busy conversation at least this often
+    # Group commit: ingest writes of concurrent requests are committed together by one
+    # writer thread; a batch closes after max_batch writes or max_delay_ms, whichever is first.
+    group_commit: bool = False
+    group_commit_max_batch: int = 64
+    group_commit_max_delay_ms: float = 5.0
+    group_commit_wait_timeout: float = 30.0  # seconds a request waits for its batch before failing
+    # A job "running" longer than this is taken to have lost its worker and is requeued on startup.
+    classification_job_lease_seconds: float = 600.0
+    callback_timeout: float = 5.0  # seconds per job-result callback POST
+    callback_workers: int = 4  # threads POSTing job-result callbacks, apart from the classifiers
+    # Hosts job-result callbacks may go to (JSON list); empty allows any host with only public addresses.
+    callback_allowed_hosts: List[str] = []
+    online_learning: bool = False  # learn from agent/user corrections with partial_fit
+    online_serving: bool = False  # score live traffic with the online model
+    online_batch_size: int = 16
+    online_snapshot_every: int = 50
+    skip_human_tagged: bool = True  # don't reclassify tickets tagged by an agent or a clarifier answer
+    skip_settled_by_rules: bool = True  # don't run ML when high-precision rules fix both tags
+    # Confidence-only changes smaller than this (against the last audited value) update
+    # the ticket without a tag audit row; 0 audits every change.
+    audit_min_confidence_delta: float = 0.05
     high_threshold: float = 0.80
     low_threshold: float = 0.55
 
@@ -2,8 +2,12 @@
 from __future__ import annotations
 
 from contextlib import contextmanager
+from typing import Dict, List, Tuple
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import DeclarativeBase, Session, sessionmaker
 
 from .config import get_settings
@@ -13,10 +17,63 @@ class Base(DeclarativeBase):
     """Declarative base for SQLAlchemy models."""
 
 
+# Pragmas per storage profile; ``busy_timeout`` and ``cache_size`` come from settings.
+SQLITE_PROFILES: Dict[str, Dict[str, str]] = {
+    "default": {},
+    # Readers don't block the writer and vice versa; NORMAL sync is durable
+    # against application crashes and only fsyncs at checkpoints.
+    "wal": {"journal_mode": "WAL", "synchronous": "NORMAL", "temp_store": "MEMORY"},
+}
+
+
+def sqlite_pragmas(settings) -> List[Tuple[str, str]]:
+    """Pragmas run on every new SQLite connection for the configured profile."""
+
+    if settings.storage_profile not in SQLITE_PROFILES:
+        raise ValueError(f"Unknown storage profile {settings.storage_profile!r}")
+    pragmas = dict(SQLITE_PROFILES[settings.storage_profile])
+    if settings.storage_profile != "default":
+        pragmas["busy_timeout"] = str(settings.sqlite_busy_timeout_ms)
+        pragmas["cache_size"] = str(-settings.sqlite_cache_size_kib)  # negative means KiB
+    return list(pragmas.items())
+
+
+def _engine_options(settings) -> dict:
+    url = make_url(settings.database_url)
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        return {}  # in-memory databases use a single shared connection
+    return {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+    }
+
+
 settings = get_settings()
-engine = create_engine(settings.database_url, future=True, echo=False)
+engine = create_engine(settings.database_url, future=True, echo=False, **_engine_options(settings))
+
+if engine.dialect.name == "sqlite":
+
+    @event.listens_for(engine, "connect")
+    def _apply_sqlite_pragmas(dbapi_connection, _connection_record) -> None:
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in sqlite_pragmas(settings):
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
 SessionLocal = sessionmaker(bind=engine, class_=Session, autoflush=False, autocommit=False)
 
+_UPSERT_DIALECTS = {"sqlite": sqlite_insert, "postgresql": postgresql_insert}
+
+
+def upsert_insert(db: Session):
+    """The session dialect's ``insert``, which supports ``on_conflict_do_*``."""
+
+    return _UPSERT_DIALECTS[db.get_bind().dialect.name]
+
 
 def create_all() -> None:
     """Create all tables in the database."""
@@ -24,6 +81,60 @@ def create_all() -> None:
     from . import models  # noqa: F401  # Ensure models are imported
 
     Base.metadata.create_all(bind=engine)
+    _add_missing_columns()
+    _add_missing_indexes()
+    _seed_ticket_id_sequence()
+    _seed_metric_counters()
+
+
+def _add_missing_columns() -> None:
+    """Add nullable columns declared on models but missing from existing tables."""
+
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+
+
+def _add_missing_indexes(bind: Engine = engine) -> None:
+    """Create indexes declared on models but missing from tables that already existed."""
+
+    inspector = inspect(bind)
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing:
+                    index.create(conn)
+
+
+def _seed_ticket_id_sequence() -> None:
+    """Start the ticket id sequence after ids issued before it existed."""
+
+    with engine.begin() as conn:
+        if conn.execute(text("SELECT 1 FROM ticket_id_sequence LIMIT 1")).first() is not None:
+            return
+        issued = [
+            int(ticket_id[2:])
+            for (ticket_id,) in conn.execute(text("SELECT ticket_id FROM tickets WHERE ticket_id LIKE 'TK%'"))
+            if ticket_id[2:].isdigit()
+        ]
+        if issued:
+            conn.execute(text("INSERT INTO ticket_id_sequence (value) VALUES (:value)"), {"value": max(issued)})
+
+
+def _seed_metric_counters() -> None:
+    """Compute the metric counters once for tickets created before they existed."""
+
+    from .services import metric_counters
+
+    with session_scope() as session:
+        metric_counters.ensure_initialized(session)
 
 
 @contextmanager
@@ -5,7 +5,12 @@ from fastapi import FastAPI
 
 from .config import get_settings
 from .db import create_all
+from .services.classification_workers import get_classification_workers
+from .services.group_commit import get_group_commit_writer
+from .services.inference_scheduler import get_inference_scheduler
 from .services.ml_classifier import get_classifier
+from .services.online_learner import get_online_learner
+from .services.rules_reloader import get_rules_reloader
 from .routers import messages, tickets, tagging
 
 
@@ -17,6 +22,21 @@ def create_app() -> FastAPI:
     def _startup() -> None:
         create_all()
         get_classifier().ensure_models()
+        get_classification_workers().start()
+        get_group_commit_writer().start()
+        if settings.rules_watch_interval > 0:
+            get_rules_reloader().start_watching(settings.rules_watch_interval)
+        if settings.online_learning:
+            get_online_learner().request_sync()
+
+    @app.on_event("shutdown")
+    def _shutdown() -> None:
+        get_rules_reloader().stop_watching()
+        get_group_commit_writer().stop()
+        get_classification_workers().stop()
+        get_inference_scheduler().stop()
+        if settings.online_learning and get_online_learner().dirty:
+            get_online_learner().save()
 
     app.include_router(messages.router)
     app.include_router(tickets.router)
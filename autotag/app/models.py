@@ -4,7 +4,7 @@ from __future__ import annotations
 from datetime import datetime
 from typing import Optional
 
-from sqlalchemy import JSON, DateTime, ForeignKey, Integer, String
+from sqlalchemy import JSON, DateTime, ForeignKey, Index, Integer, String
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .db import Base
@@ -33,12 +33,38 @@ class Ticket(Base):
     audits: Mapped[list["TagAudit"]] = relationship(
         back_populates="ticket", cascade="all, delete-orphan", order_by="TagAudit.audit_id"
     )
+    rule_state: Mapped[Optional["TicketRuleState"]] = relationship(
+        back_populates="ticket", cascade="all, delete-orphan", uselist=False
+    )
+    feature_state: Mapped[Optional["TicketFeatureState"]] = relationship(
+        back_populates="ticket", cascade="all, delete-orphan", uselist=False
+    )
+
+
+# The ticket list pages newest first with ties in ascending id order; with
+# ``ticket_id`` descending in the index, a backward scan yields that order.
+_LIST_ORDER = (Ticket.updated_at, Ticket.ticket_id.desc())
+Index("ix_tickets_updated_at_ticket_id", *_LIST_ORDER)
+Index("ix_tickets_status_updated_at", Ticket.status, *_LIST_ORDER)
+Index("ix_tickets_service_type_updated_at", Ticket.service_type, *_LIST_ORDER)
+Index("ix_tickets_category_updated_at", Ticket.category, *_LIST_ORDER)
+Index("ix_tickets_tag_source_updated_at", Ticket.tag_source, *_LIST_ORDER)
+
+
+class TicketIdSequence(Base):
+    """Allocator for ``TKnnnn`` ticket ids: each inserted row hands out its value."""
+
+    __tablename__ = "ticket_id_sequence"
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    value: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
 
 
 class Message(Base):
     """Individual message within a ticket."""
 
     __tablename__ = "messages"
+    __table_args__ = (Index("ix_messages_ticket_id_message_id", "ticket_id", "message_id"),)
 
     message_id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     ticket_id: Mapped[str] = mapped_column(ForeignKey("tickets.ticket_id"))
@@ -55,6 +81,7 @@ class TagAudit(Base):
     """Audit trail for tag changes."""
 
     __tablename__ = "tag_audits"
+    __table_args__ = (Index("ix_tag_audits_ticket_id_audit_id", "ticket_id", "audit_id"),)
 
     audit_id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     ticket_id: Mapped[str] = mapped_column(ForeignKey("tickets.ticket_id"))
@@ -65,6 +92,69 @@ class TagAudit(Base):
     confidence: Mapped[Optional[float]] = mapped_column(nullable=True)
     source: Mapped[str] = mapped_column(String)
     reason: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    rules_version: Mapped[Optional[str]] = mapped_column(String, nullable=True)
     ts: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
     ticket: Mapped[Ticket] = relationship(back_populates="audits")
+
+
+class TicketRuleState(Base):
+    """Incremental rule-evaluation state for a ticket's conversation."""
+
+    __tablename__ = "ticket_rule_states"
+
+    ticket_id: Mapped[str] = mapped_column(ForeignKey("tickets.ticket_id"), primary_key=True)
+    state: Mapped[dict] = mapped_column(JSON, default=dict)
+
+    ticket: Mapped[Ticket] = relationship(back_populates="rule_state")
+
+
+class TicketFeatureState(Base):
+    """Accumulated term counts of a ticket's conversation for the ML scorer."""
+
+    __tablename__ = "ticket_feature_states"
+
+    ticket_id: Mapped[str] = mapped_column(ForeignKey("tickets.ticket_id"), primary_key=True)
+    state: Mapped[dict] = mapped_column(JSON, default=dict)
+
+    ticket: Mapped[Ticket] = relationship(back_populates="feature_state")
+
+
+class ClassificationJob(Base):
+    """Background classification of a message accepted by the asynchronous ingest."""
+
+    __tablename__ = "classification_jobs"
+
+    job_id: Mapped[str] = mapped_column(String, primary_key=True)
+    ticket_id: Mapped[str] = mapped_column(ForeignKey("tickets.ticket_id"), index=True)
+    message_id: Mapped[int] = mapped_column(ForeignKey("messages.message_id"))
+    lang: Mapped[str] = mapped_column(String)
+    status: Mapped[str] = mapped_column(String, default="queued", index=True)
+    callback_url: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    callback_status: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    result: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)
+    error: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    started_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+    ticket: Mapped[Ticket] = relationship()
+
+
+class MetricCounter(Base):
+    """Named running total maintained alongside ticket and tag writes."""
+
+    __tablename__ = "metric_counters"
+
+    name: Mapped[str] = mapped_column(String, primary_key=True)
+    value: Mapped[int] = mapped_column(Integer, default=0)
+
+
+class MetricRollup(Base):
+    """Count of one tagging event type within one UTC hour."""
+
+    __tablename__ = "metric_rollups"
+
+    bucket_start: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+    name: Mapped[str] = mapped_column(String, primary_key=True)
+    value: Mapped[int] = mapped_column(Integer, default=0)
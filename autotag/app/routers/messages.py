@@ -1,107 +1,115 @@
 """Message ingestion endpoints."""
 from __future__ import annotations
 
-from datetime import datetime
-from typing import Optional
+from typing import Callable, TypeVar
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
 
 from .. import schemas
-from ..config import get_settings
 from ..deps import get_db
-from ..models import Message, Ticket
-from ..services import clarification_bot, confidence_policy, lang_and_scrub, llm_adjudicator
-from ..services.ml_classifier import get_classifier
-from ..services.rules_engine import get_rules_engine
-from ..services.tag_writer import write_tags
+from ..models import ClassificationJob
+from ..services.classification_workers import add_job, check_callback_url, get_classification_workers, job_out
+from ..services.context_window import ContextPolicy
+from ..services.group_commit import get_group_commit_writer
+from ..services.ingest_pipeline import (
+    Evaluation,
+    classify,
+    conversation_lock,
+    conversation_locks,
+    evaluate,
+    store_message,
+    tag_ticket,
+)
 
 router = APIRouter(prefix="/messages", tags=["messages"])
 
+M = TypeVar("M", bound=schemas.MessageIn)
+T = TypeVar("T")
 
-def _next_ticket_id(db: Session) -> str:
-    count = db.query(Ticket).count()
-    return f"TK{count + 1:04d}"
 
+def _grouped(write: Callable[[M], T], payload: M) -> T:
+    """Hand ``payload`` to the group-commit writer; a timed-out write was withdrawn unwritten."""
 
-def _get_or_create_ticket(db: Session, conversation_id: str) -> Ticket:
-    ticket = db.query(Ticket).filter_by(conversation_id=conversation_id).first()
-    if ticket:
-        return ticket
-    ticket = Ticket(ticket_id=_next_ticket_id(db), conversation_id=conversation_id)
-    db.add(ticket)
-    db.flush()
-    return ticket
-
-
-def _conversation_text(ticket: Ticket) -> str:
-    """Concatenate scrubbed message text for downstream tagging."""
-
-    combined = " ".join(msg.text for msg in ticket.messages if msg.text)
-    return combined.strip()
+    try:
+        return write(payload)
+    except TimeoutError:
+        raise HTTPException(
+            status_code=503, detail="Write queue is backed up; the message was not stored", headers={"Retry-After": "1"}
+        ) from None
 
 
 @router.post("/ingest", response_model=schemas.IngestOut)
 def ingest_message(payload: schemas.MessageIn, db: Session = Depends(get_db)) -> schemas.IngestOut:
-    settings = get_settings()
-    ticket = _get_or_create_ticket(db, payload.conversation_id)
-    lang = lang_and_scrub.detect_lang(payload.text)
-    clean_text, redactions = lang_and_scrub.scrub_pii(payload.text)
-
-    message = Message(
-        sender=payload.sender,
-        text=clean_text,
-        lang=lang,
-        pii_redactions=redactions,
-    )
-    ticket.messages.append(message)
-<<<<<<< Updated upstream
-=======
-    # Flush first so message.ts is populated by default factory
-    db.flush()
-    ticket.updated_at = message.ts
->>>>>>> Stashed changes
-    db.flush()
-    ticket.updated_at = message.ts or datetime.utcnow()
-
-    conversation_text = _conversation_text(ticket) or clean_text
-    rules = get_rules_engine().apply_rules(conversation_text, lang)
-    ml_result = get_classifier().predict(conversation_text)
-    decision = confidence_policy.evaluate(rules, ml_result)
-
-    final_service = decision["service_type"]
-    final_category = decision["category"]
-    final_confidence = float(decision["confidence"])
-    source = str(decision["source"])
-    clarifier: Optional[dict] = None
-
-    if decision["action"] == "auto":
-        write_tags(db, ticket, final_service, final_category, final_confidence, source)
-    elif decision["action"] == "llm":
-        llm_result = llm_adjudicator.adjudicate(
-            conversation_text,
-            {"service_type": final_service, "category": final_category},
-        )
-        final_service = llm_result.get("service_type") or final_service
-        final_category = llm_result.get("category") or final_category
-        final_confidence = float(llm_result.get("confidence", final_confidence))
-        source = "llm"
-        if final_confidence >= settings.high_threshold:
-            write_tags(db, ticket, final_service, final_category, final_confidence, source)
-        else:
-            clarifier = clarification_bot.maybe_question(final_service, final_category)
+    writer = get_group_commit_writer()
+    if writer.enabled:
+        return _grouped(writer.ingest, payload)
+    policy = ContextPolicy.from_settings()
+    with conversation_lock(payload.conversation_id):
+        item = store_message(db, payload, policy)
+        (ml_result,) = evaluate(db, [item], policy)
+        result = tag_ticket(db, item, ml_result)
+        db.commit()
+    return result
+
+
+@router.post("/ingest:batch", response_model=schemas.IngestBatchOut)
+def ingest_batch(
+    payload: schemas.MessageBatchIn, db: Session = Depends(get_db)
+) -> schemas.IngestBatchOut:
+    """Persist many messages in one transaction and classify each affected ticket once."""
+
+    policy = ContextPolicy.from_settings()
+    items: dict[str, Evaluation] = {}
+    message_tickets: list[str] = []
+    with conversation_locks(message.conversation_id for message in payload.messages):
+        for message in payload.messages:
+            item = store_message(db, message, policy)
+            # The last message of a ticket carries its latest rule result and language.
+            items[item.ticket.ticket_id] = item
+            message_tickets.append(item.ticket.ticket_id)
+
+        outcomes = classify(db, items, policy)
+        db.commit()
+    return schemas.IngestBatchOut(results=[outcomes[ticket_id] for ticket_id in message_tickets])
+
+
+@router.post("/ingest:async", response_model=schemas.IngestAcceptedOut, status_code=202)
+def ingest_async(
+    payload: schemas.AsyncMessageIn, response: Response, db: Session = Depends(get_db)
+) -> schemas.IngestAcceptedOut:
+    """Persist the message and classify it in the background.
+
+    The result is available from ``GET /messages/jobs/{job_id}`` and, when a
+    ``callback_url`` is given, POSTed there once the job finishes.
+    """
+
+    workers = get_classification_workers()
+    if payload.callback_url is not None:
+        # Names are resolved and checked again right before each POST.
+        try:
+            check_callback_url(payload.callback_url, workers.callback_allowed_hosts, resolve=False)
+        except ValueError as exc:
+            raise HTTPException(status_code=422, detail=str(exc)) from None
+    if workers.saturated:
+        raise HTTPException(status_code=503, detail="Classification backlog is full", headers={"Retry-After": "1"})
+    writer = get_group_commit_writer()
+    if writer.enabled:
+        accepted = _grouped(writer.accept, payload)
     else:
-        clarifier = clarification_bot.maybe_question(final_service, final_category)
-
-    db.commit()
-
-    return schemas.IngestOut(
-        ticket_id=ticket.ticket_id,
-        suggested_tags=schemas.SuggestedTags(
-            service_type=final_service,
-            category=final_category,
-        ),
-        confidence=final_confidence,
-        source=source,
-        clarifier_question=clarifier,
-    )
+        with conversation_lock(payload.conversation_id):
+            item = store_message(db, payload, ContextPolicy.from_settings())
+            job = add_job(db, item, payload.callback_url)
+            db.commit()
+        accepted = schemas.IngestAcceptedOut(ticket_id=job.ticket_id, job_id=job.job_id, status=job.status)
+    workers.submit(accepted.job_id, accepted.ticket_id)
+    response.headers["Location"] = f"/messages/jobs/{accepted.job_id}"
+    return accepted
+
+
+@router.get("/jobs/{job_id}", response_model=schemas.ClassificationJobOut)
+def get_job(job_id: str, db: Session = Depends(get_db)) -> schemas.ClassificationJobOut:
+    job = db.get(ClassificationJob, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_out(job)
@@ -1,15 +1,24 @@
 """Tagging utilities including admin endpoints."""
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import func
+from datetime import datetime, timedelta
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 
 from .. import schemas
 from ..deps import get_db
-from ..models import TagAudit, Ticket
-from ..services import clarification_bot
+from ..services import clarification_bot, metric_counters, metric_rollups
+from ..services.classification_workers import get_classification_workers
+from ..services.group_commit import get_group_commit_writer
+from ..services.ingest_pipeline import conversation_lock
+from ..services.inference_scheduler import get_inference_scheduler
 from ..services.ml_classifier import get_classifier
+from ..services.online_learner import get_online_learner, notify_feedback
+from ..services.retrain_jobs import get_retrain_jobs
+from ..services.rules_reloader import get_rules_reloader
+from ..services.short_circuit import get_short_circuit_stats
 from ..services.tag_writer import write_tags
 from .tickets import _ticket_or_404, _to_schema
 
@@ -17,57 +26,102 @@ router = APIRouter(tags=["tagging"])
 
 
 def compute_metrics(db: Session) -> dict:
-    total_tickets = db.query(func.count(Ticket.ticket_id)).scalar() or 0
-    auto_tickets = (
-        db.query(func.count(Ticket.ticket_id))
-        .filter(Ticket.tag_source.in_(["rule", "ml", "llm"]))
-        .scalar()
-        or 0
-    )
-    override_events = (
-        db.query(func.count(TagAudit.audit_id))
-        .filter(TagAudit.source == "agent")
-        .scalar()
-        or 0
-    )
-    llm_hits = (
-        db.query(func.count(Ticket.ticket_id))
-        .filter(Ticket.tag_source == "llm")
-        .scalar()
-        or 0
-    )
-    class_distribution: dict[str, int] = {}
-    for service_type, category, count in (
-        db.query(Ticket.service_type, Ticket.category, func.count(Ticket.ticket_id))
-        .group_by(Ticket.service_type, Ticket.category)
-        .all()
-    ):
-        key = f"{service_type or 'unknown'}::{category or 'unknown'}"
-        class_distribution[key] = count
-
-    auto_rate = auto_tickets / total_tickets if total_tickets else 0.0
-    override_rate = override_events / total_tickets if total_tickets else 0.0
-    llm_rate = llm_hits / total_tickets if total_tickets else 0.0
+    """Tagging metrics from the incrementally maintained counters."""
+
+    return metric_counters.metrics(db)
+
+
+@router.post("/admin/retrain", status_code=status.HTTP_202_ACCEPTED)
+def retrain_models() -> dict:
+    """Retrain both heads in a separate process; poll the returned job for the outcome."""
+
+    return get_retrain_jobs().submit()
+
+
+@router.get("/admin/retrain/{job_id}")
+def retrain_status(job_id: str) -> dict:
+    job = get_retrain_jobs().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Retrain job not found")
+    return job
+
+
+@router.get("/admin/rules")
+def rules_status() -> dict:
+    return get_rules_reloader().snapshot()
+
+
+@router.post("/admin/rules/reload", status_code=status.HTTP_202_ACCEPTED)
+def reload_rules(force: bool = False) -> dict:
+    """Recompile the rules file in the background and swap it in atomically.
+
+    The swap happens in the worker process serving this request; other
+    workers pick up a changed file on their next ingest. ``force`` recompiles
+    an unchanged file in this process only.
+    """
+
+    reloader = get_rules_reloader()
+    started = reloader.request_reload(force=force)
+    return {"started": started, **reloader.snapshot()}
 
+
+@router.get("/admin/inference")
+def inference_status() -> dict:
+    classifier = get_classifier()
     return {
-        "auto_tag_rate": auto_rate,
-        "override_rate": override_rate,
-        "class_distribution": class_distribution,
-        "llm_hit_rate": llm_rate,
-        "tickets": total_tickets,
+        **get_inference_scheduler().snapshot(),
+        "model_version": classifier.version,
+        "cache": classifier.cache.snapshot(),
+        "short_circuit": get_short_circuit_stats().snapshot(),
     }
 
 
-@router.post("/admin/retrain")
-def retrain_models(db: Session = Depends(get_db)) -> dict:
-    metrics = get_classifier().train()
-    db.commit()
-    return metrics
+@router.get("/admin/classification")
+def classification_status() -> dict:
+    return get_classification_workers().snapshot()
+
+
+@router.get("/admin/group-commit")
+def group_commit_status() -> dict:
+    return get_group_commit_writer().snapshot()
+
+
+@router.get("/admin/online")
+def online_status() -> dict:
+    return get_online_learner().snapshot()
+
+
+@router.post("/admin/online/sync", status_code=status.HTTP_202_ACCEPTED)
+def sync_online_model() -> dict:
+    """Apply pending agent/user corrections to the online model in the background."""
+
+    learner = get_online_learner()
+    started = learner.request_sync()
+    return {"started": started, **learner.snapshot()}
+
+
+def windowed_metrics(
+    db: Session, since: Optional[datetime], until: Optional[datetime], bucket: str = "hour"
+) -> dict:
+    """Metrics for ``[since, until)`` from the hourly rollups; defaults to the last 24 hours."""
+
+    until = until or datetime.utcnow()
+    since = since or until - timedelta(days=1)
+    return metric_rollups.window(db, since, until, bucket)
 
 
 @router.get("/admin/metrics")
-def admin_metrics(db: Session = Depends(get_db)) -> dict:
-    return compute_metrics(db)
+def admin_metrics(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    bucket: Optional[Literal["hour", "day"]] = None,
+    db: Session = Depends(get_db),
+) -> dict:
+    """All-time totals, or with ``since``/``until``/``bucket`` a windowed series."""
+
+    if since is None and until is None and bucket is None:
+        return compute_metrics(db)
+    return windowed_metrics(db, since, until, bucket or "hour")
 
 
 @router.post("/clarifier/reply", response_model=schemas.TicketOut)
@@ -77,18 +131,21 @@ def clarifier_reply(
     ticket = _ticket_or_404(db, payload.ticket_id)
     if not ticket.messages:
         raise HTTPException(status_code=400, detail="No messages for ticket")
-    updated = clarification_bot.resolve_answer(
-        {"service_type": ticket.service_type, "category": ticket.category},
-        payload.choice,
-    )
-    write_tags(
-        db,
-        ticket,
-        updated.get("service_type"),
-        updated.get("category"),
-        confidence=max(ticket.tag_confidence or 0.6, 0.6),
-        source="user",
-    )
-    db.commit()
+    with conversation_lock(ticket.conversation_id):
+        db.refresh(ticket)
+        updated = clarification_bot.resolve_answer(
+            {"service_type": ticket.service_type, "category": ticket.category},
+            payload.choice,
+        )
+        write_tags(
+            db,
+            ticket,
+            updated.get("service_type"),
+            updated.get("category"),
+            confidence=max(ticket.tag_confidence or 0.6, 0.6),
+            source="user",
+        )
+        db.commit()
+    notify_feedback()
     db.refresh(ticket)
     return _to_schema(ticket)
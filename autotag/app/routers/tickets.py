@@ -1,16 +1,30 @@
 """Ticket retrieval and override endpoints."""
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional, Union
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.orm import Session, object_session
 
 from .. import schemas
 from ..deps import get_db
-from ..models import Ticket
+from ..models import Message, TagAudit, Ticket
+from ..services.ingest_pipeline import conversation_lock
+from ..services.online_learner import notify_feedback
 from ..services.tag_writer import write_tags
 
 router = APIRouter(prefix="/tickets", tags=["tickets"])
 
+PREVIEW_CHARS = 120
+MAX_PAGE_SIZE = 500
+DEFAULT_HISTORY_PAGE = 50
+
 
 def _ticket_or_404(db: Session, ticket_id: str) -> Ticket:
     ticket = db.query(Ticket).filter_by(ticket_id=ticket_id).first()
@@ -19,22 +33,88 @@ def _ticket_or_404(db: Session, ticket_id: str) -> Ticket:
     return ticket
 
 
-def _to_summary(ticket: Ticket) -> schemas.TicketSummary:
-    last_message = ticket.messages[-1].text if ticket.messages else None
-    preview = last_message[:120] if last_message else None
-    return schemas.TicketSummary(
-        ticket_id=ticket.ticket_id,
-        conversation_id=ticket.conversation_id,
-        service_type=ticket.service_type,
-        category=ticket.category,
-        status=ticket.status,
-        updated_at=ticket.updated_at,
-        message_count=len(ticket.messages),
-        last_message_preview=preview,
+def _encode_cursor(updated_at: datetime, ticket_id: str) -> str:
+    raw = json.dumps([updated_at.isoformat(), ticket_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, str]:
+    try:
+        updated_at, ticket_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(updated_at), str(ticket_id)
+    except (binascii.Error, UnicodeError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor") from None
+
+
+def _summary_columns() -> tuple:
+    """Per-ticket message count and latest-message preview as correlated subqueries.
+
+    Both are answered from the ``(ticket_id, message_id)`` index, so their cost
+    depends on the length of the ticket's conversation, not on table size.
+    """
+
+    message_count = (
+        select(func.count(Message.message_id))
+        .where(Message.ticket_id == Ticket.ticket_id)
+        .correlate(Ticket)
+        .scalar_subquery()
     )
+    preview = (
+        select(func.substr(Message.text, 1, PREVIEW_CHARS))
+        .where(Message.ticket_id == Ticket.ticket_id)
+        .order_by(Message.message_id.desc())
+        .limit(1)
+        .correlate(Ticket)
+        .scalar_subquery()
+    )
+    return message_count, preview
+
+
+@dataclass(frozen=True)
+class _HistoryPage:
+    """Which messages and audits a ticket detail includes.
+
+    Each collection contributes its newest ``*_limit`` entries with an id
+    below ``*_before`` (``None`` starts from the newest entry).
+    """
 
+    messages_limit: int = DEFAULT_HISTORY_PAGE
+    messages_before: Optional[int] = None
+    audits_limit: int = DEFAULT_HISTORY_PAGE
+    audits_before: Optional[int] = None
 
-def _to_schema(ticket: Ticket) -> schemas.TicketOut:
+
+def _newest_first(query, id_column, limit: int, before: Optional[int]) -> tuple[list, Optional[int]]:
+    """One page of rows in chronological order, plus the cursor to the older page if any."""
+
+    if before is not None:
+        query = query.filter(id_column < before)
+    rows = query.order_by(id_column.desc()).limit(limit + 1).all()
+    cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        cursor = getattr(rows[-1], id_column.key)
+    rows.reverse()
+    return rows, cursor
+
+
+def _to_schema(ticket: Ticket, page: _HistoryPage = _HistoryPage()) -> schemas.TicketOut:
+    """Serialize a ticket with one page of its history, in one query per collection."""
+
+    db = object_session(ticket)
+    assert db is not None
+    messages, messages_cursor = _newest_first(
+        db.query(Message).filter(Message.ticket_id == ticket.ticket_id),
+        Message.message_id,
+        page.messages_limit,
+        page.messages_before,
+    )
+    audits, audits_cursor = _newest_first(
+        db.query(TagAudit).filter(TagAudit.ticket_id == ticket.ticket_id),
+        TagAudit.audit_id,
+        page.audits_limit,
+        page.audits_before,
+    )
     return schemas.TicketOut(
         ticket_id=ticket.ticket_id,
         conversation_id=ticket.conversation_id,
@@ -54,7 +134,7 @@ def _to_schema(ticket: Ticket) -> schemas.TicketOut:
                 pii_redactions=msg.pii_redactions or [],
                 ts=msg.ts,
             )
-            for msg in ticket.messages
+            for msg in messages
         ],
         tag_history=[
             schemas.TagAuditOut(
@@ -66,25 +146,104 @@ def _to_schema(ticket: Ticket) -> schemas.TicketOut:
                 confidence=audit.confidence,
                 source=audit.source,
                 reason=audit.reason,
+                rules_version=audit.rules_version,
                 ts=audit.ts,
             )
-            for audit in ticket.audits
+            for audit in audits
         ],
+        messages_before=messages_cursor,
+        tag_history_before=audits_cursor,
     )
 
 
+def _etag(ticket_id: str, updated_at: datetime) -> str:
+    return f'"{ticket_id}-{int(updated_at.timestamp() * 1_000_000)}"'
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates
+
+
 @router.get("", response_model=list[schemas.TicketSummary])
-def list_tickets(db: Session = Depends(get_db)) -> list[schemas.TicketSummary]:
-    """Return all tickets ordered by recency."""
+def list_tickets(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    status: Optional[str] = None,
+    service_type: Optional[str] = None,
+    category: Optional[str] = None,
+    tag_source: Optional[str] = None,
+    db: Session = Depends(get_db),
+) -> list[schemas.TicketSummary]:
+    """Return one page of tickets, most recently updated first.
+
+    Pages are keyed on ``(updated_at, ticket_id)``: pass the ``X-Next-Cursor``
+    response header back as ``cursor`` to get the next page; the header is
+    absent on the last page.
+    """
+
+    message_count, preview = _summary_columns()
+    query = db.query(Ticket, message_count, preview)
+    filters = {"status": status, "service_type": service_type, "category": category, "tag_source": tag_source}
+    for column, value in filters.items():
+        if value is not None:
+            query = query.filter(getattr(Ticket, column) == value)
+    if cursor is not None:
+        updated_at, ticket_id = _decode_cursor(cursor)
+        query = query.filter(
+            or_(
+                Ticket.updated_at < updated_at,
+                and_(Ticket.updated_at == updated_at, Ticket.ticket_id > ticket_id),
+            )
+        )
+    rows = query.order_by(Ticket.updated_at.desc(), Ticket.ticket_id).limit(limit + 1).all()
 
-    tickets = db.query(Ticket).order_by(Ticket.updated_at.desc(), Ticket.ticket_id).all()
-    return [_to_summary(ticket) for ticket in tickets]
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1][0]
+        response.headers["X-Next-Cursor"] = _encode_cursor(last.updated_at, last.ticket_id)
+    return [
+        schemas.TicketSummary(
+            ticket_id=ticket.ticket_id,
+            conversation_id=ticket.conversation_id,
+            service_type=ticket.service_type,
+            category=ticket.category,
+            status=ticket.status,
+            updated_at=ticket.updated_at,
+            message_count=count or 0,
+            last_message_preview=last_preview or None,
+        )
+        for ticket, count, last_preview in rows
+    ]
 
 
 @router.get("/{ticket_id}", response_model=schemas.TicketOut)
-def get_ticket(ticket_id: str, db: Session = Depends(get_db)) -> schemas.TicketOut:
+def get_ticket(
+    ticket_id: str,
+    response: Response,
+    messages_limit: int = Query(DEFAULT_HISTORY_PAGE, ge=1, le=MAX_PAGE_SIZE),
+    messages_before: Optional[int] = None,
+    audits_limit: int = Query(DEFAULT_HISTORY_PAGE, ge=1, le=MAX_PAGE_SIZE),
+    audits_before: Optional[int] = None,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+) -> Union[schemas.TicketOut, Response]:
+    """Return a ticket with its newest messages and tag audits.
+
+    The ``ETag`` changes whenever the ticket's ``updated_at`` does; a matching
+    ``If-None-Match`` gets ``304`` without loading any history. Older history
+    is fetched by passing ``messages_before``/``tag_history_before`` from the
+    body back as ``messages_before``/``audits_before``.
+    """
+
     ticket = _ticket_or_404(db, ticket_id)
-    return _to_schema(ticket)
+    etag = _etag(ticket.ticket_id, ticket.updated_at)
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    page = _HistoryPage(messages_limit, messages_before, audits_limit, audits_before)
+    return _to_schema(ticket, page)
 
 
 @router.post("/{ticket_id}/override", response_model=schemas.TicketOut)
@@ -92,15 +251,18 @@ def override_ticket(
     ticket_id: str, payload: schemas.OverrideIn, db: Session = Depends(get_db)
 ) -> schemas.TicketOut:
     ticket = _ticket_or_404(db, ticket_id)
-    write_tags(
-        db,
-        ticket,
-        payload.service_type,
-        payload.category,
-        confidence=1.0,
-        source="agent",
-        reason=payload.reason,
-    )
-    db.commit()
+    with conversation_lock(ticket.conversation_id):
+        db.refresh(ticket)
+        write_tags(
+            db,
+            ticket,
+            payload.service_type,
+            payload.category,
+            confidence=1.0,
+            source="agent",
+            reason=payload.reason,
+        )
+        db.commit()
+    notify_feedback()
     db.refresh(ticket)
     return _to_schema(ticket)
@@ -4,7 +4,7 @@ from __future__ import annotations
 from datetime import datetime
 from typing import Annotated, Literal, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import AfterValidator, BaseModel, Field, HttpUrl
 
 ServiceType = Literal["flight", "hotel", "visa", "esim", "wallet", "other"]
 Category = Literal[
@@ -24,6 +24,14 @@ class MessageIn(BaseModel):
     sender: Literal["user", "agent", "bot"]
 
 
+class AsyncMessageIn(MessageIn):
+    callback_url: Optional[Annotated[HttpUrl, AfterValidator(str)]] = None
+
+
+class MessageBatchIn(BaseModel):
+    messages: Annotated[list[MessageIn], Field(min_length=1)]
+
+
 class SuggestedTags(BaseModel):
     service_type: Optional[str]
     category: Optional[str]
@@ -35,6 +43,32 @@ class IngestOut(BaseModel):
     confidence: float
     source: str
     clarifier_question: Optional[dict]
+    rules_version: Optional[str] = None
+    skipped: Optional[str] = None  # why ML/LLM were not run: "human_tagged" or "rules_settled"
+
+
+class IngestBatchOut(BaseModel):
+    """Per-message results, in request order; messages of one ticket share its decision."""
+
+    results: list[IngestOut]
+
+
+class IngestAcceptedOut(BaseModel):
+    ticket_id: str
+    job_id: str
+    status: str
+
+
+class ClassificationJobOut(BaseModel):
+    job_id: str
+    ticket_id: str
+    status: Literal["queued", "running", "succeeded", "failed"]
+    result: Optional[IngestOut]
+    error: Optional[str]
+    callback_status: Optional[str]
+    created_at: datetime
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
 
 
 class MessageOut(BaseModel):
@@ -55,6 +89,7 @@ class TagAuditOut(BaseModel):
     confidence: Optional[float]
     source: str
     reason: Optional[str]
+    rules_version: Optional[str] = None
     ts: datetime
 
 
@@ -70,6 +105,9 @@ class TicketOut(BaseModel):
     updated_at: datetime
     messages: list[MessageOut]
     tag_history: list[TagAuditOut]
+    # Ids to pass as ``messages_before``/``audits_before`` for older history; ``None`` when complete.
+    messages_before: Optional[int] = None
+    tag_history_before: Optional[int] = None
 
 
 class TicketSummary(BaseModel):
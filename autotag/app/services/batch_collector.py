@@ -0,0 +1,208 @@
+"""Collect work submitted by concurrent threads into batches run on one thread."""
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Generic, List, Optional, Sequence, Tuple, TypeVar
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# Number of recent items kept for the latency/throughput statistics.
+STATS_WINDOW = 2048
+
+
+class Pending(Generic[T, R]):
+    """One submitted item; the handler fills in ``result`` or ``error``."""
+
+    __slots__ = ("item", "submitted_at", "done", "result", "error", "taken", "cancelled")
+
+    def __init__(self, item: T) -> None:
+        self.item = item
+        self.submitted_at = time.perf_counter()
+        self.done = threading.Event()
+        self.result: Optional[R] = None
+        self.error: Optional[BaseException] = None
+        self.taken = False
+        self.cancelled = False
+
+
+class BatchCollector(Generic[T, R]):
+    """Hand items submitted from many threads to ``handler`` in batches.
+
+    The first item to arrive opens a batch; the batch is handled once
+    ``window_ms`` has elapsed or ``max_batch`` items are waiting, whichever
+    comes first. ``handler`` sets ``result`` or ``error`` on every pending
+    item of the batch; if it raises, the exception goes to each item it left
+    unset. ``submit`` blocks until its own item is done. An item still
+    queued after ``wait_timeout`` seconds is withdrawn and ``TimeoutError`` is
+    raised, so a stalled or dead collector thread cannot hang its callers; an
+    item whose batch has started is waited for to the end. ``TimeoutError``
+    therefore always means the item was never handled and is safe to retry.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[List[Pending[T, R]]], None],
+        window_ms: float,
+        max_batch: int,
+        name: str,
+        wait_timeout: float = 30.0,
+    ) -> None:
+        self.window_ms = window_ms
+        self.max_batch = max(1, max_batch)
+        self.wait_timeout = wait_timeout
+        self._handler = handler
+        self._name = name
+        self._queue: "queue.Queue[Pending[T, R]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._claim_lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        # (finished_at, latency_ms) per item and size per batch.
+        self._latencies: Deque[Tuple[float, float]] = deque(maxlen=STATS_WINDOW)
+        self._batch_sizes: Deque[int] = deque(maxlen=STATS_WINDOW)
+        self._stats_lock = threading.Lock()
+        self.items = 0
+        self.batches = 0
+
+    @property
+    def running(self) -> bool:
+        return self._worker is not None and self._worker.is_alive()
+
+    @property
+    def queued(self) -> int:
+        return self._queue.qsize()
+
+    def submit(self, item: T) -> R:
+        """Queue ``item`` for the next batch and wait for its result."""
+
+        self._ensure_worker()
+        pending: Pending[T, R] = Pending(item)
+        self._queue.put(pending)
+        if not pending.done.wait(self.wait_timeout):
+            with self._claim_lock:
+                pending.cancelled = not pending.taken
+            if pending.cancelled:
+                raise TimeoutError(f"{self._name}: not started within {self.wait_timeout}s; withdrawn")
+            # Its batch is running: the outcome is only known once it finishes.
+            pending.done.wait()
+        return self._outcome(pending)
+
+    def run(self, items: Sequence[T]) -> List[R]:
+        """Handle an already-batched request on the calling thread, still recording its latency."""
+
+        batch: List[Pending[T, R]] = [Pending(item) for item in items]
+        if batch:
+            self._process(batch)
+        return [self._outcome(pending) for pending in batch]
+
+    def start(self) -> None:
+        self._ensure_worker()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._worker is not None:
+            self._worker.join(timeout=5)
+            self._worker = None
+        # Anything queued after the worker exited is handled inline.
+        leftovers = self._drain(block=False)
+        if leftovers:
+            self._process(leftovers)
+
+    @staticmethod
+    def _outcome(pending: Pending[T, R]) -> R:
+        if pending.error is not None:
+            raise pending.error
+        return pending.result  # type: ignore[return-value]
+
+    def _ensure_worker(self) -> None:
+        if self.running:
+            return
+        with self._lock:
+            if self.running:
+                return
+            self._stop.clear()
+            self._worker = threading.Thread(target=self._loop, name=self._name, daemon=True)
+            self._worker.start()
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            batch = self._drain(block=True)
+            if batch:
+                self._process(batch)
+
+    def _drain(self, block: bool) -> List[Pending[T, R]]:
+        """Wait for a first item, then collect more until the window closes."""
+
+        first = self._take(0.1 if block else None)
+        if first is None:
+            return []
+        batch = [first]
+        deadline = first.submitted_at + self.window_ms / 1000
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            pending = self._take(remaining if remaining > 0 else None)
+            if pending is None:
+                break
+            batch.append(pending)
+        return batch
+
+    def _take(self, timeout: Optional[float]) -> Optional[Pending[T, R]]:
+        """Take the next item its caller has not withdrawn; a ``None`` timeout does not wait."""
+
+        while True:
+            try:
+                pending = self._queue.get(timeout=timeout) if timeout is not None else self._queue.get_nowait()
+            except queue.Empty:
+                return None
+            with self._claim_lock:
+                if not pending.cancelled:
+                    pending.taken = True
+                    return pending
+
+    def _process(self, batch: List[Pending[T, R]]) -> None:
+        try:
+            self._handler(batch)
+        except Exception as exc:  # hand the failure to every waiting caller
+            logger.exception("%s: batch failed", self._name)
+            for pending in batch:
+                if pending.result is None and pending.error is None:
+                    pending.error = exc
+        finished = time.perf_counter()
+        with self._stats_lock:
+            self.batches += 1
+            self.items += len(batch)
+            self._batch_sizes.append(len(batch))
+            self._latencies.extend((finished, (finished - pending.submitted_at) * 1000) for pending in batch)
+        for pending in batch:
+            pending.done.set()
+
+    def stats(self) -> Dict[str, object]:
+        """Batch sizes, p50/p99 latency and throughput over the recent items."""
+
+        with self._stats_lock:
+            latencies = list(self._latencies)
+            batch_sizes = list(self._batch_sizes)
+        stats: Dict[str, object] = {
+            "mean_batch_size": float(np.mean(batch_sizes)) if batch_sizes else 0.0,
+            "latency_p50_ms": None,
+            "latency_p99_ms": None,
+            "throughput_per_s": 0.0,
+        }
+        if latencies:
+            values = np.array([latency for _, latency in latencies])
+            stats["latency_p50_ms"] = float(np.percentile(values, 50))
+            stats["latency_p99_ms"] = float(np.percentile(values, 99))
+            first_start = latencies[0][0] - latencies[0][1] / 1000
+            elapsed = latencies[-1][0] - first_start
+            if elapsed > 0:
+                stats["throughput_per_s"] = len(latencies) / elapsed
+        return stats
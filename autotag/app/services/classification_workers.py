@@ -0,0 +1,441 @@
+"""Background classification of asynchronously ingested messages."""
+from __future__ import annotations
+
+import heapq
+import ipaddress
+import json
+import logging
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+from urllib.parse import urlsplit
+
+from sqlalchemy.orm import Session
+
+from .. import schemas
+from ..config import get_settings
+from ..db import SessionLocal
+from ..models import ClassificationJob, Ticket
+from .context_window import ContextPolicy
+from .ingest_pipeline import Evaluation, conversation_lock, current_rules, evaluate, tag_ticket
+
+logger = logging.getLogger(__name__)
+
+
+def check_callback_url(url: str, allowed_hosts: Sequence[str], resolve: bool = True) -> None:
+    """Raise ``ValueError`` unless job results may be POSTed to ``url``.
+
+    With ``allowed_hosts``, only those hosts are accepted, and they are trusted
+    as configured. Without an allowlist, the host must be public: IP literals
+    and, with ``resolve``, every address the name resolves to are checked, so
+    loopback, private, link-local (cloud metadata) and reserved addresses are
+    refused.
+    """
+
+    host = urlsplit(url).hostname or ""
+    if not host:
+        raise ValueError("Callback URL has no host")
+    if allowed_hosts:
+        if host in {allowed.lower() for allowed in allowed_hosts}:
+            return
+        raise ValueError(f"Callback host {host!r} is not in the allowed hosts")
+    try:
+        addresses = [ipaddress.ip_address(host)]
+    except ValueError:
+        if not resolve:
+            return
+        try:
+            addresses = [ipaddress.ip_address(info[4][0]) for info in socket.getaddrinfo(host, None)]
+        except OSError as exc:
+            raise ValueError(f"Callback host {host!r} does not resolve") from exc
+    blocked = sorted({str(address) for address in addresses if not address.is_global})
+    if blocked:
+        raise ValueError(f"Callback host {host!r} is not a public address ({', '.join(blocked)})")
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Report redirects as their status instead of following them past ``check_callback_url``."""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):  # type: ignore[no-untyped-def]
+        return None
+
+
+_callback_opener = urllib.request.build_opener(_NoRedirect)
+
+
+def job_out(job: ClassificationJob) -> schemas.ClassificationJobOut:
+    return schemas.ClassificationJobOut(
+        job_id=job.job_id,
+        ticket_id=job.ticket_id,
+        status=job.status,  # type: ignore[arg-type]
+        result=job.result,  # type: ignore[arg-type]
+        error=job.error,
+        callback_status=job.callback_status,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+    )
+
+
+def add_job(db: Session, item: Evaluation, callback_url: Optional[str] = None) -> ClassificationJob:
+    """Queue the classification of ``item``'s message in the current transaction."""
+
+    job = ClassificationJob(
+        job_id=uuid.uuid4().hex,
+        ticket_id=item.ticket.ticket_id,
+        message_id=item.message_id,
+        lang=item.lang,
+        callback_url=callback_url,
+        status="queued",
+    )
+    db.add(job)
+    return job
+
+
+class ClassificationWorkers:
+    """A fixed pool of threads that tag tickets for queued ``ClassificationJob`` rows.
+
+    The job row, committed together with its message, is the source of truth;
+    the in-memory schedule only carries job ids, grouped by ticket. A ticket
+    becomes due ``quiet_ms`` after its latest job was submitted (but no later
+    than ``max_delay_ms`` after the first one), so a burst of messages is
+    classified once, over the final conversation, and every job of the burst
+    gets that result. A ticket is handled by one worker at a time; jobs
+    arriving meanwhile wait for the next pass.
+
+    Workers claim jobs by moving them from ``queued`` to ``running`` with a
+    conditional update, so a job scheduled twice (or by two API processes on
+    startup) is run once. Jobs left ``queued`` by a previous process are
+    picked up again by ``start``, as are jobs ``running`` for longer than
+    ``lease_seconds``, whose worker is taken to have died mid-pass.
+
+    Callbacks are POSTed by a separate pool of ``callback_workers`` threads,
+    so a slow callback endpoint never holds up classification. Each URL is
+    checked with ``check_callback_url`` right before its POST, and redirects
+    are not followed.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        max_backlog: int,
+        callback_timeout: float = 5.0,
+        quiet_ms: float = 0.0,
+        max_delay_ms: float = 0.0,
+        lease_seconds: float = 600.0,
+        callback_workers: int = 4,
+        session_factory: Callable[[], Session] = SessionLocal,
+        callback_allowed_hosts: Sequence[str] = (),
+    ) -> None:
+        self.workers = max(1, workers)
+        self.max_backlog = max_backlog
+        self.callback_timeout = callback_timeout
+        self.quiet_ms = quiet_ms
+        self.max_delay_ms = max_delay_ms
+        self.lease_seconds = lease_seconds
+        self.callback_workers = max(1, callback_workers)
+        self.callback_allowed_hosts = tuple(callback_allowed_hosts)
+        self._callbacks: Optional[ThreadPoolExecutor] = None
+        self._callbacks_pending = 0
+        self._session_factory = session_factory
+        self._cond = threading.Condition()
+        self._pending: Dict[str, List[str]] = {}  # ticket_id -> job ids, oldest first
+        self._first: Dict[str, float] = {}
+        self._due: Dict[str, float] = {}
+        self._heap: List[Tuple[float, str]] = []  # (due, ticket_id); stale entries are skipped
+        self._active: Set[str] = set()
+        self._queued = 0
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self._stop = threading.Event()
+        self.succeeded = 0
+        self.failed = 0
+        self.classifications = 0
+
+    @property
+    def running(self) -> bool:
+        return any(thread.is_alive() for thread in self._threads)
+
+    @property
+    def saturated(self) -> bool:
+        """Whether new async ingests should be turned away until the backlog drains."""
+
+        return bool(self.max_backlog) and self._queued >= self.max_backlog
+
+    def submit(self, job_id: str, ticket_id: str) -> None:
+        """Schedule a job whose row is already committed, restarting its ticket's quiet period."""
+
+        self._ensure_workers()
+        now = time.monotonic()
+        with self._cond:
+            self._pending.setdefault(ticket_id, []).append(job_id)
+            first = self._first.setdefault(ticket_id, now)
+            due = now + self.quiet_ms / 1000
+            if self.max_delay_ms:
+                due = min(due, first + self.max_delay_ms / 1000)
+            self._due[ticket_id] = due
+            heapq.heappush(self._heap, (due, ticket_id))
+            self._queued += 1
+            self._cond.notify()
+
+    def start(self) -> None:
+        self._ensure_workers()
+        db = self._session_factory()
+        try:
+            self._release_expired(db)
+            pending = (
+                db.query(ClassificationJob.job_id, ClassificationJob.ticket_id)
+                .filter(ClassificationJob.status == "queued")
+                .order_by(ClassificationJob.created_at)
+                .all()
+            )
+        finally:
+            db.close()
+        for job_id, ticket_id in pending:
+            self.submit(job_id, ticket_id)
+
+    def _release_expired(self, db: Session) -> int:
+        """Requeue jobs whose ``running`` claim is older than the lease."""
+
+        expired_before = datetime.utcnow() - timedelta(seconds=self.lease_seconds)
+        released = (
+            db.query(ClassificationJob)
+            .filter(ClassificationJob.status == "running", ClassificationJob.started_at < expired_before)
+            .update({"status": "queued", "started_at": None}, synchronize_session=False)
+        )
+        db.commit()
+        if released:
+            logger.warning("Requeued %d classification jobs whose worker stopped mid-pass", released)
+        return released
+
+    def stop(self) -> None:
+        """Stop after the tickets being run; jobs still scheduled stay ``queued`` in the database.
+
+        Callbacks being sent are finished; callbacks not started yet are dropped
+        and keep an empty ``callback_status``.
+        """
+
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+        if self._callbacks is not None:
+            self._callbacks.shutdown(wait=True, cancel_futures=True)
+            self._callbacks = None
+
+    def _ensure_workers(self) -> None:
+        if self.running:
+            return
+        with self._lock:
+            if self.running:
+                return
+            self._stop.clear()
+            if self._callbacks is None:
+                self._callbacks = ThreadPoolExecutor(self.callback_workers, thread_name_prefix="job-callback")
+            self._threads = [
+                threading.Thread(target=self._loop, name=f"classifier-{idx}", daemon=True)
+                for idx in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def _loop(self) -> None:
+        while True:
+            taken = self._next_due()
+            if taken is None:
+                return
+            ticket_id, job_ids = taken
+            try:
+                self.run(ticket_id, job_ids)
+            except Exception:  # keep the worker alive for the next ticket
+                logger.exception("Classification jobs %s could not be recorded", job_ids)
+            finally:
+                with self._cond:
+                    self._active.discard(ticket_id)
+                    if ticket_id in self._due:
+                        heapq.heappush(self._heap, (self._due[ticket_id], ticket_id))
+                    self._cond.notify_all()
+
+    def _next_due(self) -> Optional[Tuple[str, List[str]]]:
+        """Wait for a ticket whose quiet period is over and that no other worker holds."""
+
+        with self._cond:
+            while not self._stop.is_set():
+                now = time.monotonic()
+                while self._heap:
+                    due, ticket_id = self._heap[0]
+                    if self._due.get(ticket_id) != due or ticket_id in self._active:
+                        # Superseded by a later submit, or re-pushed when its worker finishes.
+                        heapq.heappop(self._heap)
+                        continue
+                    break
+                if self._heap and self._heap[0][0] <= now:
+                    _, ticket_id = heapq.heappop(self._heap)
+                    job_ids = self._pending.pop(ticket_id)
+                    del self._due[ticket_id], self._first[ticket_id]
+                    self._queued -= len(job_ids)
+                    self._active.add(ticket_id)
+                    return ticket_id, job_ids
+                timeout = min(0.1, self._heap[0][0] - now) if self._heap else 0.1
+                self._cond.wait(timeout)
+        return None
+
+    def run(self, ticket_id: str, job_ids: List[str]) -> List[schemas.ClassificationJobOut]:
+        """Claim the still-``queued`` jobs of one ticket and classify the ticket once for all of them."""
+
+        db = self._session_factory()
+        try:
+            claimed = [
+                job_id
+                for job_id in job_ids
+                if db.query(ClassificationJob)
+                .filter_by(job_id=job_id, status="queued")
+                .update({"status": "running", "started_at": datetime.utcnow()})
+            ]
+            db.commit()
+            if not claimed:
+                return []
+            jobs = [db.get(ClassificationJob, job_id) for job_id in claimed]
+            ticket = db.get(Ticket, ticket_id)
+            assert ticket is not None and all(job is not None for job in jobs)
+            error: Optional[str] = None
+            result: Optional[dict] = None
+            with conversation_lock(ticket.conversation_id):
+                # An ingest may have committed since the ticket was read; classify what is stored now.
+                db.expire_all()
+                try:
+                    # The newest message decides the language, as in synchronous ingest.
+                    result = self._classify(db, ticket, jobs[-1].lang).model_dump(mode="json")  # type: ignore[union-attr]
+                except Exception as exc:
+                    logger.exception("Classification of ticket %s failed", ticket_id)
+                    db.rollback()
+                    error = f"{type(exc).__name__}: {exc}"
+                finished_at = datetime.utcnow()
+                for job in jobs:
+                    assert job is not None
+                    job.status = "failed" if error else "succeeded"
+                    job.result = result
+                    job.error = error
+                    job.finished_at = finished_at
+                db.commit()
+            with self._cond:
+                self.classifications += 1
+                if error:
+                    self.failed += len(jobs)
+                else:
+                    self.succeeded += len(jobs)
+            outs = []
+            for job in jobs:
+                assert job is not None
+                out = job_out(job)
+                if job.callback_url:
+                    self._schedule_callback(job.callback_url, out)
+                outs.append(out)
+            return outs
+        finally:
+            db.close()
+
+    def _schedule_callback(self, url: str, out: schemas.ClassificationJobOut) -> None:
+        with self._cond:
+            self._callbacks_pending += 1
+        if self._callbacks is None:  # ``run`` called without the worker threads
+            self._send_callback(url, out)
+        else:
+            self._callbacks.submit(self._send_callback, url, out)
+
+    def _send_callback(self, url: str, out: schemas.ClassificationJobOut) -> None:
+        """Deliver one callback and record its outcome on the job."""
+
+        try:
+            status = self._deliver(url, out)
+            db = self._session_factory()
+            try:
+                db.query(ClassificationJob).filter_by(job_id=out.job_id).update({"callback_status": status})
+                db.commit()
+            finally:
+                db.close()
+        except Exception:  # a pool thread has no caller to report to
+            logger.exception("Recording the callback of job %s failed", out.job_id)
+        finally:
+            with self._cond:
+                self._callbacks_pending -= 1
+
+    @staticmethod
+    def _classify(db: Session, ticket: Ticket, lang: str) -> schemas.IngestOut:
+        policy = ContextPolicy.from_settings()
+        item = Evaluation(ticket, lang)
+        if not policy.bounded:
+            # The ticket may have grown since these jobs' messages; tag what is stored now.
+            item.rules = current_rules(ticket, lang)
+        (ml_result,) = evaluate(db, [item], policy)
+        return tag_ticket(db, item, ml_result)
+
+    def _deliver(self, url: str, out: schemas.ClassificationJobOut) -> str:
+        """POST the finished job to its callback URL; return the HTTP status or the error."""
+
+        try:
+            check_callback_url(url, self.callback_allowed_hosts)
+        except ValueError as exc:
+            logger.warning("Callback for job %s refused: %s", out.job_id, exc)
+            return f"refused: {exc}"
+        request = urllib.request.Request(
+            url,
+            data=json.dumps(out.model_dump(mode="json")).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        try:
+            with _callback_opener.open(request, timeout=self.callback_timeout) as response:
+                return str(response.status)
+        except urllib.error.HTTPError as exc:
+            return str(exc.code)
+        except (OSError, ValueError) as exc:
+            logger.warning("Callback for job %s failed: %s", out.job_id, exc)
+            return f"error: {exc}"
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._cond:
+            return {
+                "running": self.running,
+                "workers": self.workers,
+                "quiet_ms": self.quiet_ms,
+                "max_delay_ms": self.max_delay_ms,
+                "queued": self._queued,
+                "tickets_waiting": len(self._pending),
+                "tickets_running": len(self._active),
+                "max_backlog": self.max_backlog,
+                "lease_seconds": self.lease_seconds,
+                "callback_workers": self.callback_workers,
+                "callbacks_pending": self._callbacks_pending,
+                "succeeded": self.succeeded,
+                "failed": self.failed,
+                "classifications": self.classifications,
+            }
+
+
+_workers: Optional[ClassificationWorkers] = None
+
+
+def get_classification_workers() -> ClassificationWorkers:
+    global _workers
+    if _workers is None:
+        settings = get_settings()
+        _workers = ClassificationWorkers(
+            settings.classification_workers,
+            settings.classification_max_backlog,
+            settings.callback_timeout,
+            settings.classification_quiet_ms,
+            settings.classification_max_delay_ms,
+            lease_seconds=settings.classification_job_lease_seconds,
+            callback_workers=settings.callback_workers,
+            callback_allowed_hosts=settings.callback_allowed_hosts,
+        )
+    return _workers
@@ -18,6 +18,9 @@ ALLOWED_PAIRS = {
     ("esim", "pre_purchase"),
 }
 
+# Confidence floor for a decision backed by a high-precision rule.
+HIGH_PRECISION_CONFIDENCE = 0.9
+
 
 def _is_valid_pair(service_type: Optional[str], category: Optional[str]) -> bool:
     if service_type is None or category is None:
@@ -48,7 +51,7 @@ def evaluate(rule_result: Dict[str, object], ml_result: Dict[str, Dict[str, obje
         source = "rule"
         confidence = max(confidence, 0.75)
         if rule_result.get("precision_hint") == "high":
-            confidence = max(confidence, 0.9)
+            confidence = max(confidence, HIGH_PRECISION_CONFIDENCE)
 
     if not _is_valid_pair(service_type, category):
         confidence = min(confidence, 0.4)
@@ -67,3 +70,34 @@ def evaluate(rule_result: Dict[str, object], ml_result: Dict[str, Dict[str, obje
         "action": action,
         "source": source,
     }
+
+
+def rules_settled(rule_result: Dict[str, object]) -> bool:
+    """Whether the rules alone already force an automatic decision for both tags.
+
+    ML can then only raise the confidence above ``HIGH_PRECISION_CONFIDENCE``;
+    it cannot change the tags or the action.
+    """
+
+    service_type = rule_result.get("service_type")
+    category = rule_result.get("category")
+    return bool(
+        rule_result.get("hits")
+        and rule_result.get("precision_hint") == "high"
+        and service_type
+        and category
+        and _is_valid_pair(service_type, category)  # type: ignore[arg-type]
+        and HIGH_PRECISION_CONFIDENCE >= get_settings().high_threshold
+    )
+
+
+def rules_decision(rule_result: Dict[str, object]) -> Dict[str, object]:
+    """The decision for a rule result that ``rules_settled`` accepts, without ML."""
+
+    return {
+        "service_type": rule_result["service_type"],
+        "category": rule_result["category"],
+        "confidence": HIGH_PRECISION_CONFIDENCE,
+        "action": "auto",
+        "source": "rule",
+    }
@@ -0,0 +1,118 @@
+"""Bounded, recency-weighted view of a ticket's conversation."""
+from __future__ import annotations
+
+from collections import Counter
+from dataclasses import dataclass
+from typing import List, Optional
+
+from sqlalchemy.orm import Session
+
+from ..config import get_settings
+from ..models import Message
+from .linear_scorer import LinearScorer
+
+# Rows fetched per query when only a character/token budget limits the window.
+_FETCH_PAGE = 32
+
+
+@dataclass(frozen=True)
+class ContextPolicy:
+    """Which part of a conversation tagging looks at.
+
+    ``max_messages``, ``max_chars`` and ``max_tokens`` keep the newest messages
+    that fit (``0`` means no limit on that axis); the newest message is always
+    kept, truncated to its last ``max_chars`` characters if needed. ``decay``
+    scales the term counts of each older message by ``decay ** age`` for the
+    ML model; ``1.0`` weights all messages equally.
+    """
+
+    max_messages: int = 0
+    max_chars: int = 0
+    max_tokens: int = 0
+    decay: float = 1.0
+
+    @classmethod
+    def from_settings(cls) -> "ContextPolicy":
+        settings = get_settings()
+        return cls(
+            settings.context_max_messages,
+            settings.context_max_chars,
+            settings.context_max_tokens,
+            settings.context_decay,
+        )
+
+    @property
+    def bounded(self) -> bool:
+        return bool(self.max_messages or self.max_chars or self.max_tokens)
+
+
+@dataclass
+class ConversationContext:
+    """Messages inside the window, oldest first."""
+
+    messages: List[str]
+    policy: ContextPolicy
+
+    @property
+    def text(self) -> str:
+        return " ".join(text for text in self.messages if text).strip()
+
+    def weights(self) -> List[float]:
+        newest = len(self.messages) - 1
+        return [self.policy.decay ** (newest - idx) for idx in range(len(self.messages))]
+
+    def term_counts(self, scorer: LinearScorer) -> Counter:
+        """Decay-weighted vocabulary counts of the window, n-grams spanning messages included."""
+
+        counts: Counter = Counter()
+        tail: List[str] = []
+        for text, weight in zip(self.messages, self.weights()):
+            if not text:
+                continue
+            added, tail = scorer.count_terms(text, tail)
+            for idx, n in added.items():
+                counts[idx] += n * weight
+        return counts
+
+
+def load_context(db: Session, ticket_id: str, policy: ContextPolicy) -> ConversationContext:
+    """Fetch only the newest messages the policy keeps, newest first, page by page.
+
+    Pages continue below the last ``message_id`` seen (keyset paging), so each
+    one is an index range scan and messages arriving meanwhile are not re-read.
+    """
+
+    kept: List[str] = []
+    chars = tokens = 0
+    last_seen: Optional[int] = None
+    page_size = min(policy.max_messages, _FETCH_PAGE) if policy.max_messages else _FETCH_PAGE
+    done = False
+    while not done:
+        query = db.query(Message.message_id, Message.text).filter(Message.ticket_id == ticket_id)
+        if last_seen is not None:
+            query = query.filter(Message.message_id < last_seen)
+        rows = query.order_by(Message.message_id.desc()).limit(page_size).all()
+        if rows:
+            last_seen = rows[-1][0]
+        for _, text in rows:
+            text = text or ""
+            if not kept and policy.max_chars and len(text) > policy.max_chars:
+                text = text[-policy.max_chars :]
+            text_tokens = len(text.split())
+            if kept and (
+                (policy.max_chars and chars + len(text) > policy.max_chars)
+                or (policy.max_tokens and tokens + text_tokens > policy.max_tokens)
+            ):
+                done = True
+                break
+            kept.append(text)
+            chars += len(text)
+            tokens += text_tokens
+            if policy.max_messages and len(kept) >= policy.max_messages:
+                done = True
+                break
+        if len(rows) < page_size:
+            done = True
+    kept.reverse()
+    return ConversationContext(kept, policy)
+
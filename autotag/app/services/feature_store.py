@@ -0,0 +1,104 @@
+"""Per-ticket term counts so ingest only tokenizes the newest message."""
+from __future__ import annotations
+
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional
+
+from .ml_classifier import Prediction, TaggingModels, _prediction
+from .prediction_cache import PredictionCache, counts_cache_key
+
+FeatureState = Dict[str, object]
+
+
+def _bootstrap(models: TaggingModels, messages: Iterable[str]) -> FeatureState:
+    scorer = models.scorer
+    assert scorer is not None
+    counts: Counter = Counter()
+    tail: List[str] = []
+    for text in messages:
+        added, tail = scorer.count_terms(text, tail)
+        counts.update(added)
+    return _state(models.version, counts, tail)
+
+
+def _state(version: str, counts: Dict[int, int], tail: List[str]) -> FeatureState:
+    # JSON object keys are strings.
+    return {"version": version, "counts": {str(idx): n for idx, n in counts.items()}, "tail": tail}
+
+
+def add_message(
+    state: Optional[FeatureState],
+    text: str,
+    models: TaggingModels,
+    messages: Callable[[], Iterable[str]],
+) -> FeatureState:
+    """Fold ``text`` into a ticket's term counts.
+
+    Counts are vocabulary indices of one model version; when the state is
+    missing or was built for another version, it is rebuilt once from
+    ``messages()`` (which must already include ``text``).
+    """
+
+    scorer = models.scorer
+    assert scorer is not None
+    if not state or state.get("version") != models.version:
+        return _bootstrap(models, messages())
+    added, tail = scorer.count_terms(text, list(state["tail"]))  # type: ignore[arg-type]
+    counts: Dict[str, int] = dict(state["counts"])  # type: ignore[arg-type]
+    for idx, n in added.items():
+        key = str(idx)
+        counts[key] = counts.get(key, 0) + n
+    return {"version": models.version, "counts": counts, "tail": tail}
+
+
+def usable(state: Optional[FeatureState], models: Optional[TaggingModels]) -> bool:
+    return bool(
+        state
+        and models is not None
+        and models.scorer is not None
+        and state.get("version") == models.version
+    )
+
+
+def state_counts(state: FeatureState) -> Dict[int, int]:
+    return {int(idx): n for idx, n in state["counts"].items()}  # type: ignore[union-attr]
+
+
+def predict_counts(
+    counts: List[Dict[int, float]],
+    models: TaggingModels,
+    cache: Optional[PredictionCache[Prediction]] = None,
+) -> List[Prediction]:
+    """Score term counts; TF-IDF weighting happens here, not at ingest.
+
+    With ``cache``, counts already scored by the same model version are
+    served from it, as ``MLClassifier.predict_batch`` does for texts.
+    """
+
+    if cache is None or not cache.enabled:
+        return _score_counts(counts, models)
+    keys = [counts_cache_key(item, models.version) for item in counts]
+    results = [cache.get(key) for key in keys]
+    missing = [idx for idx, result in enumerate(results) if result is None]
+    if missing:
+        scored = _score_counts([counts[idx] for idx in missing], models)
+        for idx, prediction in zip(missing, scored):
+            results[idx] = prediction
+            cache.put(keys[idx], prediction)
+    return results  # type: ignore[return-value]
+
+
+def _score_counts(counts: List[Dict[int, float]], models: TaggingModels) -> List[Prediction]:
+    scorer = models.scorer
+    assert scorer is not None
+    svc_proba, cat_proba = scorer.predict_proba_counts(counts)
+    svc_labels = scorer.service_classes
+    cat_labels = scorer.category_classes
+    return [
+        _prediction(svc_labels, svc_row, cat_labels, cat_row)
+        for svc_row, cat_row in zip(svc_proba, cat_proba)
+    ]
+
+
+def predict_states(states: List[FeatureState], models: TaggingModels) -> List[Prediction]:
+    return predict_counts([state_counts(state) for state in states], models)
@@ -0,0 +1,188 @@
+"""Group commit of ingest writes from concurrent requests."""
+from __future__ import annotations
+
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Union
+
+from sqlalchemy.orm import Session
+
+from .. import schemas
+from ..config import get_settings
+from ..db import SessionLocal
+from .batch_collector import BatchCollector, Pending
+from .classification_workers import add_job
+from .context_window import ContextPolicy
+from .ingest_pipeline import Evaluation, classify, conversation_locks, store_message
+
+logger = logging.getLogger(__name__)
+
+Result = Union[schemas.IngestOut, schemas.IngestAcceptedOut]
+
+
+@dataclass(frozen=True)
+class _Write:
+    payload: schemas.MessageIn
+    accept: bool
+
+
+class GroupCommitWriter:
+    """Run the ingest writes of concurrent requests on one thread and commit them together.
+
+    The first request to arrive opens a batch; the batch is written once
+    ``max_delay_ms`` has elapsed or ``max_batch`` requests are waiting,
+    whichever comes first. The writer stores every message of the batch,
+    classifies each affected ticket once (as ``/messages/ingest:batch`` does)
+    and commits messages, ticket updates, tag audits and jobs in a single
+    transaction, so the batch pays for one commit instead of one per request.
+    Each caller blocks until that commit has returned. A request whose batch
+    has not started within ``wait_timeout`` seconds is withdrawn unwritten
+    and raises ``TimeoutError``. Rules, ML and LLM work for every grouped
+    request runs on the writer thread, inside the batch.
+
+    A failed batch is rolled back and its requests are replayed one
+    transaction each, so a bad message only fails its own request.
+    """
+
+    def __init__(
+        self,
+        max_batch: int,
+        max_delay_ms: float,
+        enabled: bool = True,
+        session_factory: Callable[[], Session] = SessionLocal,
+        wait_timeout: float = 30.0,
+    ) -> None:
+        self.enabled = enabled
+        self._session_factory = session_factory
+        self._collector: BatchCollector[_Write, Result] = BatchCollector(
+            self._run, max_delay_ms, max_batch, "group-commit", wait_timeout
+        )
+        self._stats_lock = threading.Lock()
+        self.writes = 0
+        self.batches = 0
+        self.replayed = 0
+        self.failed = 0
+
+    @property
+    def max_batch(self) -> int:
+        return self._collector.max_batch
+
+    @property
+    def max_delay_ms(self) -> float:
+        return self._collector.window_ms
+
+    @property
+    def running(self) -> bool:
+        return self._collector.running
+
+    def ingest(self, payload: schemas.MessageIn) -> schemas.IngestOut:
+        """Store and classify a message; returns once its batch is committed."""
+
+        return self._collector.submit(_Write(payload, accept=False))  # type: ignore[return-value]
+
+    def accept(self, payload: schemas.AsyncMessageIn) -> schemas.IngestAcceptedOut:
+        """Store a message with a queued classification job; returns once its batch is committed."""
+
+        return self._collector.submit(_Write(payload, accept=True))  # type: ignore[return-value]
+
+    def start(self) -> None:
+        if self.enabled:
+            self._collector.start()
+
+    def stop(self) -> None:
+        self._collector.stop()
+
+    def _run(self, batch: List[Pending[_Write, Result]]) -> None:
+        replayed = False
+        try:
+            self._write(batch)
+            committed = [batch]
+        except Exception as exc:
+            if len(batch) == 1:
+                logger.exception("Ingest write failed")
+                batch[0].error = exc
+                committed = []
+            else:
+                logger.warning("Group commit of %d writes failed; replaying them one by one", len(batch), exc_info=True)
+                replayed = True
+                committed = [[pending] for pending in batch if self._replay(pending)]
+        with self._stats_lock:
+            self.batches += len(committed)
+            self.writes += sum(len(group) for group in committed)
+            self.failed += sum(pending.error is not None for pending in batch)
+            self.replayed += replayed
+
+    def _replay(self, pending: Pending[_Write, Result]) -> bool:
+        """Write one request of a failed batch on its own; the failure goes to its caller only."""
+
+        try:
+            self._write([pending])
+        except Exception as exc:
+            logger.exception("Ingest write failed")
+            pending.error = exc
+            return False
+        return True
+
+    def _write(self, batch: List[Pending[_Write, Result]]) -> None:
+        """Store, classify and commit ``batch`` in one transaction."""
+
+        policy = ContextPolicy.from_settings()
+        db = self._session_factory()
+        try:
+            with conversation_locks(pending.item.payload.conversation_id for pending in batch):
+                items: Dict[str, Evaluation] = {}
+                results: List[Union[str, schemas.IngestAcceptedOut]] = []
+                for pending in batch:
+                    item = store_message(db, pending.item.payload, policy)
+                    ticket_id = item.ticket.ticket_id
+                    if pending.item.accept:
+                        job = add_job(db, item, pending.item.payload.callback_url)  # type: ignore[attr-defined]
+                        results.append(
+                            schemas.IngestAcceptedOut(ticket_id=ticket_id, job_id=job.job_id, status=job.status)
+                        )
+                        if ticket_id not in items:
+                            continue
+                    else:
+                        results.append(ticket_id)
+                    # The last message of a ticket carries its latest rule result and language.
+                    items[ticket_id] = item
+                outcomes = classify(db, items, policy)
+                db.commit()
+        finally:
+            db.close()
+        for pending, result in zip(batch, results):
+            pending.result = outcomes[result] if isinstance(result, str) else result
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._stats_lock:
+            writes, batches, replayed, failed = self.writes, self.batches, self.replayed, self.failed
+        return {
+            "enabled": self.enabled,
+            "running": self.running,
+            "max_batch": self.max_batch,
+            "max_delay_ms": self.max_delay_ms,
+            "wait_timeout": self._collector.wait_timeout,
+            "queued": self._collector.queued,
+            "writes": writes,
+            "batches": batches,
+            "replayed_batches": replayed,
+            "failed": failed,
+            **self._collector.stats(),
+        }
+
+
+_writer: Optional[GroupCommitWriter] = None
+
+
+def get_group_commit_writer() -> GroupCommitWriter:
+    global _writer
+    if _writer is None:
+        settings = get_settings()
+        _writer = GroupCommitWriter(
+            settings.group_commit_max_batch,
+            settings.group_commit_max_delay_ms,
+            enabled=settings.group_commit,
+            wait_timeout=settings.group_commit_wait_timeout,
+        )
+    return _writer
@@ -0,0 +1,91 @@
+"""Micro-batching of concurrent ML predictions."""
+from __future__ import annotations
+
+from typing import Callable, Dict, List, Optional
+
+from ..config import get_settings
+from .batch_collector import BatchCollector, Pending
+from .ml_classifier import MLClassifier, Prediction
+from .online_learner import OnlineLearner, get_serving_classifier
+
+
+class InferenceScheduler:
+    """Collect concurrent ``predict`` calls into one ``predict_batch`` call.
+
+    The first request to arrive opens a batch; the batch is flushed once
+    ``window_ms`` has elapsed or ``max_batch`` requests are waiting, whichever
+    comes first. Each caller blocks until its own row of the batch is ready, so
+    ``predict`` behaves exactly like ``MLClassifier.predict``. A window of ``0``
+    disables batching and scores every call directly.
+    """
+
+    def __init__(
+        self,
+        window_ms: float,
+        max_batch: int,
+        classifier: Callable[[], MLClassifier | OnlineLearner] = get_serving_classifier,
+    ) -> None:
+        self._classifier = classifier
+        self._collector: BatchCollector[str, Prediction] = BatchCollector(
+            self._run, window_ms, max_batch, "inference-batcher"
+        )
+
+    @property
+    def window_ms(self) -> float:
+        return self._collector.window_ms
+
+    @property
+    def max_batch(self) -> int:
+        return self._collector.max_batch
+
+    @property
+    def enabled(self) -> bool:
+        return self.window_ms > 0
+
+    @property
+    def running(self) -> bool:
+        return self._collector.running
+
+    def predict(self, text: str) -> Prediction:
+        if not self.enabled:
+            return self._collector.run([text])[0]
+        return self._collector.submit(text)
+
+    def predict_batch(self, texts: List[str]) -> List[Prediction]:
+        """Score an already-batched request directly, still recording its latency."""
+
+        return self._collector.run(texts)
+
+    def start(self) -> None:
+        self._collector.start()
+
+    def stop(self) -> None:
+        self._collector.stop()
+
+    def _run(self, batch: List[Pending[str, Prediction]]) -> None:
+        results = self._classifier().predict_batch([pending.item for pending in batch])
+        for pending, result in zip(batch, results):
+            pending.result = result
+
+    def snapshot(self) -> Dict[str, object]:
+        return {
+            "enabled": self.enabled,
+            "running": self.running,
+            "window_ms": self.window_ms,
+            "max_batch": self.max_batch,
+            "queued": self._collector.queued,
+            "predictions": self._collector.items,
+            "batches": self._collector.batches,
+            **self._collector.stats(),
+        }
+
+
+_scheduler: Optional[InferenceScheduler] = None
+
+
+def get_inference_scheduler() -> InferenceScheduler:
+    global _scheduler
+    if _scheduler is None:
+        settings = get_settings()
+        _scheduler = InferenceScheduler(settings.inference_batch_window_ms, settings.inference_max_batch)
+    return _scheduler
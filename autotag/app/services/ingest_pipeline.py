@@ -0,0 +1,359 @@
+"""Message ingestion pipeline shared by the synchronous and asynchronous endpoints."""
+from __future__ import annotations
+
+import threading
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session
+
+from .. import schemas
+from ..config import get_settings
+from ..db import upsert_insert
+from ..models import Message, Ticket, TicketFeatureState, TicketIdSequence, TicketRuleState
+from . import (
+    clarification_bot,
+    confidence_policy,
+    feature_store,
+    lang_and_scrub,
+    llm_adjudicator,
+    metric_counters,
+    metric_rollups,
+    short_circuit,
+)
+from .context_window import ContextPolicy, ConversationContext, load_context
+from .inference_scheduler import get_inference_scheduler
+from .ml_classifier import Prediction, TaggingModels, get_classifier
+from .rules_engine import RulesEngine, get_rules_engine
+from .rules_reloader import get_rules_reloader
+from .tag_writer import write_tags
+
+# conversation_id -> [lock, number of holders and waiters]
+_conversation_locks: Dict[str, List[object]] = {}
+_conversation_locks_guard = threading.Lock()
+
+
+@contextmanager
+def conversation_lock(conversation_id: str) -> Iterator[None]:
+    """Serialize ingest and classification of one conversation within this process.
+
+    Entries are dropped once nobody holds or waits for them, so the registry
+    only grows with the number of conversations being worked on.
+    """
+
+    with _conversation_locks_guard:
+        entry = _conversation_locks.setdefault(conversation_id, [threading.Lock(), 0])
+        entry[1] += 1  # type: ignore[operator]
+    try:
+        with entry[0]:  # type: ignore[attr-defined]
+            yield
+    finally:
+        with _conversation_locks_guard:
+            entry[1] -= 1  # type: ignore[operator]
+            if not entry[1]:
+                del _conversation_locks[conversation_id]
+
+
+@contextmanager
+def conversation_locks(conversation_ids: Iterable[str]) -> Iterator[None]:
+    """Hold the locks of several conversations, taken in sorted order to avoid deadlocks."""
+
+    with ExitStack() as stack:
+        for conversation_id in sorted(set(conversation_ids)):
+            stack.enter_context(conversation_lock(conversation_id))
+        yield
+
+
+def _next_ticket_id(db: Session) -> str:
+    allocation = TicketIdSequence()
+    db.add(allocation)
+    db.flush()
+    return f"TK{allocation.value:04d}"
+
+
+def get_or_create_ticket(db: Session, conversation_id: str) -> Ticket:
+    """Return the conversation's ticket, creating it with one atomic upsert if needed.
+
+    A concurrent ingest that creates the same conversation first wins; the
+    loser's insert is a no-op and both read back the same row.
+    """
+
+    ticket = db.query(Ticket).filter_by(conversation_id=conversation_id).first()
+    if ticket:
+        return ticket
+    created = db.execute(
+        upsert_insert(db)(Ticket)
+        .values(ticket_id=_next_ticket_id(db), conversation_id=conversation_id)
+        .on_conflict_do_nothing(index_elements=[Ticket.conversation_id])
+    )
+    if created.rowcount:
+        metric_counters.ticket_created(db)
+    return db.query(Ticket).filter_by(conversation_id=conversation_id).one()
+
+
+def _joined_messages(ticket: Ticket) -> str:
+    return " ".join(msg.text for msg in ticket.messages if msg.text)
+
+
+def _conversation_text(ticket: Ticket) -> str:
+    """Concatenate scrubbed message text for downstream tagging."""
+
+    return _joined_messages(ticket).strip()
+
+
+def _rules_engine() -> RulesEngine:
+    """The current rules engine; a rules file rewritten since it was read is reloaded in the background."""
+
+    get_rules_reloader().reload_if_changed()
+    return get_rules_engine()
+
+
+def _apply_rules_incremental(ticket: Ticket, text: str, lang: str) -> dict:
+    """Evaluate rules for the new message only, merging into the ticket's stored hits."""
+
+    previous = ticket.rule_state.state if ticket.rule_state else None
+    rules, state = _rules_engine().apply_incremental(
+        text, lang, previous, lambda: _joined_messages(ticket)
+    )
+    if ticket.rule_state is None:
+        ticket.rule_state = TicketRuleState(state=state)
+    else:
+        ticket.rule_state.state = state
+    return rules
+
+
+def current_rules(ticket: Ticket, lang: str) -> dict:
+    """Rule result for the conversation as stored, without adding a message."""
+
+    previous = ticket.rule_state.state if ticket.rule_state else None
+    rules, _ = _rules_engine().apply_incremental("", lang, previous, lambda: _joined_messages(ticket))
+    return rules
+
+
+def _scoring_models() -> Optional[TaggingModels]:
+    """Models able to score term counts directly, or ``None`` to score text."""
+
+    if get_settings().online_serving:
+        return None
+    models = get_classifier().current_models()
+    return models if models.scorer is not None else None
+
+
+def _update_features(ticket: Ticket, text: str) -> None:
+    """Add the new message's term counts to the ticket's stored vector."""
+
+    models = _scoring_models() if get_settings().feature_store else None
+    if models is None:
+        return
+    previous = ticket.feature_state.state if ticket.feature_state else None
+    state = feature_store.add_message(
+        previous, text, models, lambda: [msg.text for msg in ticket.messages if msg.text]
+    )
+    if ticket.feature_state is None:
+        ticket.feature_state = TicketFeatureState(state=state)
+    else:
+        ticket.feature_state.state = state
+
+
+@dataclass
+class Evaluation:
+    """One ticket being tagged in this request."""
+
+    ticket: Ticket
+    lang: str
+    rules: Optional[dict] = None
+    context: Optional[ConversationContext] = None
+    message_id: Optional[int] = None
+    skipped: Optional[str] = None
+
+    def conversation_text(self) -> str:
+        if self.context is not None:
+            return self.context.text
+        return _conversation_text(self.ticket)
+
+
+def evaluate(db: Session, items: list[Evaluation], policy: ContextPolicy) -> list[Optional[Prediction]]:
+    """Fill in rule results for windowed tickets and score every ticket with the ML model.
+
+    Tickets whose outcome is already settled get ``item.skipped`` set and a
+    ``None`` prediction instead.
+    """
+
+    engine = _rules_engine()
+    for item in items:
+        if short_circuit.human_tagged(item.ticket):
+            # Not even the window is loaded: nothing computed here would be used.
+            item.skipped = short_circuit.HUMAN_TAGGED
+            continue
+        if policy.bounded:
+            item.context = load_context(db, item.ticket.ticket_id, policy)
+            item.rules = engine.apply_rules(item.context.text, item.lang)
+        item.skipped = short_circuit.skip_reason(item.ticket, item.rules)
+    short_circuit.get_short_circuit_stats().record(item.skipped for item in items)
+
+    scored = [item for item in items if item.skipped is None]
+    predictions = iter(_predict(scored) if scored else [])
+    return [None if item.skipped else next(predictions) for item in items]
+
+
+def _predict(items: list[Evaluation]) -> list[Prediction]:
+    """Score from term counts where possible (window or stored), else from text."""
+
+    models = _scoring_models()
+    results: list[Optional[Prediction]] = [None] * len(items)
+    counted: list[tuple[int, dict]] = []
+    if models is not None:
+        use_store = get_settings().feature_store
+        for idx, item in enumerate(items):
+            if item.context is not None:
+                counted.append((idx, item.context.term_counts(models.scorer)))  # type: ignore[arg-type]
+                continue
+            state = item.ticket.feature_state.state if item.ticket.feature_state else None
+            if use_store and feature_store.usable(state, models):
+                counted.append((idx, feature_store.state_counts(state)))  # type: ignore[arg-type]
+    if counted:
+        predictions = feature_store.predict_counts(
+            [counts for _, counts in counted], models, get_classifier().cache  # type: ignore[arg-type]
+        )
+        for (idx, _), prediction in zip(counted, predictions):
+            results[idx] = prediction
+
+    rest = [idx for idx, result in enumerate(results) if result is None]
+    if len(rest) == 1:
+        results[rest[0]] = get_inference_scheduler().predict(items[rest[0]].conversation_text())
+    elif rest:
+        texts = [items[idx].conversation_text() for idx in rest]
+        for idx, prediction in zip(rest, get_inference_scheduler().predict_batch(texts)):
+            results[idx] = prediction
+    return results  # type: ignore[return-value]
+
+
+def store_message(db: Session, payload: schemas.MessageIn, policy: ContextPolicy) -> Evaluation:
+    """Persist a scrubbed message; without a context window, fold it into the per-ticket state."""
+
+    ticket = get_or_create_ticket(db, payload.conversation_id)
+    lang = lang_and_scrub.detect_lang(payload.text)
+    clean_text, redactions = lang_and_scrub.scrub_pii(payload.text)
+
+    message = Message(
+        ticket_id=ticket.ticket_id,
+        sender=payload.sender,
+        text=clean_text,
+        lang=lang,
+        pii_redactions=redactions,
+    )
+    # Added directly rather than through ``ticket.messages`` so the whole
+    # conversation is not loaded; a collection already loaded is refreshed.
+    db.add(message)
+    db.flush()
+    if "messages" not in inspect(ticket).unloaded:
+        db.expire(ticket, ["messages"])
+    ticket.updated_at = message.ts or datetime.utcnow()
+
+    if policy.bounded:
+        # Windowed tickets are re-evaluated from their window; running states would go stale.
+        ticket.rule_state = None
+        ticket.feature_state = None
+        return Evaluation(ticket, lang, message_id=message.message_id)
+    rules = _apply_rules_incremental(ticket, clean_text, lang)
+    _update_features(ticket, clean_text)
+    return Evaluation(ticket, lang, rules, message_id=message.message_id)
+
+
+def classify(db: Session, items: Dict[str, Evaluation], policy: ContextPolicy) -> Dict[str, schemas.IngestOut]:
+    """Score each ticket of ``items`` (keyed by ticket id) once and write its tags."""
+
+    ml_results = evaluate(db, list(items.values()), policy)
+    return {
+        ticket_id: tag_ticket(db, item, ml_result)
+        for (ticket_id, item), ml_result in zip(items.items(), ml_results)
+    }
+
+
+def tag_ticket(db: Session, item: Evaluation, ml_result: Optional[dict]) -> schemas.IngestOut:
+    """Run the confidence policy (and LLM stub) and write the resulting tags."""
+
+    settings = get_settings()
+    ticket = item.ticket
+    rules = item.rules or {}
+    rules_version = rules.get("rules_version")
+    if item.skipped == short_circuit.HUMAN_TAGGED:
+        metric_rollups.record_decision(
+            db, "skipped", str(ticket.tag_source), ticket.service_type, ticket.category, False, item.skipped
+        )
+        return schemas.IngestOut(
+            ticket_id=ticket.ticket_id,
+            suggested_tags=schemas.SuggestedTags(service_type=ticket.service_type, category=ticket.category),
+            confidence=ticket.tag_confidence if ticket.tag_confidence is not None else 1.0,
+            source=str(ticket.tag_source),
+            clarifier_question=None,
+            rules_version=rules_version,
+            skipped=item.skipped,
+        )
+    if ml_result is None:
+        decision = confidence_policy.rules_decision(rules)
+    else:
+        decision = confidence_policy.evaluate(rules, ml_result)
+
+    final_service = decision["service_type"]
+    final_category = decision["category"]
+    final_confidence = float(decision["confidence"])
+    source = str(decision["source"])
+    clarifier: Optional[dict] = None
+    applied = False
+
+    if decision["action"] == "auto":
+        applied = True
+        write_tags(
+            db,
+            ticket,
+            final_service,
+            final_category,
+            final_confidence,
+            source,
+            rules_version=rules_version,
+        )
+    elif decision["action"] == "llm":
+        llm_result = llm_adjudicator.adjudicate(
+            item.conversation_text(),
+            {"service_type": final_service, "category": final_category},
+        )
+        final_service = llm_result.get("service_type") or final_service
+        final_category = llm_result.get("category") or final_category
+        final_confidence = float(llm_result.get("confidence", final_confidence))
+        source = "llm"
+        if final_confidence >= settings.high_threshold:
+            applied = True
+            write_tags(
+                db,
+                ticket,
+                final_service,
+                final_category,
+                final_confidence,
+                source,
+                rules_version=rules_version,
+            )
+        else:
+            clarifier = clarification_bot.maybe_question(final_service, final_category)
+    else:
+        clarifier = clarification_bot.maybe_question(final_service, final_category)
+
+    metric_rollups.record_decision(
+        db, str(decision["action"]), source, final_service, final_category, applied, item.skipped
+    )
+    return schemas.IngestOut(
+        ticket_id=ticket.ticket_id,
+        suggested_tags=schemas.SuggestedTags(
+            service_type=final_service,
+            category=final_category,
+        ),
+        confidence=final_confidence,
+        source=source,
+        clarifier_question=clarifier,
+        rules_version=rules_version,
+        skipped=item.skipped,
+    )
+
@@ -0,0 +1,217 @@
+"""NumPy re-implementation of the TF-IDF + logistic regression scoring path."""
+from __future__ import annotations
+
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+
+# Vectorizer options that change how text becomes features; only the listed
+# values are reproduced by the scorer.
+_SUPPORTED_VECTORIZER = {
+    "input": ("content",),
+    "analyzer": ("word",),
+    "strip_accents": (None,),
+    "preprocessor": (None,),
+    "tokenizer": (None,),
+    "stop_words": (None,),
+    "binary": (False,),
+    "norm": ("l2", "l1", None),
+}
+
+
+def _is_ovr(clf: LogisticRegression) -> bool:
+    """Mirror ``LogisticRegression.predict_proba``'s choice between OvR and softmax."""
+
+    multi_class = getattr(clf, "multi_class", "deprecated")
+    if multi_class == "ovr":
+        return True
+    if multi_class == "multinomial":
+        return False
+    return len(clf.classes_) <= 2 or clf.solver == "liblinear"
+
+
+@dataclass
+class LinearHead:
+    classes: np.ndarray
+    coef: np.ndarray  # (n_rows, n_features); one row for binary heads
+    intercept: np.ndarray
+    ovr: bool
+
+    @classmethod
+    def from_classifier(cls, clf: LogisticRegression) -> "LinearHead":
+        return cls(
+            np.asarray(clf.classes_).astype(str),
+            np.asarray(clf.coef_, dtype=np.float64),
+            np.asarray(clf.intercept_, dtype=np.float64),
+            _is_ovr(clf),
+        )
+
+    def predict_proba(self, features: csr_matrix) -> np.ndarray:
+        """Score every row of ``features`` with one sparse-dense product."""
+
+        scores = np.asarray(features @ self.coef.T) + self.intercept
+        if self.coef.shape[0] == 1:
+            positive = 1.0 / (1.0 + np.exp(-scores[:, 0]))
+            return np.column_stack([1.0 - positive, positive])
+        if self.ovr:
+            probs = 1.0 / (1.0 + np.exp(-scores))
+            return probs / probs.sum(axis=1, keepdims=True)
+        scores = np.exp(scores - scores.max(axis=1, keepdims=True))
+        return scores / scores.sum(axis=1, keepdims=True)
+
+
+class LinearScorer:
+    """Tokenize, weight and score text without going through scikit-learn.
+
+    Built from a fitted ``TfidfVectorizer`` shared by both heads, it reproduces
+    ``predict_proba`` of the service and category classifiers (up to float
+    rounding) while skipping sklearn's per-call validation, which dominates the
+    latency for a single short text. The vocabulary, IDF vector and coefficient
+    arrays are the fitted models' own, not copies, so a memory-mapped artifact
+    stays shared and nothing is stored twice.
+    """
+
+    def __init__(
+        self,
+        vocabulary: Dict[str, int],
+        idf: Optional[np.ndarray],
+        settings: Dict[str, object],
+        service: LinearHead,
+        category: LinearHead,
+    ) -> None:
+        self.vocabulary = vocabulary
+        self.idf = idf
+        self.settings = settings
+        self.service = service
+        self.category = category
+        self._token_pattern = re.compile(str(settings["token_pattern"]))
+        self._lowercase = bool(settings["lowercase"])
+        self._ngram_range: Tuple[int, int] = tuple(settings["ngram_range"])  # type: ignore[assignment]
+        self._sublinear_tf = bool(settings["sublinear_tf"])
+        self._norm = settings["norm"]
+
+    @classmethod
+    def from_models(
+        cls,
+        vectorizer: TfidfVectorizer,
+        service_clf: LogisticRegression,
+        category_clf: LogisticRegression,
+    ) -> "LinearScorer":
+        """Export fitted models; raise ``ValueError`` for options the scorer cannot mirror."""
+
+        params = vectorizer.get_params()
+        for name, allowed in _SUPPORTED_VECTORIZER.items():
+            if params[name] not in allowed:
+                raise ValueError(f"Unsupported vectorizer option {name}={params[name]!r}")
+        settings: Dict[str, object] = {
+            "token_pattern": params["token_pattern"],
+            "lowercase": params["lowercase"],
+            "ngram_range": tuple(params["ngram_range"]),
+            "sublinear_tf": params["sublinear_tf"],
+            "norm": params["norm"],
+        }
+        idf = np.asarray(vectorizer.idf_, dtype=np.float64) if params["use_idf"] else None
+        return cls(
+            vectorizer.vocabulary_,
+            idf,
+            settings,
+            LinearHead.from_classifier(service_clf),
+            LinearHead.from_classifier(category_clf),
+        )
+
+    @property
+    def service_classes(self) -> List[str]:
+        return self.service.classes.tolist()
+
+    @property
+    def category_classes(self) -> List[str]:
+        return self.category.classes.tolist()
+
+    def _tokens(self, text: str) -> List[str]:
+        if self._lowercase:
+            text = text.lower()
+        return self._token_pattern.findall(text)
+
+    def _ngrams(self, text: str) -> List[str]:
+        tokens = self._tokens(text)
+        min_n, max_n = self._ngram_range
+        if max_n == 1:
+            return tokens
+        grams = list(tokens) if min_n == 1 else []
+        for n in range(max(min_n, 2), max_n + 1):
+            grams.extend(" ".join(tokens[i : i + n]) for i in range(len(tokens) - n + 1))
+        return grams
+
+    def count_terms(self, text: str, tail: List[str]) -> Tuple[Counter, List[str]]:
+        """Count the vocabulary n-grams ``text`` adds to a text ending in ``tail``.
+
+        ``tail`` holds the last tokens seen so far (at most ``max_n - 1``), so
+        n-grams spanning the boundary are counted exactly as if the texts had
+        been joined with a space and tokenized together. Returns the counts and
+        the tail to pass along with the next text.
+        """
+
+        vocabulary = self.vocabulary
+        min_n, max_n = self._ngram_range
+        tokens = list(tail) + self._tokens(text)
+        offset = len(tail)
+        counts: Counter = Counter()
+        for n in range(min_n, max_n + 1):
+            for start in range(max(0, offset - n + 1), len(tokens) - n + 1):
+                idx = vocabulary.get(" ".join(tokens[start : start + n]))
+                if idx is not None:
+                    counts[idx] += 1
+        return counts, tokens[len(tokens) - max_n + 1 :] if max_n > 1 else []
+
+    def features(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the non-zero TF-IDF feature indices and weights of ``text``."""
+
+        vocabulary = self.vocabulary
+        counts = Counter(idx for idx in map(vocabulary.get, self._ngrams(text)) if idx is not None)
+        return self.weigh(counts)
+
+    def weigh(self, counts: Dict[int, float]) -> Tuple[np.ndarray, np.ndarray]:
+        """Apply TF-IDF weighting and normalization to raw term counts."""
+
+        indices = np.fromiter(counts.keys(), dtype=np.intp, count=len(counts))
+        values = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+        if self._sublinear_tf and len(values):
+            values = np.log(values) + 1.0
+        if self.idf is not None:
+            values = values * self.idf[indices]
+        if self._norm == "l2":
+            norm = np.sqrt(values @ values)
+        elif self._norm == "l1":
+            norm = np.abs(values).sum()
+        else:
+            norm = 0.0
+        if norm > 0:
+            values = values / norm
+        return indices, values
+
+    def predict_proba(self, texts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        return self._predict_features([self.features(text) for text in texts])
+
+    def predict_proba_counts(self, counts: List[Dict[int, float]]) -> Tuple[np.ndarray, np.ndarray]:
+        """Score accumulated term counts, e.g. from ``count_terms`` over many messages."""
+
+        return self._predict_features([self.weigh(item) for item in counts])
+
+    def _predict_features(
+        self, features: List[Tuple[np.ndarray, np.ndarray]]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        indptr = np.zeros(len(features) + 1, dtype=np.intp)
+        indptr[1:] = np.cumsum([len(indices) for indices, _ in features])
+        if features:
+            indices = np.concatenate([indices for indices, _ in features])
+            values = np.concatenate([values for _, values in features])
+        else:
+            indices, values = np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float64)
+        matrix = csr_matrix((values, indices, indptr), shape=(len(features), len(self.vocabulary)))
+        return self.service.predict_proba(matrix), self.category.predict_proba(matrix)
@@ -0,0 +1,79 @@
+"""Aho–Corasick automaton for finding many literal keywords in one pass."""
+from __future__ import annotations
+
+from collections import deque
+from typing import Dict, Generic, Hashable, List, Set, Tuple, TypeVar
+
+T = TypeVar("T", bound=Hashable)
+
+
+class LiteralAutomaton(Generic[T]):
+    """Multi-string matcher reporting the values of every literal found in a text.
+
+    Literals are added with ``add`` and the automaton is finalized with
+    ``build``; ``find`` then walks the text once, independently of how many
+    literals were added.
+    """
+
+    def __init__(self) -> None:
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[T, ...]] = [()]
+        self._built = False
+
+    def __len__(self) -> int:
+        return len(self._goto)
+
+    def add(self, literal: str, value: T) -> None:
+        if not literal:
+            raise ValueError("Cannot add an empty literal")
+        if self._built:
+            raise RuntimeError("Automaton is already built")
+        state = 0
+        for char in literal:
+            nxt = self._goto[state].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            state = nxt
+        if value not in self._out[state]:
+            self._out[state] = self._out[state] + (value,)
+
+    def build(self) -> None:
+        """Compute failure links and merge outputs along them (breadth first)."""
+
+        queue: deque[int] = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                inherited = self._out[self._fail[nxt]]
+                if inherited:
+                    self._out[nxt] = self._out[nxt] + tuple(
+                        value for value in inherited if value not in self._out[nxt]
+                    )
+        self._built = True
+
+    def find(self, text: str) -> Set[T]:
+        """Return the values attached to every literal occurring in ``text``."""
+
+        if not self._built:
+            self.build()
+        goto, fail, out = self._goto, self._fail, self._out
+        found: Set[T] = set()
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                found.update(out[state])
+        return found
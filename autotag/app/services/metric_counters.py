@@ -0,0 +1,146 @@
+"""Running totals behind ``/admin/metrics``, kept in step with ticket and tag writes.
+
+Counters are rows of ``metric_counters`` bumped by atomic upserts inside the
+transaction that creates a ticket or changes its tags, so they commit or
+roll back together with the change they count. Names:
+
+- ``tickets``: number of tickets.
+- ``class:<service_type>::<category>``: tickets per current tag pair.
+- ``source:<tag_source>``: tickets per current tag source.
+- ``audits:<source>``: tag audits written per source.
+
+Missing tags and sources are recorded as ``unknown``/``none``.
+"""
+from __future__ import annotations
+
+from collections import Counter
+from typing import Dict, Optional
+
+from sqlalchemy import delete, func
+from sqlalchemy.orm import Session
+
+from ..db import upsert_insert
+from ..models import MetricCounter, TagAudit, Ticket
+from . import metric_rollups
+
+AUTO_SOURCES = ("rule", "ml", "llm")
+
+
+def class_key(service_type: Optional[str], category: Optional[str]) -> str:
+    return f"class:{service_type or 'unknown'}::{category or 'unknown'}"
+
+
+def source_key(source: Optional[str]) -> str:
+    return f"source:{source or 'none'}"
+
+
+def bump(db: Session, deltas: Dict[str, int]) -> None:
+    """Add ``deltas`` to the named counters in the current transaction."""
+
+    insert = upsert_insert(db)
+    for name, delta in deltas.items():
+        if not delta:
+            continue
+        statement = insert(MetricCounter).values(name=name, value=delta)
+        db.execute(
+            statement.on_conflict_do_update(
+                index_elements=[MetricCounter.name],
+                set_={"value": MetricCounter.value + statement.excluded.value},
+            )
+        )
+
+
+def ticket_created(db: Session) -> None:
+    bump(db, {"tickets": 1, class_key(None, None): 1, source_key(None): 1})
+    metric_rollups.record(db, {"tickets": 1})
+
+
+def tags_changed(
+    db: Session,
+    old: tuple[Optional[str], Optional[str], Optional[str]],
+    new: tuple[Optional[str], Optional[str], Optional[str]],
+) -> None:
+    """Move a ticket between classes/sources and count the audit; tuples are (service, category, source)."""
+
+    deltas: Counter = Counter()
+    deltas[class_key(old[0], old[1])] -= 1
+    deltas[class_key(new[0], new[1])] += 1
+    deltas[source_key(old[2])] -= 1
+    deltas[source_key(new[2])] += 1
+    deltas[f"audits:{new[2]}"] += 1
+    bump(db, deltas)
+    metric_rollups.record(db, {f"audits:{new[2]}": 1})
+
+
+def read(db: Session) -> Dict[str, int]:
+    return {name: value for name, value in db.query(MetricCounter.name, MetricCounter.value)}
+
+
+def from_tables(db: Session) -> Dict[str, int]:
+    """Recompute every counter from ``tickets`` and ``tag_audits`` (full scans)."""
+
+    counters: Dict[str, int] = {"tickets": db.query(func.count(Ticket.ticket_id)).scalar() or 0}
+    for service_type, category, count in db.query(
+        Ticket.service_type, Ticket.category, func.count(Ticket.ticket_id)
+    ).group_by(Ticket.service_type, Ticket.category):
+        counters[class_key(service_type, category)] = count
+    for source, count in db.query(Ticket.tag_source, func.count(Ticket.ticket_id)).group_by(Ticket.tag_source):
+        counters[source_key(source)] = count
+    for source, count in db.query(TagAudit.source, func.count(TagAudit.audit_id)).group_by(TagAudit.source):
+        counters[f"audits:{source}"] = count
+    return counters
+
+
+def differences(db: Session) -> Dict[str, tuple[int, int]]:
+    """Counters whose stored value differs from the tables, as ``name -> (stored, actual)``."""
+
+    stored = read(db)
+    actual = from_tables(db)
+    return {
+        name: (stored.get(name, 0), actual.get(name, 0))
+        for name in stored.keys() | actual.keys()
+        if stored.get(name, 0) != actual.get(name, 0)
+    }
+
+
+def rebuild(db: Session) -> Dict[str, int]:
+    """Replace all counters with values recomputed from the tables."""
+
+    counters = from_tables(db)
+    db.execute(delete(MetricCounter))
+    db.add_all(MetricCounter(name=name, value=value) for name, value in counters.items())
+    db.flush()
+    return counters
+
+
+def ensure_initialized(db: Session) -> bool:
+    """Build the counters for a database created before they existed; ``True`` if rebuilt."""
+
+    if db.query(MetricCounter.name).first() is not None:
+        return False
+    if db.query(Ticket.ticket_id).first() is None:
+        return False
+    rebuild(db)
+    return True
+
+
+def metrics(db: Session) -> dict:
+    """The ``/admin/metrics`` payload, read from the counters only; rates are per ticket."""
+
+    counters = read(db)
+    total_tickets = counters.get("tickets", 0)
+    auto_tickets = sum(counters.get(source_key(source), 0) for source in AUTO_SOURCES)
+    override_events = counters.get("audits:agent", 0)
+    llm_hits = counters.get(source_key("llm"), 0)
+    class_distribution = {
+        name.removeprefix("class:"): value
+        for name, value in sorted(counters.items())
+        if name.startswith("class:") and value
+    }
+    return {
+        "auto_tag_rate": auto_tickets / total_tickets if total_tickets else 0.0,
+        "override_rate": override_events / total_tickets if total_tickets else 0.0,
+        "class_distribution": class_distribution,
+        "llm_hit_rate": llm_hits / total_tickets if total_tickets else 0.0,
+        "tickets": total_tickets,
+    }
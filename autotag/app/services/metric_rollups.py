@@ -0,0 +1,141 @@
+"""Hourly rollups of tagging outcomes for windowed metrics.
+
+Each row of ``metric_rollups`` is one named count for one UTC hour, bumped in
+the transaction that records the event. Names:
+
+- ``decisions``: tagging decisions made by the ingest pipeline.
+- ``action:<auto|llm|clarify|skipped>``: what the policy decided.
+- ``source:<source>``: the source of the suggested tags.
+- ``applied:<source>``: decisions whose tags were written to the ticket.
+- ``class:<service_type>::<category>``: suggested tag pairs.
+- ``skipped:<reason>``: short-circuited decisions.
+- ``tickets``: tickets created.
+- ``audits:<source>``: tag audits written, e.g. ``audits:agent`` for overrides.
+
+A window query reads only the rows of the hours it covers.
+"""
+from __future__ import annotations
+
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from ..db import upsert_insert
+from ..models import MetricRollup
+
+BUCKETS = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+AUTO_SOURCES = ("rule", "ml", "llm")
+
+
+def bucket_start(at: datetime, bucket: str = "hour") -> datetime:
+    if bucket == "day":
+        return at.replace(hour=0, minute=0, second=0, microsecond=0)
+    return at.replace(minute=0, second=0, microsecond=0)
+
+
+def as_utc(at: datetime) -> datetime:
+    """Naive UTC, the form timestamps are stored in."""
+
+    if at.tzinfo is None:
+        return at
+    return at.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def record(db: Session, deltas: Dict[str, int], at: Optional[datetime] = None) -> None:
+    """Add ``deltas`` to the rollups of the hour containing ``at`` (default: now)."""
+
+    hour = bucket_start(at or datetime.utcnow())
+    insert = upsert_insert(db)
+    for name, delta in deltas.items():
+        if not delta:
+            continue
+        statement = insert(MetricRollup).values(bucket_start=hour, name=name, value=delta)
+        db.execute(
+            statement.on_conflict_do_update(
+                index_elements=[MetricRollup.bucket_start, MetricRollup.name],
+                set_={"value": MetricRollup.value + statement.excluded.value},
+            )
+        )
+
+
+def record_decision(
+    db: Session,
+    action: str,
+    source: str,
+    service_type: Optional[str],
+    category: Optional[str],
+    applied: bool,
+    skipped: Optional[str] = None,
+) -> None:
+    deltas: Counter = Counter(
+        {
+            "decisions": 1,
+            f"action:{action}": 1,
+            f"source:{source}": 1,
+            f"class:{service_type or 'unknown'}::{category or 'unknown'}": 1,
+        }
+    )
+    if applied:
+        deltas[f"applied:{source}"] += 1
+    if skipped:
+        deltas[f"skipped:{skipped}"] += 1
+    record(db, deltas)
+
+
+def _with_prefix(counts: Dict[str, int], prefix: str) -> Dict[str, int]:
+    return {name[len(prefix) :]: value for name, value in sorted(counts.items()) if name.startswith(prefix)}
+
+
+def summarize(counts: Dict[str, int]) -> Dict[str, object]:
+    """Rates for one bucket or window, per tagging decision rather than per ticket.
+
+    A ticket is decided again on every ingest, so these differ from the
+    all-time ``/admin/metrics`` rates, which divide by tickets; the keys say
+    so to keep the two from being compared.
+    """
+
+    decisions = counts.get("decisions", 0)
+    applied = sum(counts.get(f"applied:{source}", 0) for source in AUTO_SOURCES)
+
+    def rate(value: int) -> float:
+        return value / decisions if decisions else 0.0
+
+    return {
+        "decisions": decisions,
+        "tickets_created": counts.get("tickets", 0),
+        "auto_tag_rate_per_decision": rate(applied),
+        "override_rate_per_decision": rate(counts.get("audits:agent", 0)),
+        "llm_hit_rate_per_decision": rate(counts.get("source:llm", 0)),
+        "actions": _with_prefix(counts, "action:"),
+        "sources": _with_prefix(counts, "source:"),
+        "skipped": _with_prefix(counts, "skipped:"),
+        "class_distribution": _with_prefix(counts, "class:"),
+    }
+
+
+def window(db: Session, since: datetime, until: datetime, bucket: str = "hour") -> Dict[str, object]:
+    """Per-bucket and total summaries for the hours overlapping ``[since, until)``."""
+
+    since, until = bucket_start(as_utc(since)), as_utc(until)
+    rows = (
+        db.query(MetricRollup.bucket_start, MetricRollup.name, MetricRollup.value)
+        .filter(MetricRollup.bucket_start >= since, MetricRollup.bucket_start < until)
+        .all()
+    )
+    per_bucket: Dict[datetime, Counter] = {}
+    totals: Counter = Counter()
+    for hour, name, value in rows:
+        per_bucket.setdefault(bucket_start(hour, bucket), Counter())[name] += value
+        totals[name] += value
+    series: List[Dict[str, object]] = [
+        {"bucket_start": start.isoformat(), **summarize(counts)} for start, counts in sorted(per_bucket.items())
+    ]
+    return {
+        "since": since.isoformat(),
+        "until": until.isoformat(),
+        "bucket": bucket,
+        "totals": summarize(totals),
+        "series": series,
+    }
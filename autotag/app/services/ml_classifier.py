@@ -2,113 +2,291 @@
 from __future__ import annotations
 
 import json
+import os
+import threading
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Optional
 
 import joblib
+import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.linear_model import LogisticRegression
 from sklearn.pipeline import Pipeline
 from sklearn.metrics import f1_score
 
 from ..config import get_settings
+from .linear_scorer import LinearScorer
+from .prediction_cache import PredictionCache, cache_key
+
+Prediction = Dict[str, Dict[str, float | str]]
+
+
+def _same_vectorizer(first: TfidfVectorizer, second: TfidfVectorizer) -> bool:
+    return (
+        first.get_params() == second.get_params()
+        and first.vocabulary_ == second.vocabulary_
+        and np.array_equal(first.idf_, second.idf_)
+    )
+
+
+@dataclass
+class TaggingModels:
+    """Service and category heads together with the vectorizer(s) feeding them."""
+
+    service_vectorizer: TfidfVectorizer
+    service_clf: LogisticRegression
+    category_vectorizer: TfidfVectorizer
+    category_clf: LogisticRegression
+    version: str = ""
+    scorer: Optional[LinearScorer] = None
+
+    @property
+    def shared(self) -> bool:
+        return self.service_vectorizer is self.category_vectorizer
+
+    @classmethod
+    def from_pipelines(cls, service: Pipeline, category: Pipeline) -> "TaggingModels":
+        """Adapt legacy per-head pipelines, sharing their vectorizer when identical."""
+
+        service_vectorizer = service.steps[0][1]
+        category_vectorizer = category.steps[0][1]
+        if _same_vectorizer(service_vectorizer, category_vectorizer):
+            category_vectorizer = service_vectorizer
+        return cls(service_vectorizer, service.steps[-1][1], category_vectorizer, category.steps[-1][1])
+
+    def export_scorer(self) -> Optional[LinearScorer]:
+        """Build the NumPy fast path, or ``None`` if these models cannot use it."""
+
+        if not self.shared:
+            return None
+        try:
+            return LinearScorer.from_models(self.service_vectorizer, self.service_clf, self.category_clf)
+        except ValueError:
+            return None
+
+    def predict_proba(self, texts: list[str]) -> tuple[np.ndarray, np.ndarray]:
+        if self.scorer is not None:
+            return self.scorer.predict_proba(texts)
+        service_features = self.service_vectorizer.transform(texts)
+        if self.shared:
+            category_features = service_features
+        else:
+            category_features = self.category_vectorizer.transform(texts)
+        return (
+            self.service_clf.predict_proba(service_features),
+            self.category_clf.predict_proba(category_features),
+        )
 
 
 class MLClassifier:
     """Wrapper around scikit-learn models for service and category."""
 
-    def __init__(self, models_dir: Path, training_path: Path) -> None:
+    def __init__(
+        self,
+        models_dir: Path,
+        training_path: Path,
+        mmap: bool = False,
+        fast_scorer: bool = False,
+        cache_size: int = 0,
+        cache_ttl: float = 0.0,
+    ) -> None:
         self.models_dir = models_dir
         self.training_path = training_path
+        # Memory-map artifact arrays read-only so worker processes share their pages.
+        self.mmap_mode = "r" if mmap else None
+        self.fast_scorer = fast_scorer
         self.models_dir.mkdir(parents=True, exist_ok=True)
+        self.model_path = self.models_dir / "tagger.joblib"
+        # Per-head pipelines written by earlier versions; still loaded if present.
         self.service_model_path = self.models_dir / "svc_type.joblib"
         self.category_model_path = self.models_dir / "category.joblib"
-        self._service_model: Pipeline | None = None
-        self._category_model: Pipeline | None = None
+        self._models: TaggingModels | None = None
+        self._loaded_mtime: Optional[int] = None
+        self._reload_lock = threading.Lock()
+        self.cache: PredictionCache[Prediction] = PredictionCache(cache_size, cache_ttl)
         self.ensure_models()
 
     def ensure_models(self) -> None:
-        if not self.service_model_path.exists() or not self.category_model_path.exists():
+        legacy = self.service_model_path.exists() and self.category_model_path.exists()
+        if not self.model_path.exists() and not legacy:
             self.train()
         else:
             self._load_models()
 
+    def _artifact_mtime(self) -> Optional[int]:
+        try:
+            return self.model_path.stat().st_mtime_ns
+        except OSError:
+            return None
+
+    def reload_if_changed(self) -> bool:
+        """Pick up an artifact written by another process (e.g. a retrain job)."""
+
+        mtime = self._artifact_mtime()
+        if mtime is None or mtime == self._loaded_mtime:
+            return False
+        with self._reload_lock:
+            if self._artifact_mtime() == self._loaded_mtime:
+                return False
+            self._load_models()
+        return True
+
+    @property
+    def version(self) -> Optional[str]:
+        return self._models.version if self._models is not None else None
+
     def _load_models(self) -> None:
-        self._service_model = joblib.load(self.service_model_path)
-        self._category_model = joblib.load(self.category_model_path)
+        if self.model_path.exists():
+            self._loaded_mtime = self._artifact_mtime()
+            version = _artifact_version(self.model_path)
+            artifact = joblib.load(self.model_path, mmap_mode=self.mmap_mode)
+            vectorizer = artifact["vectorizer"]
+            # Assigned in one step so predictions never mix heads from two trainings.
+            models = TaggingModels(
+                vectorizer, artifact["service"], vectorizer, artifact["category"], version
+            )
+        else:
+            models = TaggingModels.from_pipelines(
+                joblib.load(self.service_model_path, mmap_mode=self.mmap_mode),
+                joblib.load(self.category_model_path, mmap_mode=self.mmap_mode),
+            )
+            models.version = _artifact_version(self.service_model_path, self.category_model_path)
+        if self.fast_scorer and models.scorer is None:
+            models.scorer = models.export_scorer()
+        self._models = models
+        self.cache.clear()
 
     def train(self) -> Dict[str, float]:
-        texts: list[str] = []
-        svc_labels: list[str] = []
-        cat_labels: list[str] = []
-        with self.training_path.open() as fh:
-            for line in fh:
-                record = json.loads(line)
-                texts.append(record["text"])
-                svc_labels.append(record["service_type"])
-                cat_labels.append(record["category"])
-
-        svc_model = Pipeline(
-            [
-                ("tfidf", TfidfVectorizer(ngram_range=(1, 2), min_df=1)),
-                (
-                    "clf",
-                    LogisticRegression(max_iter=100, solver="liblinear", multi_class="auto"),
-                ),
-            ]
-        )
-        cat_model = Pipeline(
-            [
-                ("tfidf", TfidfVectorizer(ngram_range=(1, 2), min_df=1)),
-                (
-                    "clf",
-                    LogisticRegression(max_iter=100, solver="liblinear", multi_class="auto"),
-                ),
-            ]
-        )
+        models, metrics = fit_models(self.training_path)
+        save_models(models, self.model_path)
+        if self.mmap_mode:
+            # Serve the mapped artifact rather than the private copy just fitted.
+            self._load_models()
+        else:
+            self._loaded_mtime = self._artifact_mtime()
+            models.version = _artifact_version(self.model_path)
+            if self.fast_scorer:
+                models.scorer = models.export_scorer()
+            self._models = models
+            self.cache.clear()
+        return metrics
 
-        svc_model.fit(texts, svc_labels)
-        cat_model.fit(texts, cat_labels)
+    def current_models(self) -> TaggingModels:
+        """Return the loaded models, picking up a newer artifact first."""
 
-        joblib.dump(svc_model, self.service_model_path)
-        joblib.dump(cat_model, self.category_model_path)
+        if self._models is None:
+            self._load_models()
+        else:
+            self.reload_if_changed()
+        assert self._models is not None
+        return self._models
 
-        self._service_model = svc_model
-        self._category_model = cat_model
+    def predict(self, text: str) -> Prediction:
+        return self.predict_batch([text])[0]
 
-        svc_pred = svc_model.predict(texts)
-        cat_pred = cat_model.predict(texts)
+    def predict_batch(self, texts: list[str]) -> list[Prediction]:
+        """Score many texts with one vectorization and one ``predict_proba`` per head.
 
-        return {
-            "service_macro_f1": float(f1_score(svc_labels, svc_pred, average="macro", zero_division=0)),
-            "service_micro_f1": float(f1_score(svc_labels, svc_pred, average="micro", zero_division=0)),
-            "category_macro_f1": float(f1_score(cat_labels, cat_pred, average="macro", zero_division=0)),
-            "category_micro_f1": float(f1_score(cat_labels, cat_pred, average="micro", zero_division=0)),
-        }
+        Texts already scored by the same model version are served from the
+        cache; only the misses reach scikit-learn.
+        """
 
-    def predict(self, text: str) -> Dict[str, Dict[str, float | str]]:
-        if self._service_model is None or self._category_model is None:
-            self._load_models()
+        if not texts:
+            return []
+        models = self.current_models()
+
+        if not self.cache.enabled:
+            return self._score(models, texts)
+        keys = [cache_key(text, models.version) for text in texts]
+        results = [self.cache.get(key) for key in keys]
+        missing = [idx for idx, result in enumerate(results) if result is None]
+        if missing:
+            scored = self._score(models, [texts[idx] for idx in missing])
+            for idx, prediction in zip(missing, scored):
+                results[idx] = prediction
+                self.cache.put(keys[idx], prediction)
+        return results  # type: ignore[return-value]
+
+    @staticmethod
+    def _score(models: TaggingModels, texts: list[str]) -> list[Prediction]:
+        svc_proba, cat_proba = models.predict_proba(texts)
+        svc_labels = list(models.service_clf.classes_)
+        cat_labels = list(models.category_clf.classes_)
+        return [
+            _prediction(svc_labels, svc_row, cat_labels, cat_row)
+            for svc_row, cat_row in zip(svc_proba, cat_proba)
+        ]
+
+
+def fit_models(training_path: Path) -> tuple[TaggingModels, Dict[str, float]]:
+    """Fit the shared vectorizer and both heads; return them with training-set F1."""
+
+    texts: list[str] = []
+    svc_labels: list[str] = []
+    cat_labels: list[str] = []
+    with training_path.open() as fh:
+        for line in fh:
+            record = json.loads(line)
+            texts.append(record["text"])
+            svc_labels.append(record["service_type"])
+            cat_labels.append(record["category"])
 
-        assert self._service_model is not None
-        assert self._category_model is not None
+    vectorizer = TfidfVectorizer(ngram_range=(1, 2), min_df=1)
+    features = vectorizer.fit_transform(texts)
+    svc_clf = LogisticRegression(max_iter=100, solver="liblinear", multi_class="auto")
+    cat_clf = LogisticRegression(max_iter=100, solver="liblinear", multi_class="auto")
+    svc_clf.fit(features, svc_labels)
+    cat_clf.fit(features, cat_labels)
 
-        svc_proba = self._service_model.predict_proba([text])[0]
-        svc_labels = list(self._service_model.classes_)
-        cat_proba = self._category_model.predict_proba([text])[0]
-        cat_labels = list(self._category_model.classes_)
+    svc_pred = svc_clf.predict(features)
+    cat_pred = cat_clf.predict(features)
 
-        svc_probs = {label: float(prob) for label, prob in zip(svc_labels, svc_proba)}
-        cat_probs = {label: float(prob) for label, prob in zip(cat_labels, cat_proba)}
+    metrics = {
+        "service_macro_f1": float(f1_score(svc_labels, svc_pred, average="macro", zero_division=0)),
+        "service_micro_f1": float(f1_score(svc_labels, svc_pred, average="micro", zero_division=0)),
+        "category_macro_f1": float(f1_score(cat_labels, cat_pred, average="macro", zero_division=0)),
+        "category_micro_f1": float(f1_score(cat_labels, cat_pred, average="micro", zero_division=0)),
+    }
+    return TaggingModels(vectorizer, svc_clf, vectorizer, cat_clf), metrics
 
-        top_service = max(svc_probs.items(), key=lambda kv: kv[1])[0]
-        top_category = max(cat_probs.items(), key=lambda kv: kv[1])[0]
 
-        return {
-            "svc_probs": svc_probs,
-            "cat_probs": cat_probs,
-            "top": {"service_type": top_service, "category": top_category},
-        }
+def save_models(models: TaggingModels, path: Path) -> None:
+    """Write both heads as one artifact, replacing ``path`` atomically.
+
+    The artifact is left uncompressed so its arrays can be memory-mapped.
+    """
+
+    artifact: Dict[str, object] = {
+        "vectorizer": models.service_vectorizer,
+        "service": models.service_clf,
+        "category": models.category_clf,
+    }
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    joblib.dump(artifact, tmp_path, compress=0)
+    os.replace(tmp_path, path)
+
+
+def _artifact_version(*paths: Path) -> str:
+    """Identify artifact contents cheaply by their size and modification time."""
+
+    return "+".join(f"{path.stat().st_mtime_ns:x}-{path.stat().st_size:x}" for path in paths)
+
+
+def _prediction(
+    svc_labels: list[str], svc_row: np.ndarray, cat_labels: list[str], cat_row: np.ndarray
+) -> Prediction:
+    svc_probs = {label: float(prob) for label, prob in zip(svc_labels, svc_row)}
+    cat_probs = {label: float(prob) for label, prob in zip(cat_labels, cat_row)}
+
+    top_service = max(svc_probs.items(), key=lambda kv: kv[1])[0]
+    top_category = max(cat_probs.items(), key=lambda kv: kv[1])[0]
+
+    return {
+        "svc_probs": svc_probs,
+        "cat_probs": cat_probs,
+        "top": {"service_type": top_service, "category": top_category},
+    }
 
 
 _classifier: MLClassifier | None = None
@@ -118,5 +296,12 @@ def get_classifier() -> MLClassifier:
     settings = get_settings()
     global _classifier
     if _classifier is None:
-        _classifier = MLClassifier(settings.models_dir, settings.sample_messages_path)
+        _classifier = MLClassifier(
+            settings.models_dir,
+            settings.sample_messages_path,
+            mmap=settings.model_mmap,
+            fast_scorer=settings.fast_scorer,
+            cache_size=settings.prediction_cache_size,
+            cache_ttl=settings.prediction_cache_ttl,
+        )
     return _classifier
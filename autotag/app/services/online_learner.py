@@ -0,0 +1,303 @@
+"""Incremental learning from agent overrides and clarifier answers."""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import joblib
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import SGDClassifier
+from sqlalchemy.orm import Session, selectinload
+
+try:
+    import fcntl
+except ImportError:  # not POSIX: every process snapshots, each through its own temp file
+    fcntl = None  # type: ignore[assignment]
+
+from ..config import get_settings
+from ..db import SessionLocal
+from ..models import TagAudit, Ticket
+from .confidence_policy import ALLOWED_PAIRS
+from .ml_classifier import MLClassifier, Prediction, _prediction, get_classifier
+
+logger = logging.getLogger(__name__)
+
+# Audit sources that carry a human decision worth learning from.
+FEEDBACK_SOURCES = ("agent", "user")
+
+SERVICE_LABELS = sorted({service for service, _ in ALLOWED_PAIRS} | {"other"})
+CATEGORY_LABELS = sorted({category for _, category in ALLOWED_PAIRS} | {"others"})
+
+
+def _vectorizer() -> HashingVectorizer:
+    # Stateless, so new vocabulary from corrections needs no refit.
+    return HashingVectorizer(ngram_range=(1, 2), n_features=2**18, alternate_sign=False)
+
+
+def _head() -> SGDClassifier:
+    return SGDClassifier(loss="log_loss", alpha=1e-4, random_state=0)
+
+
+class OnlineLearner:
+    """Hashing-vectorizer + SGD heads updated with ``partial_fit`` from tag feedback.
+
+    The model starts from the sample dataset and then consumes ``TagAudit``
+    rows written by agents and clarifier answers, in audit order, ``batch_size``
+    corrections at a time. The last consumed ``audit_id`` is kept with the
+    model so a restart resumes where the previous snapshot left off.
+
+    Every API worker process learns from the same audits, so only one of them
+    writes the snapshot: the one holding an exclusive lock on
+    ``online.joblib.lock``. If it exits, the next worker to save takes over.
+    """
+
+    def __init__(
+        self, models_dir: Path, training_path: Path, batch_size: int = 16, snapshot_every: int = 50
+    ) -> None:
+        self.models_dir = models_dir
+        self.training_path = training_path
+        self.models_dir.mkdir(parents=True, exist_ok=True)
+        self.snapshot_path = self.models_dir / "online.joblib"
+        self.snapshot_lock_path = self.models_dir / "online.joblib.lock"
+        self._snapshot_lock_fd: Optional[int] = None
+        self.batch_size = max(1, batch_size)
+        self.snapshot_every = max(1, snapshot_every)
+        self.vectorizer = _vectorizer()
+        self.service_clf = _head()
+        self.category_clf = _head()
+        self.watermark = 0
+        self.updates = 0
+        self.skipped = 0
+        self._unsnapshotted = 0
+        self.last_sync_at: Optional[datetime] = None
+        self.last_snapshot_at: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+        self._lock = threading.Lock()
+        # partial_fit updates coefficients in place; predictions must not see half an update.
+        self._model_lock = threading.Lock()
+        self._request_lock = threading.Lock()
+        self._requested = False
+        self._worker: Optional[threading.Thread] = None
+        self._load()
+
+    def _load(self) -> None:
+        if self.snapshot_path.exists():
+            snapshot = joblib.load(self.snapshot_path)
+            self.service_clf = snapshot["service"]
+            self.category_clf = snapshot["category"]
+            self.watermark = snapshot["watermark"]
+            self.updates = snapshot["updates"]
+            return
+        texts: list[str] = []
+        svc_labels: list[str] = []
+        cat_labels: list[str] = []
+        with self.training_path.open() as fh:
+            for line in fh:
+                record = json.loads(line)
+                texts.append(record["text"])
+                svc_labels.append(record["service_type"])
+                cat_labels.append(record["category"])
+        features = self.vectorizer.transform(texts)
+        for _ in range(5):
+            self.service_clf.partial_fit(features, svc_labels, classes=SERVICE_LABELS)
+            self.category_clf.partial_fit(features, cat_labels, classes=CATEGORY_LABELS)
+
+    def learn(
+        self, texts: List[str], service_types: List[Optional[str]], categories: List[Optional[str]]
+    ) -> int:
+        """Apply one mini-batch of corrections; return how many examples were used."""
+
+        used = 0
+        features = self.vectorizer.transform(texts)
+        for clf, labels, known in (
+            (self.service_clf, service_types, SERVICE_LABELS),
+            (self.category_clf, categories, CATEGORY_LABELS),
+        ):
+            rows = [idx for idx, label in enumerate(labels) if label in known]
+            self.skipped += len(labels) - len(rows)
+            if rows:
+                with self._model_lock:
+                    clf.partial_fit(features[rows], [labels[idx] for idx in rows])
+                used += len(rows)
+        self.updates += len(texts)
+        self._unsnapshotted += len(texts)
+        return used
+
+    def sync(self, db: Session) -> int:
+        """Consume feedback audits newer than the watermark; return how many were applied."""
+
+        with self._lock:
+            applied = 0
+            while True:
+                audits = (
+                    db.query(TagAudit)
+                    .options(selectinload(TagAudit.ticket).selectinload(Ticket.messages))
+                    .filter(TagAudit.audit_id > self.watermark, TagAudit.source.in_(FEEDBACK_SOURCES))
+                    .order_by(TagAudit.audit_id)
+                    .limit(self.batch_size)
+                    .all()
+                )
+                if not audits:
+                    break
+                examples = [(audit, _ticket_text(audit.ticket.messages)) for audit in audits]
+                examples = [(audit, text) for audit, text in examples if text]
+                if examples:
+                    self.learn(
+                        [text for _, text in examples],
+                        [audit.new_service_type for audit, _ in examples],
+                        [audit.new_category for audit, _ in examples],
+                    )
+                applied += len(examples)
+                self.watermark = audits[-1].audit_id
+            self.last_sync_at = datetime.utcnow()
+            if self._unsnapshotted >= self.snapshot_every:
+                self.save()
+            return applied
+
+    @property
+    def dirty(self) -> bool:
+        return self._unsnapshotted > 0
+
+    def owns_snapshot(self) -> bool:
+        """Whether this process writes the snapshot; claims it if no other process does."""
+
+        if self._snapshot_lock_fd is not None or fcntl is None:
+            return True
+        fd = os.open(self.snapshot_lock_path, os.O_CREAT | os.O_RDWR, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._snapshot_lock_fd = fd
+        return True
+
+    def save(self) -> bool:
+        """Write the model and watermark next to the batch models, atomically.
+
+        Returns ``False`` without writing when another process owns the snapshot.
+        """
+
+        if not self.owns_snapshot():
+            self._unsnapshotted = 0
+            return False
+        tmp_path = self.snapshot_path.with_name(f"{self.snapshot_path.name}.{os.getpid()}.tmp")
+        with self._model_lock:
+            joblib.dump(
+                {
+                    "service": self.service_clf,
+                    "category": self.category_clf,
+                    "watermark": self.watermark,
+                    "updates": self.updates,
+                },
+                tmp_path,
+            )
+        os.replace(tmp_path, self.snapshot_path)
+        self._unsnapshotted = 0
+        self.last_snapshot_at = datetime.utcnow()
+        return True
+
+    def request_sync(self) -> bool:
+        """Sync in a background thread; return ``False`` if one is already running.
+
+        A request made while a sync is running is not lost: the running worker
+        syncs again before exiting.
+        """
+
+        with self._request_lock:
+            self._requested = True
+            if self._worker is not None and self._worker.is_alive():
+                return False
+            self._worker = threading.Thread(target=self._sync_loop, name="online-learner", daemon=True)
+            self._worker.start()
+            return True
+
+    def _sync_loop(self) -> None:
+        while True:
+            with self._request_lock:
+                if not self._requested:
+                    return
+                self._requested = False
+            db = SessionLocal()
+            try:
+                self.sync(db)
+            except Exception as exc:  # keep serving the current model
+                logger.exception("Online learning sync failed")
+                self.last_error = f"{type(exc).__name__}: {exc}"
+            else:
+                self.last_error = None
+            finally:
+                db.close()
+
+    def predict(self, text: str) -> Prediction:
+        return self.predict_batch([text])[0]
+
+    def predict_batch(self, texts: list[str]) -> list[Prediction]:
+        if not texts:
+            return []
+        features = self.vectorizer.transform(texts)
+        with self._model_lock:
+            svc_proba = self.service_clf.predict_proba(features)
+            cat_proba = self.category_clf.predict_proba(features)
+        svc_labels = list(self.service_clf.classes_)
+        cat_labels = list(self.category_clf.classes_)
+        return [
+            _prediction(svc_labels, svc_row, cat_labels, cat_row)
+            for svc_row, cat_row in zip(svc_proba, cat_proba)
+        ]
+
+    def snapshot(self) -> Dict[str, object]:
+        return {
+            "watermark": self.watermark,
+            "updates": self.updates,
+            "skipped_labels": self.skipped,
+            "unsaved_updates": self._unsnapshotted,
+            "snapshot_owner": self._snapshot_lock_fd is not None or fcntl is None,
+            "syncing": self._worker is not None and self._worker.is_alive(),
+            "last_sync_at": self.last_sync_at.isoformat() if self.last_sync_at else None,
+            "last_snapshot_at": self.last_snapshot_at.isoformat() if self.last_snapshot_at else None,
+            "last_error": self.last_error,
+        }
+
+
+def _ticket_text(messages: Iterable) -> str:
+    return " ".join(msg.text for msg in messages if msg.text).strip()
+
+
+_learner: Optional[OnlineLearner] = None
+_learner_lock = threading.Lock()
+
+
+def get_online_learner() -> OnlineLearner:
+    global _learner
+    if _learner is None:
+        with _learner_lock:
+            if _learner is None:
+                settings = get_settings()
+                _learner = OnlineLearner(
+                    settings.models_dir,
+                    settings.sample_messages_path,
+                    batch_size=settings.online_batch_size,
+                    snapshot_every=settings.online_snapshot_every,
+                )
+    return _learner
+
+
+def get_serving_classifier() -> MLClassifier | OnlineLearner:
+    """Return the model that scores live traffic (``online_serving`` picks the learner)."""
+
+    if get_settings().online_serving:
+        return get_online_learner()
+    return get_classifier()
+
+
+def notify_feedback() -> None:
+    """Schedule learning from newly written feedback audits, if enabled."""
+
+    if get_settings().online_learning:
+        get_online_learner().request_sync()
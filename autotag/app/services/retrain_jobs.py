@@ -0,0 +1,136 @@
+"""Model retraining in a separate process, tracked as jobs."""
+from __future__ import annotations
+
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import traceback
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+from ..config import get_settings
+from .ml_classifier import fit_models, get_classifier, save_models
+
+logger = logging.getLogger(__name__)
+
+FINISHED_STATES = ("succeeded", "failed")
+
+
+def _now() -> str:
+    return datetime.utcnow().isoformat()
+
+
+def _write_status(path: Path, status: Dict[str, object]) -> None:
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_text(json.dumps(status))
+    os.replace(tmp_path, path)
+
+
+def _read_status(path: Path) -> Optional[Dict[str, object]]:
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def _run_job(job_path: str, training_path: str, model_path: str) -> None:
+    """Child-process entrypoint: train, write the artifact, record the outcome."""
+
+    path = Path(job_path)
+    status = _read_status(path) or {}
+    status.update(status="running", pid=os.getpid(), started_at=_now())
+    _write_status(path, status)
+    try:
+        models, metrics = fit_models(Path(training_path))
+        save_models(models, Path(model_path))
+    except Exception as exc:  # any failure must reach the status file, or the job reads "running" forever
+        status.update(status="failed", error=f"{type(exc).__name__}: {exc}", traceback=traceback.format_exc())
+    else:
+        status.update(status="succeeded", metrics=metrics)
+    status["finished_at"] = _now()
+    _write_status(path, status)
+
+
+class RetrainJobs:
+    """Start retrain jobs in a child process and report their status.
+
+    Job status lives in ``<models_dir>/jobs/<job_id>.json`` so that every API
+    worker can answer for any job. The child writes the new artifact with an
+    atomic rename; workers then load it on their next prediction.
+    """
+
+    def __init__(self, models_dir: Path, training_path: Path) -> None:
+        self.jobs_dir = models_dir / "jobs"
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        self.training_path = training_path
+        self.model_path = models_dir / "tagger.joblib"
+        self._lock = threading.Lock()
+        self._active: Optional[str] = None
+        self._context = multiprocessing.get_context("spawn")
+
+    def _job_path(self, job_id: str) -> Path:
+        return self.jobs_dir / f"{job_id}.json"
+
+    def submit(self) -> Dict[str, object]:
+        """Start a retrain job, or return the one this worker already has running."""
+
+        with self._lock:
+            if self._active is not None:
+                active = self.get(self._active)
+                if active is not None and active["status"] not in FINISHED_STATES:
+                    return active
+            job_id = uuid.uuid4().hex
+            path = self._job_path(job_id)
+            status: Dict[str, object] = {"job_id": job_id, "status": "queued", "submitted_at": _now()}
+            _write_status(path, status)
+            process = self._context.Process(
+                target=_run_job,
+                args=(str(path), str(self.training_path), str(self.model_path)),
+                name=f"retrain-{job_id}",
+                daemon=True,
+            )
+            process.start()
+            self._active = job_id
+            threading.Thread(
+                target=self._watch, args=(job_id, process), name=f"retrain-watch-{job_id}", daemon=True
+            ).start()
+            return status
+
+    def _watch(self, job_id: str, process: multiprocessing.process.BaseProcess) -> None:
+        process.join()
+        path = self._job_path(job_id)
+        status = _read_status(path)
+        if status is None:
+            logger.warning("Status file for retrain job %s disappeared", job_id)
+        elif status.get("status") not in FINISHED_STATES:
+            status.update(
+                status="failed",
+                error=f"Training process exited with code {process.exitcode}",
+                finished_at=_now(),
+            )
+            _write_status(path, status)
+        elif status["status"] == "succeeded":
+            get_classifier().reload_if_changed()
+        with self._lock:
+            if self._active == job_id:
+                self._active = None
+
+    def get(self, job_id: str) -> Optional[Dict[str, object]]:
+        if not job_id.isalnum():
+            return None
+        return _read_status(self._job_path(job_id))
+
+
+_jobs: Optional[RetrainJobs] = None
+
+
+def get_retrain_jobs() -> RetrainJobs:
+    global _jobs
+    if _jobs is None:
+        settings = get_settings()
+        _jobs = RetrainJobs(settings.models_dir, settings.sample_messages_path)
+    return _jobs
@@ -1,14 +1,61 @@
 """Keyword-based tagging rules."""
 from __future__ import annotations
 
+import hashlib
 import re
-from dataclasses import dataclass
+import threading
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, List, Optional
+from re import _compiler as sre_compile  # type: ignore[attr-defined]
+from re import _constants as sre_constants  # type: ignore[attr-defined]
+from re import _parser as sre_parse  # type: ignore[attr-defined]
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
 
 import yaml
 
 from ..config import get_settings
+from .literal_automaton import LiteralAutomaton
+
+RULE_FLAGS = re.IGNORECASE
+END_ANCHORS = (sre_constants.AT_END, sre_constants.AT_END_LINE, sre_constants.AT_END_STRING)
+# Rules that can match more than this many characters are not given a fixed
+# window during incremental evaluation; a partial match of an unbounded rule
+# longer than this is rescanned on the full conversation instead.
+MAX_WINDOW_WIDTH = 512
+
+# Characters ``re.IGNORECASE`` treats as equal beyond their lowercase forms
+# (ı/i, ſ/s, µ/μ, ...), each mapped to one representative. "İ" is the one
+# character whose ``str.lower()`` (i̇) differs from the single-character
+# lowercase ``re`` compares with (i).
+_LOWER_FIXES = str.maketrans({"\u0130": "i"})
+_CASE_EQUIVALENTS = str.maketrans(
+    {code: chr(min(code, *others)) for code, others in sre_compile._EXTRA_CASES.items()}
+)
+
+
+def fold_case(text: str) -> str:
+    """Fold ``text`` so two characters fold alike exactly when ``re.IGNORECASE`` matches them.
+
+    Unlike ``str.casefold()`` this never changes the length of the text.
+    """
+
+    return text.translate(_LOWER_FIXES).lower().translate(_CASE_EQUIVALENTS)
+
+
+# Fallback rule-id keywords used when a rule does not declare an explicit ``tag``.
+SERVICE_TAG_KEYWORDS = (
+    ("wallet", "wallet"),
+    ("flight", "flight"),
+    ("hotel", "hotel"),
+    ("visa", "visa"),
+    ("esim", "esim"),
+)
+CATEGORY_TAG_KEYWORDS = (
+    ("cancel", "cancellation"),
+    ("topup", "top_up"),
+    ("top_up", "top_up"),
+    ("withdraw", "withdraw"),
+)
 
 
 @dataclass
@@ -17,79 +64,691 @@ class Rule:
     pattern: str
     lang: str
     precision: str
+    tag: Optional[str] = None
+    regex: re.Pattern = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        self.regex = re.compile(self.pattern, RULE_FLAGS)
+
+    def applies_to(self, lang: str) -> bool:
+        return self.lang in {"*", lang}
 
     def matches(self, text: str, lang: str) -> bool:
-        if self.lang not in {"*", lang}:
+        if not self.applies_to(lang):
             return False
-        return re.search(self.pattern, text, flags=re.IGNORECASE) is not None
+        return self.regex.search(text) is not None
+
+
+def _tag_for(rule: Rule, keywords: Sequence[tuple[str, str]]) -> Optional[str]:
+    """Resolve the tag a rule votes for, preferring an explicit ``tag`` field."""
+
+    if rule.tag:
+        return rule.tag
+    for keyword, tag in keywords:
+        if keyword in rule.id:
+            return tag
+    return None
+
+
+def _iter_ops(items: sre_parse.SubPattern):
+    """Yield every ``(op, av)`` node of a parsed pattern, depth first."""
+
+    for op, av in items:
+        yield op, av
+        for child in _subpatterns(av):
+            yield from _iter_ops(child)
+
+
+def _subpatterns(av: object):
+    if isinstance(av, sre_parse.SubPattern):
+        yield av
+    elif isinstance(av, (tuple, list)):
+        for part in av:
+            yield from _subpatterns(part)
+
+
+def _is_embeddable(pattern: str, parsed: sre_parse.SubPattern) -> bool:
+    """Return whether a pattern can be spliced into a combined alternation.
+
+    Patterns with their own named groups, back-references or global inline
+    flags depend on their position in the regex and are evaluated on their own.
+    """
+
+    try:
+        re.compile(f"(?:{pattern})", RULE_FLAGS)
+    except re.error:
+        return False
+    if parsed.state.groupdict:
+        return False
+    return not any(
+        op in (sre_constants.GROUPREF, sre_constants.GROUPREF_EXISTS, sre_constants.GROUPREF_IGNORE)
+        for op, _ in _iter_ops(parsed)
+    )
+
+
+def _without_captures(pattern: str) -> str:
+    """Rewrite plain capturing groups as non-capturing ones.
+
+    ``re`` saves group marks on every branch attempt, so thousands of capture
+    groups inside one alternation make each attempt cost proportional to the
+    number of rules.
+    """
+
+    out: list[str] = []
+    idx = 0
+    in_class = False
+    while idx < len(pattern):
+        char = pattern[idx]
+        if char == "\\":
+            out.append(pattern[idx : idx + 2])
+            idx += 2
+            continue
+        if in_class:
+            if char == "]" and not (out and out[-1] in {"[", "[^"}):
+                in_class = False
+            out.append(char)
+        elif char == "[":
+            in_class = True
+            if pattern.startswith("[^", idx):
+                out.append("[^")
+                idx += 2
+                continue
+            out.append(char)
+        elif char == "(" and not pattern.startswith("(?", idx):
+            out.append("(?:")
+        else:
+            out.append(char)
+        idx += 1
+    return "".join(out)
+
+
+def _first_chars(items: sre_parse.SubPattern) -> Optional[set[str]]:
+    """Return the case-folded characters a match can start with, if knowable."""
+
+    chars: set[str] = set()
+    for op, av in items:
+        if op is sre_constants.AT:
+            continue
+        if op is sre_constants.LITERAL:
+            chars.add(fold_case(chr(av)))
+            return chars
+        if op is sre_constants.IN:
+            class_chars = _class_chars(av)
+            if class_chars is None:
+                return None
+            return chars | class_chars
+        if op is sre_constants.BRANCH:
+            for branch in av[1]:
+                branch_chars = _first_chars(branch)
+                if branch_chars is None:
+                    return None
+                chars |= branch_chars
+            return chars
+        if op is sre_constants.SUBPATTERN:
+            inner = _first_chars(av[-1])
+            if inner is None:
+                return None
+            return chars | inner
+        if op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT) and av[0] >= 1:
+            inner = _first_chars(av[2])
+            if inner is None:
+                return None
+            return chars | inner
+        return None
+    return None
+
+
+def _class_chars(items: list) -> Optional[set[str]]:
+    """Expand a small positive character class into case-folded characters."""
+
+    chars: set[str] = set()
+    for op, av in items:
+        if op is sre_constants.LITERAL:
+            chars.add(fold_case(chr(av)))
+        elif op is sre_constants.RANGE and av[1] - av[0] < 32:
+            chars.update(fold_case(chr(code)) for code in range(av[0], av[1] + 1))
+        else:
+            return None
+    return chars
+
+
+def _required_literals(items: sre_parse.SubPattern) -> Optional[frozenset[str]]:
+    """Return case-folded literals of which every match contains at least one.
+
+    Runs of literal characters in a sequence are candidates, as are the
+    literal sets of mandatory sub-patterns; alternations require one set per
+    branch. The candidate whose shortest literal is longest is kept, and
+    ``None`` means no literal is guaranteed.
+    """
+
+    candidates: list[frozenset[str]] = []
+    run: list[str] = []
+
+    def _flush() -> None:
+        if run:
+            candidates.append(frozenset({"".join(run)}))
+            run.clear()
+
+    for op, av in items:
+        if op is sre_constants.LITERAL:
+            run.append(fold_case(chr(av)))
+            continue
+        if op is sre_constants.AT:
+            continue
+        _flush()
+        inner: Optional[frozenset[str]] = None
+        if op is sre_constants.SUBPATTERN:
+            inner = _required_literals(av[-1])
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT) and av[0] >= 1:
+            inner = _required_literals(av[2])
+        elif op is sre_constants.BRANCH:
+            branches = [_required_literals(branch) for branch in av[1]]
+            if all(branches):
+                inner = frozenset().union(*branches)  # type: ignore[arg-type]
+        if inner:
+            candidates.append(inner)
+    _flush()
+
+    if not candidates:
+        return None
+    return max(candidates, key=lambda literals: min(len(lit) for lit in literals))
+
+
+def _is_monotone(parsed: sre_parse.SubPattern) -> bool:
+    """Return whether a match stays a match once more text is appended.
+
+    End anchors and lookarounds depend on what follows (or precedes) a match;
+    ``\\b`` does not, because messages are joined with a space.
+    """
+
+    for op, av in _iter_ops(parsed):
+        if op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            return False
+        if op is sre_constants.AT and av in END_ANCHORS:
+            return False
+    return True
+
+
+def _without_groups(items: list) -> Optional[list]:
+    """Copy parsed items with every group made non-capturing; ``None`` if unsupported."""
+
+    out: list = []
+    for op, av in items:
+        if op is sre_constants.SUBPATTERN:
+            inner = _without_groups(av[-1].data)
+            if inner is None:
+                return None
+            out.append((op, (None, av[1], av[2], sre_parse.SubPattern(av[-1].state, inner))))
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT):
+            inner = _without_groups(av[2].data)
+            if inner is None:
+                return None
+            out.append((op, (av[0], av[1], sre_parse.SubPattern(av[2].state, inner))))
+        elif op is sre_constants.BRANCH:
+            branches = [_without_groups(branch.data) for branch in av[1]]
+            if any(branch is None for branch in branches):
+                return None
+            out.append((op, (None, [sre_parse.SubPattern(av[1][0].state, branch) for branch in branches])))
+        elif op in (sre_constants.LITERAL, sre_constants.NOT_LITERAL, sre_constants.IN, sre_constants.ANY, sre_constants.AT):
+            out.append((op, av))
+        else:
+            return None
+    return out
+
+
+def _prefixes(items: list, state) -> Optional[list]:
+    """Items matching every prefix of a match of ``items`` (and possibly more)."""
+
+    if not items:
+        return []
+    (op, av), rest = items[0], _prefixes(items[1:], state)
+    if op in (sre_constants.LITERAL, sre_constants.NOT_LITERAL, sre_constants.IN, sre_constants.ANY, sre_constants.AT):
+        partial: Optional[list] = []
+    elif op is sre_constants.SUBPATTERN:
+        partial = _prefixes(av[-1].data, state)
+    elif op is sre_constants.BRANCH:
+        branches = [_prefixes(branch.data, state) for branch in av[1]]
+        partial = None
+        if all(branch is not None for branch in branches):
+            partial = [(op, (None, [sre_parse.SubPattern(state, branch) for branch in branches]))]
+    elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT):
+        inner = _prefixes(av[2].data, state)
+        partial = None if inner is None else [(sre_constants.MAX_REPEAT, (0, av[1], av[2])), *inner]
+    else:
+        partial = None
+    if rest is None or partial is None:
+        return None
+    whole = sre_parse.SubPattern(state, [items[0], *rest])
+    return [(sre_constants.BRANCH, (None, [whole, sre_parse.SubPattern(state, partial)]))]
+
+
+def _partial_match_regex(parsed: sre_parse.SubPattern) -> Optional[re.Pattern]:
+    """Compile a regex whose ``search`` finds the earliest start of a match that more text could complete.
+
+    It matches from a position to the end of the text whenever that stretch is
+    a prefix of some match, so a match ending in text appended later can only
+    start at or after the position it reports. ``None`` if the pattern uses
+    constructs this cannot follow.
+    """
+
+    items = _without_groups(parsed.data)
+    prefixes = None if items is None else _prefixes(items, parsed.state)
+    if prefixes is None:
+        return None
+    anchored = sre_parse.SubPattern(parsed.state, [*prefixes, (sre_constants.AT, sre_constants.AT_END_STRING)])
+    return sre_compile.compile(anchored, RULE_FLAGS)
+
+
+def _window_width(parsed: sre_parse.SubPattern) -> Optional[int]:
+    """Return the longest possible match, or ``None`` if it is unbounded."""
+
+    width = parsed.getwidth()[1]
+    return width if width <= MAX_WINDOW_WIDTH else None
+
+
+class CompiledRuleSet:
+    """All rules for one language compiled for a single pass over the text.
+
+    Rules with required literal keywords sit behind a ``LiteralAutomaton``:
+    only rules whose literals occur in the text are checked with their regex.
+    The remaining rules are compiled into a zero-width lookahead alternation
+    with an empty marker group after each rule, so one ``finditer`` visits
+    every position where any of them matches and ``lastindex`` names the rule.
+    The alternation only reports the first rule matching at a position; later
+    rules that could start with the same character are then confirmed with an
+    anchored ``match`` at that position.
+    """
+
+    def __init__(self, rules: Sequence[Rule]) -> None:
+        self.rules = list(rules)
+        self.automaton: LiteralAutomaton[int] = LiteralAutomaton()
+        self.prefiltered: list[int] = []
+        self.standalone: list[int] = []
+        self.regex: Optional[re.Pattern] = None
+        self._group_rules: Dict[int, int] = {}
+        self._by_first_char: Dict[str, list[int]] = {}
+        self._any_first_char: list[int] = []
+
+        combined: list[int] = []
+        for idx, rule in enumerate(self.rules):
+            parsed = sre_parse.parse(rule.pattern, RULE_FLAGS)
+            literals = _required_literals(parsed)
+            if literals:
+                for literal in literals:
+                    self.automaton.add(literal, idx)
+                self.prefiltered.append(idx)
+            elif _is_embeddable(rule.pattern, parsed):
+                combined.append(idx)
+                chars = _first_chars(parsed)
+                if chars is None:
+                    self._any_first_char.append(idx)
+                else:
+                    for char in chars:
+                        self._by_first_char.setdefault(char, []).append(idx)
+            else:
+                self.standalone.append(idx)
+        self.automaton.build()
+
+        if combined:
+            alternation = "|".join(
+                f"(?:{_without_captures(self.rules[idx].pattern)})(?P<r{idx}>)" for idx in combined
+            )
+            self.regex = re.compile(f"(?={alternation})", RULE_FLAGS)
+            self._group_rules = {self.regex.groupindex[f"r{idx}"]: idx for idx in combined}
+
+    def matching_indices(self, text: str, start: int = 0) -> set[int]:
+        """Return the indices of every rule that matches ``text`` at or after ``start``.
+
+        Characters before ``start`` only serve as context for ``\\b`` and ``^``.
+        """
+
+        hits: set[int] = set()
+        if self.prefiltered:
+            for idx in self.automaton.find(fold_case(text[start:])):
+                if self.rules[idx].regex.search(text, start) is not None:
+                    hits.add(idx)
+        if self.regex is not None:
+            remaining = len(self._group_rules)
+            for match in self.regex.finditer(text, start):
+                pos = match.start()
+                first = self._group_rules[match.lastindex]
+                if first not in hits:
+                    hits.add(first)
+                    remaining -= 1
+                # A zero-width match can sit at the very end, where there is no next character.
+                char = fold_case(text[pos]) if pos < len(text) else ""
+                for idx in self._overlap_candidates(char):
+                    if idx > first and idx not in hits and self.rules[idx].regex.match(text, pos):
+                        hits.add(idx)
+                        remaining -= 1
+                if not remaining:
+                    break
+        for idx in self.standalone:
+            if self.rules[idx].regex.search(text, start) is not None:
+                hits.add(idx)
+        return hits
+
+    def _overlap_candidates(self, char: str) -> list[int]:
+        if not self._any_first_char:
+            return self._by_first_char.get(char, [])
+        return self._by_first_char.get(char, []) + self._any_first_char
+
+
+class IncrementalRuleSet:
+    """Rules for one language split for incremental conversation scanning.
+
+    ``window`` holds monotone rules with a bounded match width: a new match can
+    only start within the last ``tail_size`` characters of the previous text,
+    so scanning that tail plus the new message is enough. Monotone rules of
+    unbounded width (such as ``booking\\s*ref``) are in ``window`` too, with a
+    ``partial`` regex: while one has not hit, the tail is widened back to the
+    earliest start of a match that later text could still complete. Every
+    other rule is in ``rescan`` and is checked against the full conversation,
+    but only while it can still change the result: monotone rules stop once
+    they hit, and rules with required literals wait until one of them has
+    been seen.
+    """
+
+    def __init__(self, rules: Sequence[Rule]) -> None:
+        window_rules: list[Rule] = []
+        rescan_rules: list[Rule] = []
+        self.monotone: set[str] = set()
+        self.partial: Dict[str, re.Pattern] = {}
+        width = 1
+        for rule in rules:
+            parsed = sre_parse.parse(rule.pattern, RULE_FLAGS)
+            max_width = _window_width(parsed)
+            if _is_monotone(parsed):
+                self.monotone.add(rule.id)
+                partial = _partial_match_regex(parsed) if max_width is None else None
+                if max_width is not None or partial is not None:
+                    window_rules.append(rule)
+                    width = max(width, max_width or 1)
+                    if partial is not None:
+                        self.partial[rule.id] = partial
+                    continue
+            rescan_rules.append(rule)
+        self.window = CompiledRuleSet(window_rules)
+        self.rescan = CompiledRuleSet(rescan_rules)
+        self.rescan_literal_ids = {self.rescan.rules[idx].id for idx in self.rescan.prefiltered}
+        for idx in self.rescan.prefiltered:
+            parsed = sre_parse.parse(self.rescan.rules[idx].pattern, RULE_FLAGS)
+            width = max(width, max(len(lit) for lit in _required_literals(parsed) or {""}))
+        # One extra character keeps the context that \b needs at the window start.
+        self.tail_size = width + 1
 
 
 class RulesEngine:
     """Simple keyword matcher loaded from YAML."""
 
-    def __init__(self, path: Path) -> None:
+    def __init__(self, path: Path, content: Optional[bytes] = None) -> None:
         self.path = path
+        self.version = ""
         self.service_rules: List[Rule] = []
         self.category_rules: List[Rule] = []
-        self._load()
+        self._rule_tags: Dict[str, Optional[str]] = {}
+        self._service_ids: set[str] = set()
+        self._matchers: Dict[str, CompiledRuleSet] = {}
+        self._incremental: Dict[str, IncrementalRuleSet] = {}
+        self._rule_order: Dict[str, int] = {}
+        self._rules_by_id: Dict[str, Rule] = {}
+        self._load(content)
 
-    def _load(self) -> None:
-        data = yaml.safe_load(self.path.read_text())
+    def _load(self, content: Optional[bytes] = None) -> None:
+        raw = self.path.read_bytes() if content is None else content
+        data = yaml.safe_load(raw) or {}
+        self.version = ruleset_version(raw)
         self.service_rules = [Rule(**item) for item in data.get("service_type", [])]
         self.category_rules = [Rule(**item) for item in data.get("category", [])]
 
+        self._rule_tags = {rule.id: _tag_for(rule, SERVICE_TAG_KEYWORDS) for rule in self.service_rules}
+        self._rule_tags.update(
+            {rule.id: _tag_for(rule, CATEGORY_TAG_KEYWORDS) for rule in self.category_rules}
+        )
+
+        self._service_ids = {rule.id for rule in self.service_rules}
+
+        all_rules = self.service_rules + self.category_rules
+        self._rule_order = {rule.id: order for order, rule in enumerate(all_rules)}
+        self._rules_by_id = {rule.id: rule for rule in all_rules}
+        langs = {rule.lang for rule in all_rules} | {"*"}
+        self._matchers = {
+            lang: CompiledRuleSet([rule for rule in all_rules if rule.applies_to(lang)])
+            for lang in langs
+        }
+        self._incremental = {
+            lang: IncrementalRuleSet([rule for rule in all_rules if rule.applies_to(lang)])
+            for lang in langs
+        }
+
+    def _matcher_for(self, lang: str) -> CompiledRuleSet:
+        return self._matchers.get(lang) or self._matchers["*"]
+
     def apply_rules(self, text: str, lang: str) -> Dict[str, Optional[object]]:
+        matcher = self._matcher_for(lang)
+        matched = matcher.matching_indices(text)
+        return self._summarize([matcher.rules[idx] for idx in sorted(matched)])
+
+    def apply_incremental(
+        self,
+        text: str,
+        lang: str,
+        state: Optional[Dict[str, object]],
+        conversation: Callable[[], str],
+    ) -> Tuple[Dict[str, Optional[object]], Dict[str, object]]:
+        """Evaluate rules for a conversation that just grew by ``text``.
+
+        ``state`` is what the previous call returned for the same conversation
+        (``None`` for the first message), and ``conversation`` returns the
+        space-joined message texts including ``text``; it is only called when a
+        rule needs the full conversation. The result always equals
+        ``apply_rules(conversation().strip(), lang)``.
+        """
+
+        plan = self._incremental.get(lang) or self._incremental["*"]
+        if (
+            not state
+            or state.get("lang") != lang
+            or state.get("version") != self.version
+            or "overflowed" not in state  # stored before partial matches were tracked
+        ):
+            return self._bootstrap(plan, conversation(), lang)
+
+        tail = str(state["tail"])
+        joined = f"{tail} {text}" if text else tail
+        if state["complete"]:
+            window, start = joined.strip(), 0
+        else:
+            window, start = joined.rstrip(), 1
+
+        hits = set(state["hits"])  # type: ignore[arg-type]
+        hits.update(plan.window.rules[idx].id for idx in plan.window.matching_indices(window, start))
+        seen = set(state["seen"])  # type: ignore[arg-type]
+        seen.update(
+            plan.rescan.rules[idx].id for idx in plan.rescan.automaton.find(fold_case(window[start:]))
+        )
+        overflowed = set(state["overflowed"])  # type: ignore[arg-type]
+        hits = self._rescan(plan, hits, seen, overflowed, conversation)
+        new_tail, complete = self._tail(plan, joined, hits, overflowed, complete=bool(state["complete"]))
+        return self._incremental_result(hits), self._state(plan, lang, hits, seen, overflowed, new_tail, complete)
+
+    def _bootstrap(
+        self, plan: IncrementalRuleSet, joined: str, lang: str
+    ) -> Tuple[Dict[str, Optional[object]], Dict[str, object]]:
+        text = joined.strip()
+        hits = {plan.window.rules[idx].id for idx in plan.window.matching_indices(text)}
+        seen = {plan.rescan.rules[idx].id for idx in plan.rescan.automaton.find(fold_case(text))}
+        overflowed: set[str] = set()
+        hits = self._rescan(plan, hits, seen, overflowed, lambda: joined)
+        tail, complete = self._tail(plan, joined, hits, overflowed, complete=True)
+        return self._incremental_result(hits), self._state(plan, lang, hits, seen, overflowed, tail, complete)
+
+    def _rescan(
+        self,
+        plan: IncrementalRuleSet,
+        hits: set[str],
+        seen: set[str],
+        overflowed: set[str],
+        conversation: Callable[[], str],
+    ) -> set[str]:
+        pending = [
+            rule
+            for rule in plan.rescan.rules
+            if (rule.id not in plan.monotone or rule.id not in hits)
+            and (rule.id in seen or rule.id not in plan.rescan_literal_ids)
+        ]
+        pending += [self._rules_by_id[rule_id] for rule_id in sorted(overflowed - hits)]
+        if pending:
+            text = conversation().strip()
+            hits.update(rule.id for rule in pending if rule.regex.search(text) is not None)
+        return hits
+
+    @staticmethod
+    def _tail(
+        plan: IncrementalRuleSet, joined: str, hits: set[str], overflowed: set[str], complete: bool
+    ) -> Tuple[str, bool]:
+        """Keep ``tail_size`` characters before any trailing whitespace, and any live partial match.
+
+        A partial match longer than ``MAX_WINDOW_WIDTH`` moves its rule to
+        ``overflowed``, which is rescanned on the full conversation until it hits.
+        """
+
+        end = len(joined.rstrip())
+        keep_from = max(0, end - plan.tail_size)
+        for rule_id, partial in plan.partial.items():
+            if rule_id in hits or rule_id in overflowed:
+                continue
+            match = partial.search(joined)
+            assert match is not None  # the empty prefix at the end always matches
+            if end - match.start() > MAX_WINDOW_WIDTH:
+                overflowed.add(rule_id)
+            else:
+                # One extra character keeps the context that \b needs at the window start.
+                keep_from = min(keep_from, max(0, match.start() - 1))
+        return joined[keep_from:], complete and keep_from == 0
+
+    def _state(
+        self,
+        plan: IncrementalRuleSet,
+        lang: str,
+        hits: set[str],
+        seen: set[str],
+        overflowed: set[str],
+        tail: str,
+        complete: bool,
+    ) -> Dict[str, object]:
+        return {
+            "version": self.version,
+            "lang": lang,
+            "hits": sorted(rule_id for rule_id in hits if rule_id in plan.monotone),
+            "seen": sorted(seen),
+            "overflowed": sorted(overflowed - hits),
+            "tail": tail,
+            "complete": complete,
+        }
+
+    def _incremental_result(self, hits: set[str]) -> Dict[str, Optional[object]]:
+        ordered = sorted(hits, key=self._rule_order.__getitem__)
+        return self._summarize([self._rules_by_id[rule_id] for rule_id in ordered])
+
+    def _summarize(self, matched: Sequence[Rule]) -> Dict[str, Optional[object]]:
+        """Build the rule result from matched rules given in rule-file order."""
+
         service_hits: List[str] = []
         category_hits: List[str] = []
         service_type: Optional[str] = None
         category: Optional[str] = None
         precision_hint = "normal"
 
-        for rule in self.service_rules:
-            if rule.matches(text, lang):
+        for rule in matched:
+            tag = self._rule_tags.get(rule.id)
+            precision_hint = "high" if rule.precision == "high" else precision_hint
+            if rule.id in self._service_ids:
                 service_hits.append(rule.id)
-                precision_hint = "high" if rule.precision == "high" else precision_hint
-                if service_type is None:
-                    if "wallet" in rule.id:
-                        service_type = "wallet"
-                    elif "flight" in rule.id:
-                        service_type = "flight"
-                    elif "hotel" in rule.id:
-                        service_type = "hotel"
-                    elif "visa" in rule.id:
-                        service_type = "visa"
-                    elif "esim" in rule.id:
-                        service_type = "esim"
-
-        for rule in self.category_rules:
-            if rule.matches(text, lang):
+                service_type = service_type or tag
+            else:
                 category_hits.append(rule.id)
-                precision_hint = "high" if rule.precision == "high" else precision_hint
-                if category is None:
-                    if "cancel" in rule.id:
-                        category = "cancellation"
-                    elif "topup" in rule.id or "top_up" in rule.id:
-                        category = "top_up"
-                    elif "withdraw" in rule.id:
-                        category = "withdraw"
+                category = category or tag
 
         result: Dict[str, Optional[object]] = {
             "service_type": service_type,
             "category": category,
             "hits": service_hits + category_hits,
             "precision_hint": precision_hint,
+            "rules_version": self.version,
         }
         return result
 
 
 _rules_engine: Optional[RulesEngine] = None
+# (mtime_ns, size) of the rules file when the current engine was read.
+_loaded_fingerprint: Optional[Tuple[int, int]] = None
+_reload_lock = threading.Lock()
+
+
+def rules_file_fingerprint(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def loaded_fingerprint() -> Optional[Tuple[int, int]]:
+    """Fingerprint of the rules file the current engine was read from."""
+
+    return _loaded_fingerprint
+
+
+def ruleset_version(content: bytes) -> str:
+    """Return the content-hash version of a rules file."""
+
+    return hashlib.sha256(content).hexdigest()[:12]
 
 
 def get_rules_engine() -> RulesEngine:
-    """Return a singleton rules engine."""
+    """Return the current rules engine.
+
+    Reloads replace the engine as a whole, so callers should fetch it once per
+    request and use that reference throughout.
+    """
+
+    global _rules_engine, _loaded_fingerprint
+    engine = _rules_engine
+    if engine is None:
+        with _reload_lock:
+            if _rules_engine is None:
+                settings = get_settings()
+                fingerprint = rules_file_fingerprint(settings.rules_path)
+                _rules_engine = RulesEngine(settings.rules_path)
+                _loaded_fingerprint = fingerprint
+            engine = _rules_engine
+    return engine
+
+
+def reload_rules_engine(force: bool = False) -> RulesEngine:
+    """Re-read the rules file and swap in a newly compiled engine if it changed.
+
+    The new engine is fully built before the module reference is replaced, so
+    concurrent requests see either the old or the new ruleset, never a mix.
+    """
 
-    global _rules_engine
-    if _rules_engine is None:
-        settings = get_settings()
-        _rules_engine = RulesEngine(settings.rules_path)
-    return _rules_engine
+    global _rules_engine, _loaded_fingerprint
+    with _reload_lock:
+        path = get_settings().rules_path
+        # Taken before reading, so a write racing the read is seen as a change next time.
+        fingerprint = rules_file_fingerprint(path)
+        content = path.read_bytes()
+        current = _rules_engine
+        if (
+            current is not None
+            and not force
+            and current.path == path
+            and current.version == ruleset_version(content)
+        ):
+            _loaded_fingerprint = fingerprint
+            return current
+        engine = RulesEngine(path, content)
+        _rules_engine = engine
+        _loaded_fingerprint = fingerprint
+        return engine
@@ -0,0 +1,130 @@
+"""Background reloading of the rules file."""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from ..config import get_settings
+from .rules_engine import get_rules_engine, loaded_fingerprint, reload_rules_engine, rules_file_fingerprint
+
+logger = logging.getLogger(__name__)
+
+
+class RulesReloader:
+    """Recompile rules off the request path, on demand or when the file changes.
+
+    A reload only swaps the engine of the process that runs it. Other API
+    worker processes notice the rewritten file through ``reload_if_changed``,
+    which ingest calls at most every ``check_interval`` seconds, and then
+    reload in the background themselves.
+    """
+
+    def __init__(self, check_interval: float = 1.0) -> None:
+        self.check_interval = check_interval
+        self._next_check = 0.0
+        self._failed_fingerprint: Optional[Tuple[int, int]] = None
+        self._lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.last_reload_at: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+
+    @property
+    def reloading(self) -> bool:
+        return self._worker is not None and self._worker.is_alive()
+
+    def request_reload(self, force: bool = False) -> bool:
+        """Start a background reload; return ``False`` if one is already running."""
+
+        with self._lock:
+            if self.reloading:
+                return False
+            self._worker = threading.Thread(
+                target=self.reload, kwargs={"force": force}, name="rules-reload", daemon=True
+            )
+            self._worker.start()
+            return True
+
+    def reload_if_changed(self) -> bool:
+        """Start a background reload if the rules file changed since the engine was read.
+
+        A file that already failed to load is not retried until it changes again.
+        """
+
+        now = time.monotonic()
+        if now < self._next_check:
+            return False
+        self._next_check = now + self.check_interval
+        current = self._fingerprint()
+        if current == loaded_fingerprint() or current == self._failed_fingerprint or self.reloading:
+            return False
+        return self.request_reload()
+
+    def reload(self, force: bool = False) -> None:
+        fingerprint = self._fingerprint()
+        try:
+            engine = reload_rules_engine(force=force)
+        except Exception as exc:  # keep serving the previous ruleset
+            logger.exception("Rules reload failed")
+            self.last_error = f"{type(exc).__name__}: {exc}"
+            self._failed_fingerprint = fingerprint
+            return
+        self._failed_fingerprint = None
+        self.last_error = None
+        self.last_reload_at = datetime.utcnow()
+        logger.info("Rules engine at version %s", engine.version)
+
+    def start_watching(self, interval: float) -> None:
+        """Poll the rules file every ``interval`` seconds and reload on change."""
+
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(
+            target=self._watch, args=(interval,), name="rules-watch", daemon=True
+        )
+        self._watcher.start()
+
+    def stop_watching(self) -> None:
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=5)
+            self._watcher = None
+
+    def _watch(self, interval: float) -> None:
+        last = self._fingerprint()
+        while not self._stop.wait(interval):
+            current = self._fingerprint()
+            if current != last:
+                last = current
+                self.reload()
+
+    @staticmethod
+    def _fingerprint() -> Optional[Tuple[int, int]]:
+        return rules_file_fingerprint(get_settings().rules_path)
+
+    def snapshot(self) -> Dict[str, object]:
+        engine = get_rules_engine()
+        return {
+            "version": engine.version,
+            "service_rules": len(engine.service_rules),
+            "category_rules": len(engine.category_rules),
+            "reloading": self.reloading,
+            "watching": self._watcher is not None and self._watcher.is_alive(),
+            "last_reload_at": self.last_reload_at.isoformat() if self.last_reload_at else None,
+            "last_error": self.last_error,
+        }
+
+
+_reloader: Optional[RulesReloader] = None
+
+
+def get_rules_reloader() -> RulesReloader:
+    global _reloader
+    if _reloader is None:
+        _reloader = RulesReloader()
+    return _reloader
@@ -0,0 +1,72 @@
+"""Skip ML and LLM work for tickets whose tags can no longer change."""
+from __future__ import annotations
+
+import threading
+from collections import Counter
+from typing import Dict, Iterable, Optional
+
+from ..config import get_settings
+from ..models import Ticket
+from . import confidence_policy
+from .online_learner import FEEDBACK_SOURCES
+
+HUMAN_TAGGED = "human_tagged"
+RULES_SETTLED = "rules_settled"
+
+
+def human_tagged(ticket: Ticket) -> bool:
+    """Tags set by an agent override or a clarifier answer."""
+
+    return get_settings().skip_human_tagged and ticket.tag_source in FEEDBACK_SOURCES
+
+
+def rules_settled(rules: Optional[dict]) -> bool:
+    return bool(rules) and get_settings().skip_settled_by_rules and confidence_policy.rules_settled(rules)  # type: ignore[arg-type]
+
+
+def skip_reason(ticket: Ticket, rules: Optional[dict]) -> Optional[str]:
+    """Why classifying ``ticket`` cannot change its outcome, or ``None`` to classify it."""
+
+    if human_tagged(ticket):
+        return HUMAN_TAGGED
+    if rules_settled(rules):
+        return RULES_SETTLED
+    return None
+
+
+class ShortCircuitStats:
+    """How many evaluations ran the model and how many were skipped, per reason."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.evaluated = 0
+        self.skipped: Counter = Counter()
+
+    def record(self, reasons: Iterable[Optional[str]]) -> None:
+        with self._lock:
+            for reason in reasons:
+                self.evaluated += 1
+                if reason is not None:
+                    self.skipped[reason] += 1
+
+    def snapshot(self) -> Dict[str, object]:
+        settings = get_settings()
+        with self._lock:
+            skipped = dict(self.skipped)
+            evaluated = self.evaluated
+        total_skipped = sum(skipped.values())
+        return {
+            "skip_human_tagged": settings.skip_human_tagged,
+            "skip_settled_by_rules": settings.skip_settled_by_rules,
+            "evaluated": evaluated,
+            "classified": evaluated - total_skipped,
+            "skipped": {HUMAN_TAGGED: 0, RULES_SETTLED: 0, **skipped},
+            "skip_ratio": total_skipped / evaluated if evaluated else 0.0,
+        }
+
+
+_stats = ShortCircuitStats()
+
+
+def get_short_circuit_stats() -> ShortCircuitStats:
+    return _stats
@@ -5,7 +5,38 @@ from typing import Optional
 
 from sqlalchemy.orm import Session
 
+from ..config import get_settings
 from ..models import TagAudit, Ticket
+from . import metric_counters
+
+
+def needs_audit(
+    db: Session,
+    ticket: Ticket,
+    service_type: Optional[str],
+    category: Optional[str],
+    confidence: float,
+    source: str,
+) -> bool:
+    """Whether a write changes tags or source, or moves confidence past the audit threshold.
+
+    Confidence is compared with the last audited value rather than the
+    ticket's current one, so small steps that add up are still audited.
+    """
+
+    if (ticket.service_type, ticket.category, ticket.tag_source) != (service_type, category, source):
+        return True
+    db.flush()  # the session does not autoflush; audits added earlier must be visible
+    audited = (
+        db.query(TagAudit.confidence)
+        .filter(TagAudit.ticket_id == ticket.ticket_id)
+        .order_by(TagAudit.audit_id.desc())
+        .limit(1)
+        .scalar()
+    )
+    if audited is None:
+        audited = ticket.tag_confidence or 0.0
+    return abs(confidence - audited) >= get_settings().audit_min_confidence_delta
 
 
 def write_tags(
@@ -16,8 +47,9 @@ def write_tags(
     confidence: float,
     source: str,
     reason: Optional[str] = None,
+    rules_version: Optional[str] = None,
 ) -> Ticket:
-    """Persist chosen tags and audit the change."""
+    """Persist chosen tags and audit the change; confidence jitter only updates the ticket."""
 
     if (
         ticket.service_type == service_type
@@ -26,6 +58,10 @@ def write_tags(
         and (ticket.tag_confidence or 0.0) == confidence
     ):
         return ticket
+    if not needs_audit(db, ticket, service_type, category, confidence, source):
+        ticket.tag_confidence = confidence
+        db.add(ticket)
+        return ticket
 
     audit = TagAudit(
         ticket_id=ticket.ticket_id,
@@ -36,8 +72,14 @@ def write_tags(
         confidence=confidence,
         source=source,
         reason=reason,
+        rules_version=rules_version,
     )
     db.add(audit)
+    metric_counters.tags_changed(
+        db,
+        (ticket.service_type, ticket.category, ticket.tag_source),
+        (service_type, category, source),
+    )
 
     ticket.service_type = service_type
     ticket.category = category
@@ -0,0 +1,45 @@
+"""Microbenchmark single-text prediction latency: sklearn vs. the NumPy scorer."""
+from __future__ import annotations
+
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from ..app.config import get_settings
+from ..app.services.ml_classifier import MLClassifier
+
+
+def _latencies_us(classifier: MLClassifier, texts: list[str], repeat: int) -> np.ndarray:
+    samples = []
+    for idx in range(repeat):
+        text = texts[idx % len(texts)]
+        start = time.perf_counter()
+        classifier.predict(text)
+        samples.append((time.perf_counter() - start) * 1e6)
+    return np.array(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    settings = get_settings()
+    texts = [json.loads(line)["text"] for line in settings.sample_messages_path.open()]
+    print(f"{'path':>8} {'p50 us':>9} {'p99 us':>9} {'mean us':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        # Caching is left off so every call is scored.
+        for name, fast in (("sklearn", False), ("numpy", True)):
+            classifier = MLClassifier(Path(tmp), settings.sample_messages_path, fast_scorer=fast)
+            _latencies_us(classifier, texts, 50)  # warm up
+            samples = _latencies_us(classifier, texts, args.repeat)
+            p50, p99 = np.percentile(samples, [50, 99])
+            print(f"{name:>8} {p50:>9.1f} {p99:>9.1f} {samples.mean():>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
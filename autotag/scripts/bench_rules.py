@@ -0,0 +1,88 @@
+"""Benchmark how ``RulesEngine.apply_rules`` scales with the number of rules."""
+from __future__ import annotations
+
+import argparse
+import random
+import re
+import tempfile
+import time
+from pathlib import Path
+
+import yaml
+
+from ..app.services.rules_engine import RulesEngine
+
+WORDS = [
+    "booking", "flight", "refund", "wallet", "ticket", "hotel", "visa", "esim",
+    "payment", "card", "update", "please", "change", "date", "seat", "baggage",
+]
+
+
+def _synthetic_rules(count: int, rng: random.Random) -> dict:
+    """Build ``count`` keyword-alternation rules split across both rule kinds."""
+
+    data: dict[str, list[dict]] = {"service_type": [], "category": []}
+    for idx in range(count):
+        kind = "service_type" if idx % 2 == 0 else "category"
+        keywords = [f"kw{idx}x{n}" for n in range(3)]
+        if idx % 50 == 0:
+            keywords.append(rng.choice(WORDS))
+        data[kind].append(
+            {
+                "id": f"{'st' if kind == 'service_type' else 'cat'}_synthetic_{idx}",
+                "lang": "*",
+                "pattern": "\\b(" + "|".join(keywords) + ")\\b",
+                "precision": "normal",
+            }
+        )
+    return data
+
+
+def _conversation(messages: int, rng: random.Random) -> str:
+    return " ".join(
+        " ".join(rng.choice(WORDS) for _ in range(12)) for _ in range(messages)
+    )
+
+
+def _per_rule_search(engine: RulesEngine, text: str) -> list[str]:
+    """Reference implementation: one ``re.search`` per rule on the raw pattern."""
+
+    return [
+        rule.id
+        for rule in engine.service_rules + engine.category_rules
+        if re.search(rule.pattern, text, flags=re.IGNORECASE) is not None
+    ]
+
+
+def _time_per_call(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="10,100,500,1000,2000,4000")
+    parser.add_argument("--messages", type=int, default=20, help="messages per conversation")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    text = _conversation(args.messages, rng)
+    print(f"conversation length: {len(text)} chars")
+    print(f"{'rules':>6} {'load ms':>9} {'per-rule ms':>12} {'apply_rules ms':>15}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in (int(value) for value in args.sizes.split(",")):
+            path = Path(tmp) / f"rules_{size}.yaml"
+            path.write_text(yaml.safe_dump(_synthetic_rules(size, rng)))
+            start = time.perf_counter()
+            engine = RulesEngine(path)
+            load_ms = (time.perf_counter() - start) * 1000
+            baseline = _time_per_call(lambda engine=engine: _per_rule_search(engine, text), args.repeat)
+            compiled = _time_per_call(lambda engine=engine: engine.apply_rules(text, "en"), args.repeat)
+            print(f"{size:>6} {load_ms:>9.1f} {baseline:>12.3f} {compiled:>15.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,31 @@
-"""Export current metrics to stdout."""
+"""Export current metrics to stdout.
+
+With ``--since``, ``--until`` or ``--bucket``, export the windowed series from
+the hourly rollups instead of the all-time totals.
+"""
 from __future__ import annotations
 
+import argparse
+from datetime import datetime
 from pprint import pprint
 
 from ..db import create_all, session_scope
-from ..routers.tagging import compute_metrics
+from ..routers.tagging import compute_metrics, windowed_metrics
 
 
 def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--since", type=datetime.fromisoformat, help="window start (ISO 8601, UTC if naive)")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="window end, exclusive; defaults to now")
+    parser.add_argument("--bucket", choices=("hour", "day"), help="series granularity")
+    args = parser.parse_args()
+
     create_all()
     with session_scope() as db:
-        metrics = compute_metrics(db)
+        if args.since is None and args.until is None and args.bucket is None:
+            metrics = compute_metrics(db)
+        else:
+            metrics = windowed_metrics(db, args.since, args.until, args.bucket or "hour")
     pprint(metrics)
 
 
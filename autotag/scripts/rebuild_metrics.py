@@ -0,0 +1,31 @@
+"""Check the metric counters against the tables, or recompute them from scratch."""
+from __future__ import annotations
+
+import argparse
+import sys
+
+from ..app.db import create_all, session_scope
+from ..app.services import metric_counters
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--check", action="store_true", help="report drift and exit 1 instead of rebuilding")
+    args = parser.parse_args()
+
+    create_all()
+    with session_scope() as db:
+        drift = metric_counters.differences(db)
+        for name, (stored, actual) in sorted(drift.items()):
+            print(f"{name}: stored={stored} actual={actual}")
+        if args.check:
+            print("counters consistent" if not drift else f"{len(drift)} counters differ")
+            if drift:
+                sys.exit(1)
+            return
+        counters = metric_counters.rebuild(db)
+    print(f"rebuilt {len(counters)} counters")
+
+
+if __name__ == "__main__":
+    main()
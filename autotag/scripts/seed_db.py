@@ -4,6 +4,7 @@ from __future__ import annotations
 import json
 from datetime import datetime
 
+from ..app.services import metric_counters
 from ..config import get_settings
 from ..db import create_all, session_scope
 from ..models import Message, Ticket
@@ -30,6 +31,7 @@ def main() -> None:
                 ticket = Ticket(ticket_id=f"TKSEED{idx:03d}", conversation_id=conversation_id)
                 db.add(ticket)
                 db.flush()
+                metric_counters.ticket_created(db)
 
                 lang = lang_and_scrub.detect_lang(record["text"])
                 clean_text, redactions = lang_and_scrub.scrub_pii(record["text"])
@@ -42,13 +44,7 @@ def main() -> None:
                     ts=message_ts,
                 )
                 ticket.messages.append(message)
-<<<<<<< Updated upstream
                 ticket.updated_at = message_ts
-=======
-                # Flush first so message.ts is populated by default factory
-                db.flush()
-                ticket.updated_at = message.ts
->>>>>>> Stashed changes
                 db.flush()
 
                 conversation_text = " ".join(
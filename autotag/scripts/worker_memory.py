@@ -0,0 +1,89 @@
+"""Report resident memory of processes serving the ML models (Linux only).
+
+Point it at running uvicorn workers with ``--pids``, or let it start
+``--workers`` processes that each load the classifier and compare loading the
+artifact privately against memory-mapping it. RSS counts shared pages in every
+process; PSS splits them between the processes that share them, so the PSS sum
+is what the workers really cost together.
+"""
+from __future__ import annotations
+
+import argparse
+import multiprocessing
+from pathlib import Path
+
+from ..app.config import get_settings
+
+FIELDS = ("Rss", "Pss", "Shared_Clean", "Private_Clean", "Private_Dirty")
+
+
+def memory_kb(pid: int) -> dict[str, int]:
+    usage = dict.fromkeys(FIELDS, 0)
+    with open(f"/proc/{pid}/smaps_rollup") as fh:
+        for line in fh:
+            key, _, rest = line.partition(":")
+            if key in usage:
+                usage[key] = int(rest.split()[0])
+    return usage
+
+
+def _print_table(title: str, pids: list[int]) -> None:
+    print(title)
+    print(f"{'pid':>8} " + " ".join(f"{field + ' MB':>17}" for field in FIELDS))
+    totals = dict.fromkeys(FIELDS, 0)
+    for pid in pids:
+        usage = memory_kb(pid)
+        for field in FIELDS:
+            totals[field] += usage[field]
+        print(f"{pid:>8} " + " ".join(f"{usage[field] / 1024:>17.1f}" for field in FIELDS))
+    print(f"{'total':>8} " + " ".join(f"{totals[field] / 1024:>17.1f}" for field in FIELDS))
+    print()
+
+
+def _worker(models_dir: str, training_path: str, mmap: bool, ready, done) -> None:
+    from ..app.services.ml_classifier import MLClassifier
+
+    classifier = MLClassifier(Path(models_dir), Path(training_path), mmap=mmap)
+    classifier.predict("warm up the vectorizer and both heads")
+    ready.set()
+    done.wait()
+
+
+def _simulate(workers: int, mmap: bool) -> None:
+    settings = get_settings()
+    context = multiprocessing.get_context("spawn")
+    done = context.Event()
+    processes = []
+    events = []
+    for _ in range(workers):
+        ready = context.Event()
+        process = context.Process(
+            target=_worker,
+            args=(str(settings.models_dir), str(settings.sample_messages_path), mmap, ready, done),
+        )
+        process.start()
+        processes.append(process)
+        events.append(ready)
+    for ready in events:
+        ready.wait()
+    _print_table(f"{workers} workers, mmap={'on' if mmap else 'off'}", [p.pid for p in processes])
+    done.set()
+    for process in processes:
+        process.join()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pids", help="comma-separated pids of running workers to inspect")
+    parser.add_argument("--workers", type=int, default=4, help="processes to start when --pids is not given")
+    args = parser.parse_args()
+
+    if args.pids:
+        _print_table("running workers", [int(pid) for pid in args.pids.split(",")])
+        return
+    _simulate(args.workers, mmap=False)
+    _simulate(args.workers, mmap=True)
+
+
+if __name__ == "__main__":
+    main()
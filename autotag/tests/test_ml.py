@@ -1,11 +1,23 @@
 from __future__ import annotations
 
 import json
-
+import os
+import random
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+import joblib
+import numpy as np
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline
+
 from autotag.app.config import get_settings
-from autotag.app.services.ml_classifier import MLClassifier
+from autotag.app.services.inference_scheduler import InferenceScheduler
+from autotag.app.services.linear_scorer import LinearScorer
+from autotag.app.services.ml_classifier import MLClassifier, get_classifier
+from autotag.app.services.online_learner import OnlineLearner
 
 
 def test_ml_top1_accuracy(tmp_path: Path) -> None:
@@ -39,3 +51,182 @@ def test_ml_top1_accuracy(tmp_path: Path) -> None:
 
     assert service_accuracy >= 0.7
     assert category_accuracy >= 0.7
+
+
+def test_legacy_pipelines_load_with_shared_vectorizer(tmp_path: Path) -> None:
+    settings = get_settings()
+    texts, svc_labels, cat_labels = [], [], []
+    for line in settings.sample_messages_path.open():
+        record = json.loads(line)
+        texts.append(record["text"])
+        svc_labels.append(record["service_type"])
+        cat_labels.append(record["category"])
+    for labels, name in ((svc_labels, "svc_type.joblib"), (cat_labels, "category.joblib")):
+        pipeline = Pipeline(
+            [("tfidf", TfidfVectorizer(ngram_range=(1, 2))), ("clf", LogisticRegression(solver="liblinear"))]
+        )
+        pipeline.fit(texts, labels)
+        joblib.dump(pipeline, tmp_path / name)
+
+    legacy = MLClassifier(tmp_path, settings.sample_messages_path)
+    assert legacy._models is not None and legacy._models.shared
+    assert not legacy.model_path.exists()
+
+    retrained = MLClassifier(tmp_path / "fresh", settings.sample_messages_path)
+    assert retrained.model_path.exists()
+    assert retrained._models is not None and retrained._models.shared
+    assert legacy.predict(texts[0])["top"] == retrained.predict(texts[0])["top"]
+
+
+def test_predict_batch_matches_single_predictions() -> None:
+    settings = get_settings()
+    texts = [json.loads(line)["text"] for line in settings.sample_messages_path.open()]
+    classifier = get_classifier()
+
+    batch = classifier.predict_batch(texts)
+
+    assert batch == [classifier.predict(text) for text in texts]
+    assert classifier.predict_batch([]) == []
+
+
+def test_inference_scheduler_batches_concurrent_predictions() -> None:
+    settings = get_settings()
+    texts = [json.loads(line)["text"] for line in settings.sample_messages_path.open()][:16]
+    classifier = get_classifier()
+    scheduler = InferenceScheduler(window_ms=50, max_batch=8, classifier=lambda: classifier)
+
+    try:
+        with ThreadPoolExecutor(max_workers=len(texts)) as pool:
+            results = list(pool.map(scheduler.predict, texts))
+    finally:
+        scheduler.stop()
+
+    assert results == [classifier.predict(text) for text in texts]
+    stats = scheduler.snapshot()
+    assert stats["predictions"] == len(texts)
+    assert stats["batches"] < len(texts)
+    assert stats["latency_p50_ms"] <= stats["latency_p99_ms"]
+    assert stats["throughput_per_s"] > 0
+
+
+def test_online_learner_adapts_to_corrections_and_resumes(tmp_path: Path) -> None:
+    settings = get_settings()
+    learner = OnlineLearner(tmp_path, settings.sample_messages_path, snapshot_every=1)
+    text = "my esim voucher bounced twice"
+
+    for _ in range(10):
+        learner.learn([text], ["wallet"], ["withdraw"])
+    learner.learn(["ignored"], ["not_a_service"], [None])
+
+    assert learner.predict(text)["top"] == {"service_type": "wallet", "category": "withdraw"}
+    assert learner.skipped == 2
+
+    learner.watermark = 42
+    learner.save()
+    restored = OnlineLearner(tmp_path, settings.sample_messages_path)
+    assert restored.watermark == 42
+    assert restored.predict_batch([text]) == learner.predict_batch([text])
+
+    # Only one learner per models dir writes the snapshot; the next one takes over when it goes away.
+    restored.watermark = 7
+    assert restored.save() is False
+    assert joblib.load(learner.snapshot_path)["watermark"] == 42
+    os.close(learner._snapshot_lock_fd)  # as when the owning process exits
+    assert restored.save() is True
+    assert joblib.load(learner.snapshot_path)["watermark"] == 7
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_mmap_artifact_shares_arrays_and_predicts_identically(tmp_path: Path) -> None:
+    settings = get_settings()
+    private = MLClassifier(tmp_path, settings.sample_messages_path)
+    mapped = MLClassifier(tmp_path, settings.sample_messages_path, mmap=True)
+
+    assert mapped._models is not None
+    assert isinstance(mapped._models.service_clf.coef_, np.memmap)
+    assert isinstance(mapped._models.category_clf.coef_, np.memmap)
+    text = "I need to cancel my flight"
+    assert mapped.predict(text) == private.predict(text)
+
+    fast = MLClassifier(tmp_path, settings.sample_messages_path, mmap=True, fast_scorer=True)
+    models = fast._models
+    assert models is not None and models.scorer is not None
+    # The scorer reads the loaded models in place; the artifact holds each array once.
+    assert models.scorer.vocabulary is models.service_vectorizer.vocabulary_
+    assert np.shares_memory(models.scorer.service.coef, models.service_clf.coef_)
+    assert np.shares_memory(models.scorer.category.coef, models.category_clf.coef_)
+    assert "scorer" not in joblib.load(fast.model_path)
+
+
+def test_prediction_cache_skips_sklearn_and_invalidates_on_retrain(tmp_path: Path, monkeypatch) -> None:
+    settings = get_settings()
+    classifier = MLClassifier(tmp_path, settings.sample_messages_path, cache_size=2)
+    scored: list[list[str]] = []
+    original = MLClassifier._score
+
+    def counting_score(models, texts):
+        scored.append(list(texts))
+        return original(models, texts)
+
+    monkeypatch.setattr(MLClassifier, "_score", staticmethod(counting_score))
+
+    first = classifier.predict("Any update on my refund?")
+    assert classifier.predict("  any UPDATE on my   refund?") == first
+    assert scored == [["Any update on my refund?"]]
+    assert classifier.cache.hits == 1 and classifier.cache.misses == 1
+
+    classifier.predict_batch(["a", "b", "Any update on my refund?"])
+    assert classifier.cache.evictions == 1 and len(classifier.cache) == 2
+
+    version = classifier.version
+    classifier.train()
+    assert len(classifier.cache) == 0
+    assert classifier.version != version
+
+
+def test_linear_scorer_matches_sklearn_probabilities(tmp_path: Path) -> None:
+    settings = get_settings()
+    texts = [json.loads(line)["text"] for line in settings.sample_messages_path.open()]
+    probes = texts + ["", "flight flight FLIGHT refund??", "unrelated words only", "cancel my hotel and my flight"]
+
+    slow = MLClassifier(tmp_path, settings.sample_messages_path)
+    fast = MLClassifier(tmp_path, settings.sample_messages_path, fast_scorer=True)
+    assert fast._models is not None and fast._models.scorer is not None
+    for probe in probes:
+        expected, actual = slow.predict(probe), fast.predict(probe)
+        assert actual["top"] == expected["top"]
+        for key in ("svc_probs", "cat_probs"):
+            assert actual[key].keys() == expected[key].keys()
+            assert np.allclose(list(actual[key].values()), list(expected[key].values()), atol=1e-9)
+    assert fast.predict_batch(probes) == [fast.predict(probe) for probe in probes]
+
+    # Other head shapes: binary and multinomial (softmax) classifiers, sublinear TF.
+    services = [json.loads(line)["service_type"] for line in settings.sample_messages_path.open()]
+    vectorizer = TfidfVectorizer(ngram_range=(1, 3), sublinear_tf=True).fit(texts)
+    features = vectorizer.transform(texts)
+    binary = LogisticRegression().fit(features, ["a", "b"] * 3 + ["a"])
+    multinomial = LogisticRegression(solver="lbfgs").fit(features, services)
+    scorer = LinearScorer.from_models(vectorizer, binary, multinomial)
+    svc_proba, cat_proba = scorer.predict_proba(probes)
+    assert np.allclose(svc_proba, binary.predict_proba(vectorizer.transform(probes)), atol=1e-9)
+    assert np.allclose(cat_proba, multinomial.predict_proba(vectorizer.transform(probes)), atol=1e-9)
+
+
+def test_count_terms_accumulates_like_joined_text() -> None:
+    words = ["flight", "cancel", "my", "wallet", "a", "top", "up", "?", "Refund"]
+    rng = random.Random(3)
+    corpus = [" ".join(rng.choice(words) for _ in range(8)) for _ in range(20)]
+    vectorizer = TfidfVectorizer(ngram_range=(1, 3)).fit(corpus)
+    labels = ["x", "y"] * 10
+    clf = LogisticRegression().fit(vectorizer.transform(corpus), labels)
+    scorer = LinearScorer.from_models(vectorizer, clf, clf)
+
+    for _ in range(50):
+        messages = [" ".join(rng.choice(words) for _ in range(rng.randint(0, 4))) for _ in range(5)]
+        counts: Counter = Counter()
+        tail: list[str] = []
+        for message in messages:
+            added, tail = scorer.count_terms(message, tail)
+            counts.update(added)
+        expected = CountVectorizer.transform(vectorizer, [" ".join(messages)]).tocoo()
+        assert dict(counts) == {int(idx): int(n) for idx, n in zip(expected.col, expected.data)}
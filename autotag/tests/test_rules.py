@@ -1,6 +1,20 @@
 from __future__ import annotations
 
-from autotag.app.services.rules_engine import get_rules_engine
+import os
+import re
+from pathlib import Path
+
+import yaml
+
+from autotag.app.config import get_settings
+from autotag.app.services.literal_automaton import LiteralAutomaton
+from autotag.app.services.rules_engine import (
+    RulesEngine,
+    get_rules_engine,
+    reload_rules_engine,
+    ruleset_version,
+)
+from autotag.app.services.rules_reloader import RulesReloader
 
 
 def test_top_up_rule_hits() -> None:
@@ -15,3 +29,203 @@ def test_withdraw_rule_hits() -> None:
     result = engine.apply_rules("can I withdraw cash from wallet?", "en")
     assert result["category"] == "withdraw"
     assert any("cat_withdraw" in hit for hit in result["hits"])
+
+
+def test_overlapping_rules_all_hit(tmp_path: Path) -> None:
+    rules_path = tmp_path / "rules.yaml"
+    rules_path.write_text(
+        yaml.safe_dump(
+            {
+                "service_type": [
+                    {"id": "st_wallet", "lang": "*", "pattern": r"\b(top ?up|wallet)\b", "precision": "normal"},
+                    {"id": "st_custom", "lang": "*", "pattern": r"\btop", "precision": "normal", "tag": "esim"},
+                ],
+                "category": [
+                    {"id": "cat_topup", "lang": "*", "pattern": r"top[ -]?up", "precision": "high"},
+                    {"id": "cat_backref", "lang": "*", "pattern": r"(o)\1", "precision": "normal"},
+                    {"id": "cat_other_lang", "lang": "fr", "pattern": r"top", "precision": "normal"},
+                ],
+            }
+        )
+    )
+    engine = RulesEngine(rules_path)
+
+    result = engine.apply_rules("Please TOP UP, too", "en")
+
+    assert result["hits"] == ["st_wallet", "st_custom", "cat_topup", "cat_backref"]
+    assert result["service_type"] == "wallet"
+    assert result["category"] == "top_up"
+    assert result["precision_hint"] == "high"
+    assert "cat_other_lang" in engine.apply_rules("top", "fr")["hits"]
+
+
+def test_literal_automaton_finds_overlapping_keywords() -> None:
+    automaton: LiteralAutomaton[str] = LiteralAutomaton()
+    for literal in ("he", "she", "his", "hers", "top up"):
+        automaton.add(literal, literal)
+    automaton.build()
+
+    assert automaton.find("ushers") == {"he", "she", "hers"}
+    assert automaton.find("please top up") == {"top up"}
+    assert automaton.find("nothing") == set()
+
+
+def test_prefilter_skips_rules_without_keywords() -> None:
+    engine = get_rules_engine()
+    matcher = engine._matcher_for("en")
+    assert len(matcher.prefiltered) == len(matcher.rules)
+
+    candidates = matcher.automaton.find("can i change my e-sim plan?")
+    assert {matcher.rules[idx].id for idx in candidates} == {"st_esim_keywords", "cat_modify"}
+
+
+def test_prefilter_folds_case_like_the_regex() -> None:
+    engine = get_rules_engine()
+    rules = engine.service_rules + engine.category_rules
+    samples = ["VİSA problem", "vısa problem", "viſa please", "\u212aindly top up", "ESİM plan", "waller ſtuck"]
+    samples += [text.upper().replace("I", "\u0130") for text in ("my visa was rejected", "cancel my esim")]
+    for text in samples:
+        expected = [rule.id for rule in rules if rule.applies_to("en") and re.search(rule.pattern, text, re.I)]
+        assert engine.apply_rules(text, "en")["hits"] == expected, text
+        result, _ = engine.apply_incremental(text, "en", None, lambda text=text: text)
+        assert result["hits"] == expected, text
+    assert engine.apply_rules("VİSA problem", "en")["hits"] == ["st_visa_keywords"]
+
+
+def test_zero_width_matches_at_end_of_text(tmp_path: Path) -> None:
+    patterns = {"st_trailing_space": r"\s*$", "st_word": r"\w*", "cat_start": "^", "cat_refund": r"refund\s*$"}
+    rules_path = tmp_path / "rules.yaml"
+    rules_path.write_text(
+        yaml.safe_dump(
+            {
+                "service_type": [
+                    {"id": rule_id, "lang": "*", "pattern": pattern, "precision": "normal"}
+                    for rule_id, pattern in patterns.items()
+                    if rule_id.startswith("st_")
+                ],
+                "category": [
+                    {"id": rule_id, "lang": "*", "pattern": pattern, "precision": "normal"}
+                    for rule_id, pattern in patterns.items()
+                    if rule_id.startswith("cat_")
+                ],
+            }
+        )
+    )
+    engine = RulesEngine(rules_path)
+    for text in ("abc", "", "refund", "  "):
+        expected = {rule_id for rule_id, pattern in patterns.items() if re.search(pattern, text, re.I)}
+        assert set(engine.apply_rules(text, "en")["hits"]) == expected, text
+
+
+def test_incremental_matches_full_conversation(tmp_path: Path) -> None:
+    rules_path = tmp_path / "rules.yaml"
+    rules_path.write_text(
+        yaml.safe_dump(
+            {
+                "service_type": [
+                    {"id": "st_flight", "lang": "*", "pattern": r"\bbooking\s*ref\b", "precision": "normal"},
+                    {"id": "st_wallet", "lang": "*", "pattern": r"\btop ?up\b", "precision": "high"},
+                ],
+                "category": [
+                    {"id": "cat_pending", "lang": "*", "pattern": r"update\?$", "precision": "normal"},
+                ],
+            }
+        )
+    )
+    engine = RulesEngine(rules_path)
+    messages = ["my booking", "ref is ABC, please top", "up", "any update?", "thanks"]
+
+    state = None
+    for idx, text in enumerate(messages):
+        joined = " ".join(messages[: idx + 1])
+        result, state = engine.apply_incremental(text, "en", state, lambda joined=joined: joined)
+        assert result == engine.apply_rules(joined.strip(), "en")
+
+    assert result["hits"] == ["st_flight", "st_wallet"]
+
+
+def test_incremental_shipped_rules_never_reread_conversation() -> None:
+    engine = get_rules_engine()
+    messages = ["hi, my booking is late", "it was made last week"] + [f"any news {idx}?" for idx in range(20)]
+    messages += ["booking", "ref ABC123"]
+    reads: list[int] = []
+
+    state = None
+    for idx, text in enumerate(messages):
+        joined = " ".join(messages[: idx + 1])
+
+        def conversation(joined: str = joined, idx: int = idx) -> str:
+            reads.append(idx)
+            return joined
+
+        result, state = engine.apply_incremental(text, "en", state, conversation)
+        assert result == engine.apply_rules(joined.strip(), "en")
+        assert len(str(state["tail"])) < 40
+
+    assert reads == [0]  # only the first message bootstraps the state
+    assert "st_flight_keywords" in result["hits"]
+
+
+def test_reload_swaps_engine_atomically(tmp_path: Path, monkeypatch) -> None:
+    settings = get_settings()
+    rules_path = tmp_path / "rules.yaml"
+    rules_path.write_text(settings.rules_path.read_text())
+    monkeypatch.setattr(settings, "rules_path", rules_path)
+
+    original = reload_rules_engine()
+    assert reload_rules_engine() is original
+    assert original.version == ruleset_version(rules_path.read_bytes())
+
+    rules_path.write_text(
+        rules_path.read_text()
+        + '  - id: cat_lost_baggage\n    lang: "*"\n    pattern: "\\\\bbaggage\\\\b"\n'
+        + "    precision: normal\n    tag: order_recheck\n"
+    )
+    updated = reload_rules_engine()
+    assert updated is get_rules_engine()
+    assert updated.version != original.version
+    assert updated.apply_rules("my baggage is lost", "en")["category"] == "order_recheck"
+
+    rules_path.write_text("service_type: [")
+    reloader = RulesReloader()
+    reloader.reload()
+    assert reloader.last_error
+    assert get_rules_engine() is updated
+
+    monkeypatch.undo()
+    reload_rules_engine()
+
+
+def test_every_process_picks_up_a_changed_rules_file(tmp_path: Path, monkeypatch) -> None:
+    settings = get_settings()
+    rules_path = tmp_path / "rules.yaml"
+    rules_path.write_text(settings.rules_path.read_text())
+    monkeypatch.setattr(settings, "rules_path", rules_path)
+    original = reload_rules_engine()
+
+    # Another worker rewrote the file; this process never saw the admin call.
+    reloader = RulesReloader(check_interval=0)
+    assert not reloader.reload_if_changed()
+    rules_path.write_text(
+        rules_path.read_text()
+        + '  - id: cat_lost_baggage\n    lang: "*"\n    pattern: "\\\\bbaggage\\\\b"\n'
+        + "    precision: normal\n    tag: order_recheck\n"
+    )
+    os.utime(rules_path, ns=(0, rules_path.stat().st_mtime_ns + 1))
+    assert reloader.reload_if_changed()
+    reloader._worker.join()
+    updated = get_rules_engine()
+    assert updated.version != original.version
+    assert updated.apply_rules("my baggage is lost", "en")["category"] == "order_recheck"
+    assert not reloader.reload_if_changed()
+
+    # A broken file is tried once, not on every ingest.
+    rules_path.write_text("service_type: [")
+    assert reloader.reload_if_changed()
+    reloader._worker.join()
+    assert reloader.last_error
+    assert not reloader.reload_if_changed()
+    assert get_rules_engine() is updated
+
+    monkeypatch.undo()
+    reload_rules_engine()
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import re
+from contextlib import contextmanager
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, inspect, text
+
+from autotag.app.config import get_settings
+from autotag.app.db import Base, SessionLocal, _add_missing_indexes, create_all, engine
+from autotag.app.main import app
+from autotag.app.models import Message
+from autotag.app.services.context_window import ContextPolicy, load_context
+from autotag.app.services.ingest_pipeline import get_or_create_ticket
+
+# Tables that grow with traffic; a plan may only walk them through an index.
+LARGE_TABLES = ("tickets", "messages", "tag_audits", "metric_rollups", "classification_jobs")
+
+
+@contextmanager
+def captured_selects():
+    statements: list[tuple[str, object]] = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany) -> None:
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+
+
+def _plan(statement: str, parameters: object) -> list[str]:
+    with engine.connect() as conn:
+        cursor = conn.connection.dbapi_connection.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        return [row[3] for row in cursor]
+
+
+def test_sqlite_profile_applies_pragmas() -> None:
+    settings = get_settings()
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == settings.sqlite_busy_timeout_ms
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert conn.execute(text("PRAGMA cache_size")).scalar() == -settings.sqlite_cache_size_kib
+
+
+def test_missing_indexes_are_added_to_existing_tables(tmp_path) -> None:
+    legacy = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    Base.metadata.create_all(bind=legacy)
+    dropped = ["ix_tickets_updated_at_ticket_id", "ix_tickets_tag_source_updated_at", "ix_messages_ticket_id_message_id"]
+    with legacy.begin() as conn:
+        for name in dropped:
+            conn.execute(text(f"DROP INDEX {name}"))
+
+    _add_missing_indexes(legacy)
+
+    inspector = inspect(legacy)
+    names = {index["name"] for table in ("tickets", "messages") for index in inspector.get_indexes(table)}
+    assert set(dropped) <= names
+
+
+def test_hot_queries_use_indexes() -> None:
+    create_all()
+    with TestClient(app) as client:
+        for idx in range(3):
+            ticket_id = client.post(
+                "/messages/ingest",
+                json={"conversation_id": f"conv_plan_{idx}", "text": "top up my wallet", "sender": "user"},
+            ).json()["ticket_id"]
+
+        with captured_selects() as statements:
+            client.post(
+                "/messages/ingest",
+                json={"conversation_id": "conv_plan_0", "text": "any news?", "sender": "user"},
+            )
+            first = client.get("/tickets", params={"limit": 1})
+            client.get("/tickets", params={"limit": 1, "cursor": first.headers["X-Next-Cursor"]})
+            for column in ("status", "service_type", "category", "tag_source"):
+                client.get("/tickets", params={column: "x"})
+            client.get(f"/tickets/{ticket_id}")
+            client.get("/admin/metrics", params={"bucket": "hour"})
+
+    plans = {statement: _plan(statement, parameters) for statement, parameters in statements}
+    assert len(plans) >= 8
+    full_scan = re.compile(rf"^SCAN ({'|'.join(LARGE_TABLES)})$")
+    for statement, plan in plans.items():
+        for step in plan:
+            assert not full_scan.match(step), f"full scan in {step!r} for {statement}"
+            assert "TEMP B-TREE" not in step, f"sort in {step!r} for {statement}"
+    steps = [step for plan in plans.values() for step in plan]
+    for index in (
+        "ix_tickets_updated_at_ticket_id",
+        "ix_tickets_tag_source_updated_at",
+        "ix_messages_ticket_id_message_id",
+        "ix_tag_audits_ticket_id_audit_id",
+    ):
+        assert any(index in step for step in steps), index
+
+
+def test_context_window_pages_by_message_id() -> None:
+    create_all()
+    with SessionLocal() as db:
+        ticket = get_or_create_ticket(db, "conv_context_pages")
+        texts = [f"message {idx}" for idx in range(70)]
+        db.add_all(Message(ticket_id=ticket.ticket_id, sender="user", text=text, lang="en") for text in texts)
+        db.commit()
+
+        with captured_selects() as statements:
+            context = load_context(db, ticket.ticket_id, ContextPolicy(max_tokens=10_000))
+
+    assert context.messages == texts
+    pages = [(statement, parameters) for statement, parameters in statements if "FROM messages" in statement]
+    assert len(pages) == 3
+    # SQLite renders LIMIT with an OFFSET placeholder; it must stay 0 rather than skip read rows.
+    assert all(parameters[-1] == 0 for _, parameters in pages)
+    assert all("messages.message_id <" in statement for statement, _ in pages[1:])
+    for statement, parameters in pages[1:]:
+        assert "USING INDEX ix_messages_ticket_id_message_id (ticket_id=? AND message_id<?)" in " ".join(
+            _plan(statement, parameters)
+        )
@@ -1,9 +1,47 @@
 from __future__ import annotations
 
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer, ThreadingHTTPServer
+from typing import Optional
+
+import pytest
 from fastapi.testclient import TestClient
+from sklearn.feature_extraction.text import CountVectorizer
+from sqlalchemy import event
+from sqlalchemy.orm import Session
 
+from autotag.app.config import get_settings
+from autotag.app import schemas
+from autotag.app.db import SessionLocal, create_all, engine
 from autotag.app.main import app
-from autotag.app.services import confidence_policy
+from autotag.app.routers import messages as messages_router
+from autotag.app.routers import tickets as tickets_router
+from autotag.app.models import ClassificationJob, TagAudit, Ticket
+from autotag.app.services import (
+    classification_workers,
+    confidence_policy,
+    feature_store,
+    lang_and_scrub,
+    metric_counters,
+)
+from autotag.app.services.classification_workers import (
+    ClassificationWorkers,
+    add_job,
+    check_callback_url,
+    get_classification_workers,
+)
+from autotag.app.services.context_window import ContextPolicy, load_context
+from autotag.app.services.group_commit import GroupCommitWriter
+from autotag.app.services import ingest_pipeline
+from autotag.app.services.ingest_pipeline import get_or_create_ticket
+from autotag.app.services.ml_classifier import MLClassifier, get_classifier
+from autotag.app.services.online_learner import OnlineLearner
+from autotag.app.services.rules_engine import get_rules_engine
+from autotag.app.services.tag_writer import write_tags
 
 
 def test_ingest_auto_tags() -> None:
@@ -22,6 +60,14 @@ def test_ingest_auto_tags() -> None:
         assert payload["clarifier_question"] is None
         assert payload["suggested_tags"]["service_type"] == "wallet"
         assert payload["suggested_tags"]["category"] == "top_up"
+        assert payload["rules_version"] == get_rules_engine().version
+
+        detail = client.get(f"/tickets/{payload['ticket_id']}").json()
+        assert detail["tag_history"][-1]["rules_version"] == payload["rules_version"]
+
+        inference = client.get("/admin/inference").json()
+        assert inference["model_version"] == get_classifier().version
+        assert {"latency_p50_ms", "latency_p99_ms", "throughput_per_s"} <= set(inference)
 
 
 def test_ingest_routes_to_llm(monkeypatch) -> None:
@@ -36,6 +82,7 @@ def test_ingest_routes_to_llm(monkeypatch) -> None:
 
     with TestClient(app) as client:
         monkeypatch.setattr(confidence_policy, "evaluate", fake_evaluate)
+        monkeypatch.setattr(get_settings(), "skip_settled_by_rules", False)
         response = client.post(
             "/messages/ingest",
             json={
@@ -89,3 +136,688 @@ def test_ticket_listing_and_conversation_context() -> None:
         detail = client.get(f"/tickets/{ticket_id}")
         assert detail.status_code == 200
         assert len(detail.json()["messages"]) == 2
+
+
+def test_batch_ingest_classifies_each_ticket_once() -> None:
+    messages = [
+        {"conversation_id": "conv_batch_a", "text": "I want to cancel my flight", "sender": "user"},
+        {"conversation_id": "conv_batch_b", "text": "please top up my wallet", "sender": "user"},
+        {"conversation_id": "conv_batch_a", "text": "the PNR is XYZ123", "sender": "user"},
+    ]
+    with TestClient(app) as client:
+        response = client.post("/messages/ingest:batch", json={"messages": messages})
+        assert response.status_code == 200
+        results = response.json()["results"]
+
+        assert len(results) == 3
+        assert results[0] == results[2]
+        assert results[0]["ticket_id"] != results[1]["ticket_id"]
+        assert results[1]["suggested_tags"] == {"service_type": "wallet", "category": "top_up"}
+
+        detail = client.get(f"/tickets/{results[0]['ticket_id']}").json()
+        assert [msg["text"] for msg in detail["messages"]] == [
+            "I want to cancel my flight",
+            "the PNR is XYZ123",
+        ]
+
+
+def test_online_learner_consumes_agent_overrides(tmp_path) -> None:
+    with TestClient(app) as client:
+        ticket_id = client.post(
+            "/messages/ingest",
+            json={"conversation_id": "conv_online", "text": "the lounge pass never arrived", "sender": "user"},
+        ).json()["ticket_id"]
+        client.post(
+            f"/tickets/{ticket_id}/override",
+            json={"service_type": "flight", "category": "order_recheck", "reason": "lounge"},
+        )
+
+    settings = get_settings()
+    learner = OnlineLearner(tmp_path, settings.sample_messages_path, batch_size=2)
+    with SessionLocal() as db:
+        applied = learner.sync(db)
+        audit_id = max(audit.audit_id for audit in db.query(TagAudit).filter_by(ticket_id=ticket_id))
+
+        assert applied >= 1
+        assert learner.watermark >= audit_id
+        assert learner.sync(db) == 0
+
+
+def test_retrain_runs_as_background_job() -> None:
+    classifier = get_classifier()
+    with TestClient(app) as client:
+        response = client.post("/admin/retrain")
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+
+        deadline = time.monotonic() + 120
+        job = client.get(f"/admin/retrain/{job_id}").json()
+        while job["status"] not in {"succeeded", "failed"} and time.monotonic() < deadline:
+            time.sleep(0.2)
+            job = client.get(f"/admin/retrain/{job_id}").json()
+
+        assert job["status"] == "succeeded", job.get("error")
+        assert set(job["metrics"]) >= {"service_macro_f1", "category_macro_f1"}
+        assert client.get("/admin/retrain/unknown").status_code == 404
+
+    classifier.predict("please top up my wallet")
+    assert classifier._loaded_mtime == classifier.model_path.stat().st_mtime_ns
+
+
+def test_ingest_scores_stored_term_counts_like_full_text() -> None:
+    classifier = get_classifier()
+    texts = ["Hi, my FLIGHT", "   ", "cancel   please,", "refund the booking"]
+    with TestClient(app) as client:
+        for text in texts:
+            ticket_id = client.post(
+                "/messages/ingest",
+                json={"conversation_id": "conv_features", "text": text, "sender": "user"},
+            ).json()["ticket_id"]
+
+    with SessionLocal() as db:
+        ticket = db.get(Ticket, ticket_id)
+        state = ticket.feature_state.state
+        conversation = " ".join(msg.text for msg in ticket.messages if msg.text)
+
+    models = classifier.current_models()
+    assert state["version"] == models.version
+    counts = CountVectorizer.transform(models.service_vectorizer, [conversation]).tocoo()
+    assert state["counts"] == {str(idx): int(n) for idx, n in zip(counts.col, counts.data)}
+
+    (stored,) = feature_store.predict_states([state], models)
+    expected = classifier.predict(conversation)
+    assert stored["top"] == expected["top"]
+    for label, prob in expected["svc_probs"].items():
+        assert abs(stored["svc_probs"][label] - prob) < 1e-9
+
+
+def test_stored_term_counts_go_through_the_prediction_cache(monkeypatch) -> None:
+    classifier = get_classifier()
+    assert classifier.cache.enabled and get_settings().feature_store
+    scored: list[int] = []
+    score_counts = feature_store._score_counts
+
+    def counting_score_counts(counts, models):
+        scored.append(len(counts))
+        return score_counts(counts, models)
+
+    monkeypatch.setattr(feature_store, "_score_counts", counting_score_counts)
+    monkeypatch.setattr(MLClassifier, "_score", staticmethod(lambda models, texts: pytest.fail("text path used")))
+    hits, misses = classifier.cache.hits, classifier.cache.misses
+    with TestClient(app) as client:
+        first, second = (
+            client.post(
+                "/messages/ingest",
+                json={"conversation_id": conversation_id, "text": "any news on my request?", "sender": "user"},
+            ).json()
+            for conversation_id in ("conv_counts_cache_0", "conv_counts_cache_1")
+        )
+
+    # Same term counts under the same model: the second ticket is served from the cache.
+    assert scored == [1]
+    assert (classifier.cache.hits - hits, classifier.cache.misses - misses) == (1, 1)
+    assert first["suggested_tags"] == second["suggested_tags"]
+
+
+def test_context_window_limits_what_tagging_sees(monkeypatch) -> None:
+    settings = get_settings()
+    monkeypatch.setattr(settings, "context_max_messages", 2)
+    monkeypatch.setattr(settings, "context_decay", 0.5)
+    texts = ["I need to cancel my flight", "hello", "please top up my wallet", "thanks"]
+    with TestClient(app) as client:
+        for text in texts:
+            payload = client.post(
+                "/messages/ingest",
+                json={"conversation_id": "conv_window", "text": text, "sender": "user"},
+            ).json()
+
+    assert payload["suggested_tags"]["service_type"] == "wallet"
+    with SessionLocal() as db:
+        ticket = db.get(Ticket, payload["ticket_id"])
+        assert ticket.rule_state is None and ticket.feature_state is None
+
+        window = load_context(db, payload["ticket_id"], ContextPolicy(max_messages=2, decay=0.5))
+        assert window.messages == ["please top up my wallet", "thanks"]
+        assert window.weights() == [0.5, 1.0]
+
+        by_chars = load_context(db, payload["ticket_id"], ContextPolicy(max_chars=30))
+        assert by_chars.messages == ["please top up my wallet", "thanks"]
+        by_tokens = load_context(db, payload["ticket_id"], ContextPolicy(max_tokens=2))
+        assert by_tokens.messages == ["thanks"]
+        truncated = load_context(db, payload["ticket_id"], ContextPolicy(max_chars=4))
+        assert truncated.messages == ["anks"]
+
+
+def test_concurrent_ticket_creation_never_collides() -> None:
+    create_all()
+    conversations = [f"conv_race_{idx % 6}" for idx in range(24)]
+
+    def create(conversation_id: str) -> tuple[str, str]:
+        with SessionLocal() as db:
+            ticket = get_or_create_ticket(db, conversation_id)
+            db.commit()
+            return conversation_id, ticket.ticket_id
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        created = list(pool.map(create, conversations))
+
+    by_conversation: dict[str, set[str]] = {}
+    for conversation_id, ticket_id in created:
+        by_conversation.setdefault(conversation_id, set()).add(ticket_id)
+    assert all(len(ids) == 1 for ids in by_conversation.values())
+    ticket_ids = [ids.pop() for ids in by_conversation.values()]
+    assert len(set(ticket_ids)) == 6
+    assert all(ticket_id.startswith("TK") and ticket_id[2:].isdigit() for ticket_id in ticket_ids)
+
+
+def test_async_ingest_classifies_in_background_and_calls_back(monkeypatch) -> None:
+    received: list[dict] = []
+    monkeypatch.setattr(get_classification_workers(), "callback_allowed_hosts", ("127.0.0.1",))
+
+    class Callback(BaseHTTPRequestHandler):
+        def do_POST(self) -> None:
+            received.append(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, *args) -> None:  # silence test output
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Callback)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        with TestClient(app) as client:
+            response = client.post(
+                "/messages/ingest:async",
+                json={
+                    "conversation_id": "conv_async",
+                    "text": "please top up my wallet asap",
+                    "sender": "user",
+                    "callback_url": f"http://127.0.0.1:{server.server_port}/done",
+                },
+            )
+            assert response.status_code == 202
+            accepted = response.json()
+            assert response.headers["Location"] == f"/messages/jobs/{accepted['job_id']}"
+
+            deadline = time.monotonic() + 10
+            job = client.get(f"/messages/jobs/{accepted['job_id']}").json()
+            while job["callback_status"] is None and time.monotonic() < deadline:
+                time.sleep(0.05)
+                job = client.get(f"/messages/jobs/{accepted['job_id']}").json()
+
+            assert job["status"] == "succeeded"
+            assert job["ticket_id"] == accepted["ticket_id"]
+            assert job["result"]["suggested_tags"] == {"service_type": "wallet", "category": "top_up"}
+            assert job["callback_status"] == "204"
+            assert received[0]["job_id"] == accepted["job_id"]
+            assert received[0]["result"] == job["result"]
+
+            ticket = client.get(f"/tickets/{accepted['ticket_id']}").json()
+            assert (ticket["service_type"], ticket["category"]) == ("wallet", "top_up")
+            assert client.get("/messages/jobs/missing").status_code == 404
+    finally:
+        server.shutdown()
+
+
+def test_callback_urls_must_be_public_or_allowed() -> None:
+    for url in (
+        "http://127.0.0.1:8000/admin",
+        "http://[::1]/",
+        "http://169.254.169.254/latest/meta-data/",
+        "http://10.0.0.5/hook",
+        "http://localhost:8000/",
+    ):
+        with pytest.raises(ValueError):
+            check_callback_url(url, ())
+    check_callback_url("https://93.184.216.34/hook", ())
+    check_callback_url("https://HOOKS.example.com/done", ["hooks.example.com"])
+    with pytest.raises(ValueError, match="allowed hosts"):
+        check_callback_url("https://93.184.216.34/hook", ["hooks.example.com"])
+
+    with TestClient(app) as client:
+        for url in ("ftp://example.com/x", "http://169.254.169.254/latest/meta-data/"):
+            response = client.post(
+                "/messages/ingest:async",
+                json={"conversation_id": "conv_ssrf", "text": "top up", "sender": "user", "callback_url": url},
+            )
+            assert response.status_code == 422, url
+
+
+def test_async_burst_is_classified_once_after_quiet_period(monkeypatch) -> None:
+    workers = ClassificationWorkers(workers=2, max_backlog=0, quiet_ms=300)
+    monkeypatch.setattr(messages_router, "get_classification_workers", lambda: workers)
+    burst = ["hi", "about my wallet", "i want to top up", "please top up asap"]
+    try:
+        with TestClient(app) as client:
+            accepted = [
+                client.post(
+                    "/messages/ingest:async",
+                    json={"conversation_id": "conv_burst", "text": text, "sender": "user"},
+                ).json()
+                for text in burst
+            ]
+            deadline = time.monotonic() + 10
+            jobs = []
+            while time.monotonic() < deadline:
+                jobs = [client.get(f"/messages/jobs/{item['job_id']}").json() for item in accepted]
+                if all(job["status"] == "succeeded" for job in jobs):
+                    break
+                time.sleep(0.05)
+
+            assert [job["status"] for job in jobs] == ["succeeded"] * len(burst)
+            assert all(job["result"] == jobs[-1]["result"] for job in jobs)
+            assert jobs[-1]["result"]["suggested_tags"]["category"] == "top_up"
+            assert workers.snapshot()["classifications"] == 1
+            ticket = client.get(f"/tickets/{accepted[0]['ticket_id']}").json()
+            assert len(ticket["tag_history"]) == 1
+    finally:
+        workers.stop()
+
+
+def test_settled_tickets_skip_classification(monkeypatch) -> None:
+    def fail_predict(items):  # type: ignore[unused-argument]
+        raise AssertionError("ML should not run for a settled ticket")
+
+    with TestClient(app) as client:
+        before = client.get("/admin/inference").json()["short_circuit"]
+        monkeypatch.setattr(ingest_pipeline, "_predict", fail_predict)
+        settled = client.post(
+            "/messages/ingest",
+            json={"conversation_id": "conv_settled", "text": "please top up my wallet", "sender": "user"},
+        ).json()
+        assert settled["skipped"] == "rules_settled"
+        assert settled["source"] == "rule"
+        assert settled["suggested_tags"] == {"service_type": "wallet", "category": "top_up"}
+
+        ticket_id = settled["ticket_id"]
+        client.post(
+            f"/tickets/{ticket_id}/override",
+            json={"service_type": "wallet", "category": "withdraw", "reason": "agent knows best"},
+        )
+        again = client.post(
+            "/messages/ingest",
+            json={"conversation_id": "conv_settled", "text": "top up again please", "sender": "user"},
+        ).json()
+        assert again["skipped"] == "human_tagged"
+        assert again["source"] == "agent"
+        assert again["suggested_tags"] == {"service_type": "wallet", "category": "withdraw"}
+
+        detail = client.get(f"/tickets/{ticket_id}").json()
+        assert (detail["category"], detail["tag_source"]) == ("withdraw", "agent")
+        assert len(detail["tag_history"]) == 2
+
+        after = client.get("/admin/inference").json()["short_circuit"]
+        assert after["evaluated"] - before["evaluated"] == 2
+        assert after["skipped"]["rules_settled"] - before["skipped"]["rules_settled"] == 1
+        assert after["skipped"]["human_tagged"] - before["skipped"]["human_tagged"] == 1
+
+
+def test_ticket_listing_pages_by_keyset_and_filters() -> None:
+    with TestClient(app) as client:
+        created = [
+            client.post(
+                "/messages/ingest",
+                json={"conversation_id": f"conv_page_{idx}", "text": f"top up my wallet #{idx}", "sender": "user"},
+            ).json()["ticket_id"]
+            for idx in range(5)
+        ]
+        client.post(
+            "/messages/ingest",
+            json={"conversation_id": "conv_page_1", "text": "still waiting " * 20, "sender": "user"},
+        )
+
+        seen: list[dict] = []
+        cursor = None
+        while True:
+            params = {"limit": 2, "service_type": "wallet", "category": "top_up"}
+            if cursor:
+                params["cursor"] = cursor
+            response = client.get("/tickets", params=params)
+            assert response.status_code == 200
+            page = response.json()
+            assert len(page) <= 2
+            seen.extend(page)
+            cursor = response.headers.get("X-Next-Cursor")
+            if cursor is None:
+                break
+
+        ids = [item["ticket_id"] for item in seen]
+        assert len(ids) == len(set(ids))
+        assert set(created) <= set(ids)
+        assert all((item["service_type"], item["category"]) == ("wallet", "top_up") for item in seen)
+        order = [(item["updated_at"], item["ticket_id"]) for item in seen]
+        assert order == sorted(order, key=lambda key: (-datetime.fromisoformat(key[0]).timestamp(), key[1]))
+
+        busy = next(item for item in seen if item["ticket_id"] == created[1])
+        assert busy["message_count"] == 2
+        assert busy["last_message_preview"] == ("still waiting " * 20)[:120]
+        assert ids.index(created[1]) < ids.index(created[4])
+
+        assert client.get("/tickets", params={"tag_source": "nobody"}).json() == []
+        assert client.get("/tickets", params={"cursor": "not-a-cursor"}).status_code == 400
+
+
+def test_ticket_detail_pages_history_and_honours_etag() -> None:
+    with TestClient(app) as client:
+        texts = [f"message number {idx} about my hotel booking" for idx in range(5)]
+        for text in texts:
+            ticket_id = client.post(
+                "/messages/ingest",
+                json={"conversation_id": "conv_detail", "text": text, "sender": "user"},
+            ).json()["ticket_id"]
+
+        response = client.get(f"/tickets/{ticket_id}", params={"messages_limit": 2})
+        assert response.status_code == 200
+        detail = response.json()
+        assert [msg["text"] for msg in detail["messages"]] == texts[-2:]
+        older = client.get(
+            f"/tickets/{ticket_id}",
+            params={"messages_limit": 2, "messages_before": detail["messages_before"]},
+        ).json()
+        assert [msg["text"] for msg in older["messages"]] == texts[1:3]
+        oldest = client.get(
+            f"/tickets/{ticket_id}",
+            params={"messages_limit": 2, "messages_before": older["messages_before"]},
+        ).json()
+        assert [msg["text"] for msg in oldest["messages"]] == texts[:1]
+        assert oldest["messages_before"] is None
+
+        etag = response.headers["ETag"]
+        cached = client.get(f"/tickets/{ticket_id}", headers={"If-None-Match": etag})
+        assert cached.status_code == 304
+        assert cached.headers["ETag"] == etag
+
+        client.post(
+            f"/tickets/{ticket_id}/override",
+            json={"service_type": "hotel", "category": "modify", "reason": "checked"},
+        )
+        changed = client.get(f"/tickets/{ticket_id}", headers={"If-None-Match": etag})
+        assert changed.status_code == 200
+        assert changed.headers["ETag"] != etag
+        assert changed.json()["tag_history"][-1]["source"] == "agent"
+
+
+def test_metric_counters_track_writes_and_rebuild() -> None:
+    with TestClient(app) as client:
+        ticket_id = client.post(
+            "/messages/ingest",
+            json={"conversation_id": "conv_counters", "text": "please withdraw from my wallet", "sender": "user"},
+        ).json()["ticket_id"]
+        client.post(
+            f"/tickets/{ticket_id}/override",
+            json={"service_type": "wallet", "category": "top_up", "reason": "counted"},
+        )
+        served = client.get("/admin/metrics").json()
+
+    with SessionLocal() as db:
+        assert metric_counters.differences(db) == {}
+        assert served == metric_counters.metrics(db)
+        assert served["tickets"] == db.query(Ticket).count()
+        assert served["class_distribution"]["wallet::top_up"] >= 1
+
+        metric_counters.bump(db, {"tickets": 5})
+        assert metric_counters.differences(db)["tickets"][0] == served["tickets"] + 5
+        metric_counters.rebuild(db)
+        db.commit()
+        assert metric_counters.differences(db) == {}
+
+
+def test_windowed_metrics_read_hourly_rollups() -> None:
+    start = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    with TestClient(app) as client:
+        before = client.get("/admin/metrics", params={"since": start.isoformat()}).json()["totals"]
+        ticket_id = client.post(
+            "/messages/ingest",
+            json={"conversation_id": "conv_rollup", "text": "top up my wallet", "sender": "user"},
+        ).json()["ticket_id"]
+        client.post(
+            f"/tickets/{ticket_id}/override",
+            json={"service_type": "wallet", "category": "withdraw", "reason": "rollup"},
+        )
+        client.post(
+            "/messages/ingest",
+            json={"conversation_id": "conv_rollup", "text": "thanks", "sender": "user"},
+        )
+
+        window = client.get("/admin/metrics", params={"since": start.isoformat(), "bucket": "hour"}).json()
+        totals = window["totals"]
+        assert totals["decisions"] - before["decisions"] == 2
+        assert totals["tickets_created"] - before["tickets_created"] == 1
+        assert totals["actions"]["skipped"] - before["actions"].get("skipped", 0) == 1
+        assert totals["skipped"]["human_tagged"] - before["skipped"].get("human_tagged", 0) == 1
+        assert totals["override_rate_per_decision"] > 0
+        assert "override_rate" not in totals
+        assert window["series"][0]["bucket_start"] == start.isoformat()
+
+        daily = client.get("/admin/metrics", params={"since": start.isoformat(), "bucket": "day"}).json()
+        assert daily["totals"] == totals
+        assert daily["series"][0]["bucket_start"] == start.replace(hour=0).isoformat()
+
+        past = client.get(
+            "/admin/metrics", params={"since": "2001-01-01T00:00:00", "until": "2001-01-02T00:00:00"}
+        ).json()
+        assert past["series"] == [] and past["totals"]["decisions"] == 0
+        assert "class_distribution" in client.get("/admin/metrics").json()
+
+
+def test_group_commit_writes_concurrent_ingests_in_one_transaction(monkeypatch) -> None:
+    create_all()
+    writer = GroupCommitWriter(max_batch=8, max_delay_ms=200)
+    monkeypatch.setattr(messages_router, "get_group_commit_writer", lambda: writer)
+    commits: list[int] = []
+
+    def count_commit(conn) -> None:
+        commits.append(1)
+
+    event.listen(engine, "commit", count_commit)
+    detect_lang = lang_and_scrub.detect_lang
+
+    def flaky_detect_lang(text: str) -> str:
+        if text == "poison":
+            raise ValueError("unreadable message")
+        return detect_lang(text)
+
+    monkeypatch.setattr(lang_and_scrub, "detect_lang", flaky_detect_lang)
+    try:
+        payloads = [
+            schemas.MessageIn(conversation_id=f"conv_group_{idx}", text="please top up my wallet", sender="user")
+            for idx in range(6)
+        ]
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            results = list(pool.map(writer.ingest, payloads))
+        assert commits == [1]
+        assert writer.snapshot()["batches"] == 1
+        assert len({result.ticket_id for result in results}) == 6
+        assert all(result.suggested_tags.category == "top_up" for result in results)
+
+        bad = schemas.MessageIn(conversation_id="conv_group_bad", text="poison", sender="user")
+        good = schemas.MessageIn(conversation_id="conv_group_0", text="any news?", sender="user")
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            outcomes = [pool.submit(writer.ingest, payload) for payload in (bad, good)]
+        assert isinstance(outcomes[0].exception(), ValueError)
+        assert outcomes[1].result().ticket_id == results[0].ticket_id
+        assert writer.snapshot()["replayed_batches"] == 1
+
+        with TestClient(app) as client:
+            response = client.post(
+                "/messages/ingest",
+                json={"conversation_id": "conv_group_0", "text": "thanks", "sender": "user"},
+            )
+            assert response.status_code == 200
+            ticket = client.get(f"/tickets/{results[0].ticket_id}").json()
+            assert [message["text"] for message in ticket["messages"]][-2:] == ["any news?", "thanks"]
+    finally:
+        event.remove(engine, "commit", count_commit)
+        writer.stop()
+
+
+def test_group_commit_wait_is_bounded_and_withdraws_unwritten_requests(monkeypatch) -> None:
+    create_all()
+    started = threading.Event()
+    release = threading.Event()
+
+    def stalled_session() -> Session:
+        started.set()
+        release.wait(5)
+        return SessionLocal()
+
+    writer = GroupCommitWriter(max_batch=1, max_delay_ms=0, session_factory=stalled_session, wait_timeout=0.2)
+    monkeypatch.setattr(messages_router, "get_group_commit_writer", lambda: writer)
+    try:
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            running = pool.submit(
+                writer.ingest, schemas.MessageIn(conversation_id="conv_stalled_0", text="top up", sender="user")
+            )
+            assert started.wait(5)
+            # The writer is stuck on the first batch, so this request never starts and is withdrawn.
+            with TestClient(app) as client:
+                response = client.post(
+                    "/messages/ingest", json={"conversation_id": "conv_stalled_1", "text": "top up", "sender": "user"}
+                )
+            assert response.status_code == 503
+            assert response.headers["Retry-After"] == "1"
+            # A started batch is waited for past the timeout rather than reported as failed.
+            release.set()
+            assert running.result().suggested_tags.category == "top_up"
+    finally:
+        release.set()
+        writer.stop()
+
+    with SessionLocal() as db:
+        stored = {ticket.conversation_id for ticket in db.query(Ticket).all()}
+    assert "conv_stalled_0" in stored
+    assert "conv_stalled_1" not in stored
+
+
+def test_confidence_jitter_updates_ticket_without_audit() -> None:
+    create_all()
+    with SessionLocal() as db:
+        ticket = get_or_create_ticket(db, "conv_jitter")
+        for confidence in (0.80, 0.81, 0.83, 0.86, 0.84):
+            write_tags(db, ticket, "wallet", "top_up", confidence, "ml")
+        write_tags(db, ticket, "wallet", "top_up", 0.84, "llm")
+        write_tags(db, ticket, "wallet", "refund", 0.84, "llm")
+        db.commit()
+
+        audits = db.query(TagAudit).filter_by(ticket_id=ticket.ticket_id).order_by(TagAudit.audit_id).all()
+        # 0.86 is audited: small steps add up against the last audited 0.80.
+        assert [(audit.confidence, audit.source, audit.new_category) for audit in audits] == [
+            (0.80, "ml", "top_up"),
+            (0.86, "ml", "top_up"),
+            (0.84, "llm", "top_up"),
+            (0.84, "llm", "refund"),
+        ]
+        assert ticket.tag_confidence == 0.84
+        assert metric_counters.differences(db) == {}
+
+
+def _signalling_lock(waiting: threading.Event):
+    """``conversation_lock`` that sets ``waiting`` just before it blocks on the lock."""
+
+    def lock(conversation_id: str):
+        waiting.set()
+        return ingest_pipeline.conversation_lock(conversation_id)
+
+    return lock
+
+
+def test_human_override_is_not_overwritten_by_waiting_classification(monkeypatch) -> None:
+    workers = ClassificationWorkers(workers=1, max_backlog=0)
+    worker_waiting, override_waiting = threading.Event(), threading.Event()
+    monkeypatch.setattr(classification_workers, "conversation_lock", _signalling_lock(worker_waiting))
+    monkeypatch.setattr(tickets_router, "conversation_lock", _signalling_lock(override_waiting))
+    with TestClient(app) as client:
+        # Queued after startup, so only ``workers.run`` below picks the job up.
+        with SessionLocal() as db:
+            payload = schemas.MessageIn(conversation_id="conv_override_race", text="top up my wallet", sender="user")
+            item = ingest_pipeline.store_message(db, payload, ContextPolicy.from_settings())
+            job = add_job(db, item)
+            db.commit()
+            ticket_id, job_id = item.ticket.ticket_id, job.job_id
+
+        with ingest_pipeline.conversation_lock("conv_override_race"):
+            # The worker reads the ticket, then waits for the conversation ...
+            worker = threading.Thread(target=workers.run, args=(ticket_id, [job_id]))
+            worker.start()
+            assert worker_waiting.wait(10)
+            # ... while an agent's override lands.
+            with SessionLocal() as db:
+                ticket = db.get(Ticket, ticket_id)
+                write_tags(db, ticket, "flight", "order_recheck", 1.0, "agent")
+                db.commit()
+        worker.join(timeout=10)
+
+        ticket = client.get(f"/tickets/{ticket_id}").json()
+        assert (ticket["service_type"], ticket["category"], ticket["tag_source"]) == ("flight", "order_recheck", "agent")
+        assert client.get(f"/messages/jobs/{job_id}").json()["result"]["skipped"] == "human_tagged"
+
+        with ingest_pipeline.conversation_lock("conv_override_race"):
+            override = threading.Thread(
+                target=client.post,
+                args=(f"/tickets/{ticket_id}/override",),
+                kwargs={"json": {"service_type": "hotel", "category": "cancellation", "reason": "wrong booking"}},
+            )
+            override.start()
+            assert override_waiting.wait(10)
+            # Overrides wait for ingests of the conversation: nothing is written while it is held.
+            assert client.get(f"/tickets/{ticket_id}").json()["service_type"] == "flight"
+        override.join(timeout=10)
+        assert client.get(f"/tickets/{ticket_id}").json()["service_type"] == "hotel"
+
+
+def test_expired_jobs_are_requeued_and_callbacks_do_not_block_workers() -> None:
+    answer_callbacks = threading.Event()
+
+    class SlowCallback(BaseHTTPRequestHandler):
+        def do_POST(self) -> None:
+            self.rfile.read(int(self.headers["Content-Length"]))
+            answer_callbacks.wait(30)
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, *args) -> None:  # silence test output
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlowCallback)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/done"
+    create_all()
+    with SessionLocal() as db:
+        job_ids = []
+        for conversation_id in ("conv_lease_a", "conv_lease_b"):
+            payload = schemas.MessageIn(conversation_id=conversation_id, text="top up my wallet", sender="user")
+            item = ingest_pipeline.store_message(db, payload, ContextPolicy.from_settings())
+            job_ids.append(add_job(db, item, url).job_id)
+        # The first job was claimed by a process that died mid-pass.
+        crashed = db.get(ClassificationJob, job_ids[0])
+        crashed.status, crashed.started_at = "running", datetime.utcnow() - timedelta(hours=1)
+        db.commit()
+
+    workers = ClassificationWorkers(
+        workers=1, max_backlog=0, callback_timeout=30, lease_seconds=60, callback_allowed_hosts=["127.0.0.1"]
+    )
+    try:
+        started = time.monotonic()
+        workers.start()
+        statuses: list[tuple[str, Optional[str]]] = []
+        while time.monotonic() - started < 10:
+            with SessionLocal() as db:
+                statuses = [
+                    (job.status, job.callback_status) for job in (db.get(ClassificationJob, job_id) for job_id in job_ids)
+                ]
+            if all(status == "succeeded" for status, _ in statuses):
+                break
+            time.sleep(0.05)
+        # One worker classified both tickets while the first callback was still unanswered.
+        assert statuses == [("succeeded", None), ("succeeded", None)]
+
+        answer_callbacks.set()
+        while time.monotonic() - started < 10 and workers.snapshot()["callbacks_pending"]:
+            time.sleep(0.05)
+        with SessionLocal() as db:
+            assert [db.get(ClassificationJob, job_id).callback_status for job_id in job_ids] == ["204", "204"]
+    finally:
+        answer_callbacks.set()
+        workers.stop()
+        server.shutdown()